@@ -0,0 +1,171 @@
+# LLM/cache.py
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class _InFlight:
+    """
+    A computation that is currently running; other callers wait on it.
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class RecommendationCache:
+    """
+    TTL + LRU cache for LLM answers, keyed by the fully formatted prompt.
+
+    Many students share the same AQ category, top traits and skill set, so the
+    prompt sent to the LLM is often identical. Identical prompts are answered from
+    here instead of making another retrieval + Groq call, and concurrent identical
+    requests are collapsed into a single in-flight call (single-flight).
+    """
+
+    def __init__(self, ttl_seconds=3600, max_entries=1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._in_flight = {}
+        self._async_in_flight = {}  # (event loop id, key) -> asyncio.Future, for aget_or_compute
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(prompt_text: str) -> str:
+        return hashlib.sha256(prompt_text.encode('utf-8')).hexdigest()
+
+    def get_or_compute(self, prompt_text: str, compute):
+        """
+        Returns the cached answer for `prompt_text`, or calls `compute()` once
+        (even if several threads ask at the same time) and caches its result.
+        Empty answers are returned but not cached.
+        """
+        key = self.make_key(prompt_text)
+
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+
+            in_flight = self._in_flight.get(key)
+            if in_flight is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                in_flight = _InFlight()
+                self._in_flight[key] = in_flight
+                self.misses += 1
+                leader = True
+
+        if not leader:
+            in_flight.event.wait()
+            if in_flight.error is not None:
+                raise in_flight.error
+            return in_flight.value
+
+        try:
+            value = compute()
+            in_flight.value = value
+            if value:
+                self._store(key, value)
+            return value
+        except Exception as e:
+            in_flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            in_flight.event.set()
+
+    def _lookup(self, key):
+        # Must be called with the lock held. Returns (found, value).
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                return True, value
+            del self._entries[key]
+            self.expirations += 1
+        return False, None
+
+    async def aget_or_compute(self, prompt_text: str, acompute):
+        """
+        Async version of get_or_compute: `acompute()` returns an awaitable, and
+        concurrent identical prompts on the same event loop share one call.
+        """
+        key = self.make_key(prompt_text)
+        loop = asyncio.get_running_loop()
+        # Futures belong to one event loop; callers on other loops get their own.
+        flight_key = (id(loop), key)
+
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+            future = self._async_in_flight.get(flight_key)
+            if future is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                future = loop.create_future()
+                self._async_in_flight[flight_key] = future
+                self.misses += 1
+                leader = True
+
+        if not leader:
+            return await asyncio.shield(future)
+
+        try:
+            value = await acompute()
+            if value:
+                self._store(key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved if nobody else was waiting for it.
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                self._async_in_flight.pop(flight_key, None)
+
+    def _store(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'expirations': self.expirations,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                # Every hit or coalesced request is one LLM call we didn't pay for.
+                'llm_calls_saved': self.hits + self.coalesced,
+                'hit_rate': ((self.hits + self.coalesced) / lookups) if lookups else 0.0,
+            }
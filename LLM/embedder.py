@@ -0,0 +1,352 @@
+# LLM/embedder.py
+# Sentence embeddings for the RAG pipeline: a cached, batched drop-in for
+# HuggingFaceEmbeddings.
+#
+#   key   = sha256(model + backend + text)
+#   tier1 = in-process LRU of float32 vectors
+#   tier2 = on-disk SQLite table, trimmed to `max_disk_entries` (least recently used first)
+#
+# A repeated retrieval query (the prompt for a student profile seen before) is
+# answered from memory without running the encoder, and re-ingesting or
+# compacting the knowledge base only encodes text that was never encoded.
+#
+# Encoders (EMBED_BACKEND):
+#   torch      - sentence-transformers (default)
+#   onnx       - the exported ONNX graph run through onnxruntime
+#   onnx_int8  - the same graph with dynamically quantized INT8 weights
+#
+# The ONNX model has to be exported first:
+#
+#   python -m LLM.embedder export                 # writes LLM/embeddings/minilm_onnx/
+import argparse
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+import instrumentation
+import sqlite_util
+
+DEFAULT_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+BACKENDS = ('torch', 'onnx', 'onnx_int8')
+ONNX_FILENAME = 'model.onnx'
+ONNX_INT8_FILENAME = 'model_int8.onnx'
+DEFAULT_ONNX_DIR = os.path.join('LLM', 'embeddings', 'minilm_onnx')
+MAX_SEQ_LENGTH = 256
+BATCH_SIZE = 64
+# Number of recent encode() latencies kept for the percentiles in stats()
+LATENCY_WINDOW = 1024
+
+
+# --- Encoders ---
+class TorchEncoder:
+    """
+    The sentence-transformers model (what HuggingFaceEmbeddings runs).
+    """
+
+    def __init__(self, model_name, threads=None, **_):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if threads:
+            torch.set_num_threads(int(threads))
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts, batch_size) -> np.ndarray:
+        return self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True,
+                                 show_progress_bar=False).astype(np.float32)
+
+
+class OnnxEncoder:
+    """
+    The exported MiniLM graph run through onnxruntime, with the model's mean
+    pooling and L2 normalization applied in NumPy.
+    """
+
+    def __init__(self, model_name, threads=None, onnx_dir=DEFAULT_ONNX_DIR, quantized=False):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("EMBED_BACKEND=onnx requires the 'onnxruntime' package (pip install onnxruntime).") from e
+        from transformers import AutoTokenizer
+
+        onnx_path = os.path.join(onnx_dir, ONNX_INT8_FILENAME if quantized else ONNX_FILENAME)
+        if not os.path.exists(onnx_path):
+            raise FileNotFoundError(f"ONNX embedder not found: {onnx_path}. Run `python -m LLM.embedder export` first.")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = int(threads)
+        self.session = ort.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(onnx_dir)
+
+    def encode(self, texts, batch_size) -> np.ndarray:
+        # Length-sorted batches, each padded only to its own longest text.
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        result = np.empty((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            encoded = self.tokenizer([texts[i] for i in batch], padding='longest', truncation=True,
+                                     max_length=MAX_SEQ_LENGTH, return_tensors='np')
+            feeds = {name: encoded[name].astype(np.int64) for name in self.input_names if name in encoded}
+            hidden = self.session.run(None, feeds)[0]
+            mask = encoded['attention_mask'][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            if result.shape[1] == 0:
+                result = np.empty((len(texts), pooled.shape[1]), dtype=np.float32)
+            result[batch] = pooled
+        return result
+
+
+def load_encoder(backend, model_name=DEFAULT_MODEL, threads=None, onnx_dir=DEFAULT_ONNX_DIR):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown EMBED_BACKEND '{backend}'. Choose one of: {', '.join(BACKENDS)}")
+    if backend == 'torch':
+        return TorchEncoder(model_name, threads=threads)
+    return OnnxEncoder(model_name, threads=threads, onnx_dir=onnx_dir, quantized=backend == 'onnx_int8')
+
+
+# --- Cache ---
+class EmbeddingCache:
+    """
+    Two-tier (memory + SQLite) cache mapping text to its float32 embedding,
+    keyed by text hash and model.
+    """
+
+    def __init__(self, db_path, model_key, memory_size=4096, max_disk_entries=500_000):
+        self.db_path = db_path
+        self.model_key = model_key
+        self.memory_size = memory_size
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._connections = sqlite_util.ThreadLocalConnection(db_path, pragmas=sqlite_util.WAL_PRAGMAS)
+
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+
+    def _connection(self):
+        return self._connections.get()
+
+    def key_for(self, text):
+        return hashlib.sha256(f"{self.model_key}\x00{text}".encode('utf-8')).hexdigest()
+
+    def get_many(self, keys) -> dict:
+        """
+        {key: vector} for the keys that are cached (memory first, then SQLite).
+        """
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing:
+            conn = self._connection()
+            disk = {}
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                disk.update((key, np.frombuffer(blob, dtype=np.float32)) for key, blob in rows)
+            if disk:
+                with conn:
+                    conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                     [(time.time(), key) for key in disk])
+                self._remember(disk)
+                found.update(disk)
+        return found
+
+    def put_many(self, vectors_by_key):
+        if not vectors_by_key:
+            return
+        self._remember(vectors_by_key)
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, np.asarray(v, dtype=np.float32).tobytes(), now) for key, v in vectors_by_key.items()]
+            )
+        self._evict(conn)
+
+    def _remember(self, vectors_by_key):
+        with self._lock:
+            for key, vector in vectors_by_key.items():
+                self._memory[key] = vector
+                self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def _evict(self, conn):
+        count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count <= self.max_disk_entries:
+            return
+        with conn:
+            conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (count - int(self.max_disk_entries * 0.9),)
+            )
+
+
+# --- LangChain interface ---
+class CachedEmbeddings(Embeddings):
+    """
+    LangChain Embeddings backed by an encoder and an EmbeddingCache. Only texts
+    missing from the cache reach the encoder, each distinct one once, in
+    batches of `batch_size`.
+    """
+
+    def __init__(self, encoder, cache: EmbeddingCache = None, batch_size: int = BATCH_SIZE):
+        self.encoder = encoder
+        self.cache = cache
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)  # seconds per encode() call
+        self.encode_calls = 0
+        self.encoded_texts = 0
+        self.encode_seconds = 0.0
+        self.requested = 0
+        self.hits = 0
+
+    def _encode(self, texts) -> np.ndarray:
+        started = time.perf_counter()
+        vectors = self.encoder.encode(texts, self.batch_size)
+        elapsed = time.perf_counter() - started
+        instrumentation.observe('embedding_encode', elapsed)
+        with self._lock:
+            self._latencies.append(elapsed)
+            self.encode_calls += 1
+            self.encoded_texts += len(texts)
+            self.encode_seconds += elapsed
+        return vectors
+
+    def embed_documents(self, texts) -> list:
+        texts = list(texts)
+        if not texts:
+            return []
+        if self.cache is None:
+            vectors = self._encode(texts)
+        else:
+            keys = [self.cache.key_for(text) for text in texts]
+            found = self.cache.get_many(keys)
+            missing = {key: text for key, text in zip(keys, texts) if key not in found}
+            if missing:
+                fresh = dict(zip(missing, self._encode(list(missing.values()))))
+                self.cache.put_many(fresh)
+                found.update(fresh)
+            with self._lock:
+                self.requested += len(texts)
+                self.hits += sum(1 for key in keys if key not in missing)
+            vectors = [found[key] for key in keys]
+        return [np.asarray(v, dtype=np.float32).tolist() for v in vectors]
+
+    def embed_query(self, text) -> list:
+        return self.embed_documents([text])[0]
+
+    def stats(self) -> dict:
+        """
+        Cache hit rate and encoder latency (encode_ms_* cover the last LATENCY_WINDOW encoder calls).
+        """
+        with self._lock:
+            latencies = np.asarray(self._latencies, dtype=float) * 1000
+            return {
+                'requested': self.requested,
+                'cache_hits': self.hits,
+                'hit_rate': (self.hits / self.requested) if self.requested else 0.0,
+                'encode_calls': self.encode_calls,
+                'encoded_texts': self.encoded_texts,
+                'encode_seconds_total': round(self.encode_seconds, 4),
+                'encode_ms_p50': round(float(np.percentile(latencies, 50)), 2) if latencies.size else None,
+                'encode_ms_p95': round(float(np.percentile(latencies, 95)), 2) if latencies.size else None,
+            }
+
+
+def load_embedder(model_name=None, backend=None, batch_size=None, threads=None, cache_path=None,
+                  onnx_dir=None) -> CachedEmbeddings:
+    """
+    Builds the embedder from arguments, falling back to the EMBED_* environment
+    variables. EMBED_CACHE_PATH='' turns the cache off.
+    """
+    model_name = model_name or os.environ.get('EMBED_MODEL', DEFAULT_MODEL)
+    backend = backend or os.environ.get('EMBED_BACKEND', 'torch')
+    batch_size = int(batch_size or os.environ.get('EMBED_BATCH_SIZE', BATCH_SIZE))
+    threads = threads or os.environ.get('EMBED_THREADS') or None
+    if cache_path is None:
+        cache_path = os.environ.get('EMBED_CACHE_PATH', os.path.join('cache', 'embeddings.sqlite3'))
+    onnx_dir = onnx_dir or os.environ.get('EMBED_ONNX_DIR', DEFAULT_ONNX_DIR)
+
+    print(f"Loading embedder {model_name} ({backend} backend, batch size {batch_size})...")
+    encoder = load_encoder(backend, model_name, threads=threads, onnx_dir=onnx_dir)
+    cache = EmbeddingCache(cache_path, f"{model_name}|{backend}") if cache_path else None
+    return CachedEmbeddings(encoder, cache, batch_size)
+
+
+# --- Export ---
+def export_onnx(model_name=DEFAULT_MODEL, output_dir=DEFAULT_ONNX_DIR, opset=17, quantize=True):
+    """
+    Exports the transformer under the sentence-transformers model to ONNX
+    (token embeddings; pooling happens in OnnxEncoder), with an INT8 copy.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name)
+    model.eval()
+
+    dummy = tokenizer(["What careers suit a resilient student?"], return_tensors='pt')
+    onnx_path = os.path.join(output_dir, ONNX_FILENAME)
+    print(f"Exporting {model_name} to {onnx_path}...")
+    torch.onnx.export(
+        model,
+        (dummy['input_ids'], dummy['attention_mask'], dummy['token_type_ids']),
+        onnx_path,
+        input_names=['input_ids', 'attention_mask', 'token_type_ids'],
+        output_names=['last_hidden_state'],
+        dynamic_axes={name: {0: 'batch', 1: 'sequence'}
+                      for name in ('input_ids', 'attention_mask', 'token_type_ids', 'last_hidden_state')},
+        opset_version=opset,
+    )
+    tokenizer.save_pretrained(output_dir)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(onnx_path, os.path.join(output_dir, ONNX_INT8_FILENAME), weight_type=QuantType.QInt8)
+    print(f"ONNX embedder written to {output_dir}")
+    return onnx_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG embedder tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export_parser = subparsers.add_parser('export', help="Export the embedding model to ONNX (+ INT8)")
+    export_parser.add_argument('--model', default=os.environ.get('EMBED_MODEL', DEFAULT_MODEL))
+    export_parser.add_argument('--output-dir', default=os.environ.get('EMBED_ONNX_DIR', DEFAULT_ONNX_DIR))
+    export_parser.add_argument('--opset', type=int, default=17)
+    export_parser.add_argument('--no-quantize', action='store_true')
+
+    args = parser.parse_args()
+    if args.command == 'export':
+        export_onnx(args.model, args.output_dir, args.opset, quantize=not args.no_quantize)
+
+
+if __name__ == '__main__':
+    main()
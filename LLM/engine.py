@@ -1,126 +1,202 @@
 # LLM/engine.py
+import asyncio
 import os
-import pandas as pd
-import difflib
+import random
+import threading
+import time
+
+import groq
+import httpx
 from langchain_groq import ChatGroq
 from langchain.chains import RetrievalQA
-from langchain_community.vectorstores import FAISS
-from langchain_community.document_loaders import PyPDFLoader
-# FINAL IMPORT: This uses the new, dedicated HuggingFace package.
-from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_core.callbacks import BaseCallbackHandler
 
 # This relative import is correct for our structure.
 from .prompts import career_prompt_template_simple
+from .cache import RecommendationCache
+from .skill_index import build_skill_index
+from .student_lookup import StudentLookup
+from . import vector_store
+from .embedder import load_embedder
+import instrumentation
+from assessment_rules import aq_category as aq_category_for
+
+# Trait combination -> (description, roles), checked in this order
+_TRAIT_MAP = {
+    "C+O": ("Strong decision-maker with responsibility", ["Manager", "Admin Head", "NGO Director"]),
+    "C+R": ("Can handle pressure and multiple areas", ["Event Planner", "Product Manager"]),
+    "C+E": ("Stays composed & resilient for long terms", ["Police", "Government Officer", "Army"]),
+    "C+A": ("Positive leader who inspires others", ["HR Manager", "Motivational Coach"]),
+    "O+R": ("Self-driven and adaptable across domains", ["Startup Founder", "Project Consultant"]),
+    "O+E": ("Determined initiator with long-term vision", ["Researcher", "Business Owner", "Civil Services"]),
+    "O+A": ("Responsible & optimistic individual", ["Educator", "Youth Counselor", "Team Lead"]),
+    "R+E": ("Manages multitasking under long-term stress", ["Software Engineer", "Media Planner"]),
+    "R+A": ("Juggles multiple tasks while spreading positivity", ["Social Media Manager", "Campaign Organizer"]),
+    "E+A": ("Perseveres with positive attitude", ["Psychologist", "Teacher", "UPSC Aspirant"]),
+    "C+O+A": ("Confident, responsible, and positive leader", ["Principal", "Entrepreneur", "NGO Leader"])
+}
+# Parsed once: (required trait codes, roles)
+_TRAIT_RULES = tuple((frozenset(key.split("+")), tuple(roles)) for key, (_description, roles) in _TRAIT_MAP.items())
+
 
 def get_trait_based_suggestions(traits: list[str]) -> list[str]:
-    trait_map = {
-        "C+O": ("Strong decision-maker with responsibility", ["Manager", "Admin Head", "NGO Director"]),
-        "C+R": ("Can handle pressure and multiple areas", ["Event Planner", "Product Manager"]),
-        "C+E": ("Stays composed & resilient for long terms", ["Police", "Government Officer", "Army"]),
-        "C+A": ("Positive leader who inspires others", ["HR Manager", "Motivational Coach"]),
-        "O+R": ("Self-driven and adaptable across domains", ["Startup Founder", "Project Consultant"]),
-        "O+E": ("Determined initiator with long-term vision", ["Researcher", "Business Owner", "Civil Services"]),
-        "O+A": ("Responsible & optimistic individual", ["Educator", "Youth Counselor", "Team Lead"]),
-        "R+E": ("Manages multitasking under long-term stress", ["Software Engineer", "Media Planner"]),
-        "R+A": ("Juggles multiple tasks while spreading positivity", ["Social Media Manager", "Campaign Organizer"]),
-        "E+A": ("Perseveres with positive attitude", ["Psychologist", "Teacher", "UPSC Aspirant"]),
-        "C+O+A": ("Confident, responsible, and positive leader", ["Principal", "Entrepreneur", "NGO Leader"])
-    }
     if not traits: return []
-    traits_key = "+".join(sorted(set(traits))).upper()
-    for key, value in trait_map.items():
-        # Unpack the tuple to get the description (unused for now) and roles
-        _description, roles = value
-        key_set = set(key.split("+"))
-        if key_set.issubset(set(traits_key.split("+"))):
-            return roles
+    trait_set = {trait.upper() for trait in traits}
+    for required, roles in _TRAIT_RULES:
+        if required <= trait_set:
+            return list(roles)
     return []
 
 
+def _status_code(error: Exception):
+    return getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+
+
+def _is_rate_limit_error(error: Exception) -> bool:
+    return _status_code(error) == 429 or 'rate limit' in str(error).lower() or 'rate_limit' in str(error).lower()
+
+
+def _is_transient_error(error: Exception) -> bool:
+    """
+    Timeouts, dropped connections, rate limits and 5xx responses. Anything else
+    (a bad API key, a rejected request, a bug) fails the same way on every retry.
+    """
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError, httpx.TransportError, groq.APIConnectionError)):
+        return True
+    status = _status_code(error)
+    return _is_rate_limit_error(error) or (isinstance(status, int) and status >= 500)
+
+
+def _retry_after_seconds(error: Exception):
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class _LLMTimer(BaseCallbackHandler):
+    """
+    Times each LLM call of the chain (stage 'llm' in instrumentation.py).
+    """
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self._started = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            instrumentation.observe('llm', time.perf_counter() - started, self.model_name)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.on_llm_end(None, run_id=run_id)
+
+
 class GuidanceEngine:
+    # Backoff for the async LLM path (seconds)
+    _BACKOFF_BASE = 1.0
+    _BACKOFF_MAX = 20.0
+
     def __init__(self, config: dict):
         print("Initializing GuidanceEngine...")
         self.config = config
-        self.student_df = self._load_student_data()
+        self._rate_limited_until = 0.0
+        self._loop, self._loop_pid = None, None
+        self._loop_lock = threading.Lock()
+        # enrollment -> role dict plus pre-parsed skills; the DataFrame itself is not kept
+        self.students = self._load_student_data()
         self.all_skills_from_csv = self._extract_all_skills()
+        # Built once here instead of re-lowercasing the vocabulary for every skill
+        self.skill_index = build_skill_index(self.all_skills_from_csv, cutoff=0.7)
         self.qa_chain = self._initialize_rag_pipeline()
+        # Identical prompts are answered from here instead of another retrieval + LLM call.
+        self.recommendation_cache = RecommendationCache(
+            ttl_seconds=config.get('recommendation_cache_ttl', 3600),
+            max_entries=config.get('recommendation_cache_size', 1024)
+        )
+        instrumentation.register_stats('recommendation_cache', self.recommendation_cache.stats,
+                                       counters=('hits', 'misses', 'coalesced', 'expirations', 'evictions'),
+                                       gauges=('entries',))
         print("GuidanceEngine ready.")
 
     def _load_student_data(self):
         path = self.config['student_data_path']
-        print(f"Loading student records from {path}...")
-        if not os.path.exists(path): raise FileNotFoundError(f"Student data file not found: {path}")
-        return pd.read_csv(path)
+        return StudentLookup.load(path, cache_path=self.config.get('student_lookup_cache_path'))
 
     def _extract_all_skills(self):
-        skills_set = set()
-        for raw in self.student_df["Final Skills"].dropna():
-            skills = [s.strip().capitalize() for s in str(raw).strip("[]'").split(",") if s.strip()]
-            skills_set.update(skills)
-        return sorted(list(skills_set))
+        return self.students.all_skills()
 
     def _initialize_rag_pipeline(self):
         print("Initializing LangChain RAG pipeline...")
-        llm = ChatGroq(model="llama-3.1-8b-instant", api_key=os.getenv("GROQ_API_KEY"))
-        embedder = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+        model_name = "llama-3.1-8b-instant"
+        llm = ChatGroq(model=model_name, api_key=os.getenv("GROQ_API_KEY"),
+                       callbacks=[_LLMTimer(model_name)] if instrumentation.ENABLED else None)
+        # Cached + batched (LLM/embedder.py): a repeated query is not encoded again
+        self.embedder = embedder = load_embedder(
+            backend=self.config.get('embedding_backend'), batch_size=self.config.get('embedding_batch_size'),
+            threads=self.config.get('embedding_threads'), cache_path=self.config.get('embedding_cache_path')
+        )
+        # Encoder latency itself is the 'embedding_encode' histogram
+        instrumentation.register_stats('embedder', self.embedding_stats,
+                                       counters=('requested', 'cache_hits', 'encode_calls', 'encoded_texts',
+                                                 'encode_seconds_total'))
         
-        index_path = self.config['faiss_index_path']
-        paper_path = self.config['research_paper_path']
-
-        if os.path.exists(index_path):
-            print(f"Loading existing FAISS index from {index_path}...")
-            db = FAISS.load_local(index_path, embedder, allow_dangerous_deserialization=True)
-        else:
-            print(f"Building FAISS index from {paper_path}...")
-            if not os.path.exists(paper_path): raise FileNotFoundError(f"Research paper not found: {paper_path}")
-            os.makedirs(os.path.dirname(index_path), exist_ok=True)
-            loader = PyPDFLoader(paper_path)
-            pages = loader.load_and_split()
-            db = FAISS.from_documents(pages, embedder)
-            db.save_local(index_path)
-            print(f"FAISS index built and saved to {index_path}.")
-
-        return RetrievalQA.from_chain_type(llm=llm, retriever=db.as_retriever(), chain_type="stuff")
+        # Built and updated by LLM/ingest.py (a deploy step), never from a request
+        store_path = self.config['vector_store_path']
+        if not vector_store.store_exists(store_path):
+            raise FileNotFoundError(f"Vector store not found: {store_path}. Build it with "
+                                    f"`python -m LLM.ingest --store {store_path} add LLM/data/Research_Paper.pdf`.")
+
+        store = vector_store.VectorStore.load(
+            store_path, embedder, mmap=self.config.get('vector_store_mmap', True),
+            nprobe=self.config.get('faiss_nprobe'), ef_search=self.config.get('faiss_ef_search')
+        )
+        retriever = store.as_retriever(k=self.config.get('retriever_k', 4),
+                                       score_threshold=self.config.get('retriever_score_threshold'))
+        return RetrievalQA.from_chain_type(llm=llm, retriever=retriever, chain_type="stuff")
+
+    def embedding_stats(self) -> dict:
+        """
+        Query-embedding cache hit rate and encoder latency (its counters are also on /metrics).
+        """
+        return self.embedder.stats()
 
     def _correct_skills(self, skills: list[str]) -> list[str]:
-        corrected = [difflib.get_close_matches(s.lower(), [sk.lower() for sk in self.all_skills_from_csv], n=1, cutoff=0.7) for s in skills]
-        return [match[0].capitalize() if match else skill.capitalize() for skill, match in zip(skills, corrected)]
+        corrected = [self.skill_index.match(s.lower()) for s in skills]
+        return [match.capitalize() if match else skill.capitalize() for skill, match in zip(skills, corrected)]
 
     def _get_student_profile(self, enrollment: str, aq: int, skills: list[str]) -> dict:
         corrected_skills = self._correct_skills(skills)
         profile = {"enrollment": enrollment or "N/A", "aq": aq, "skills": corrected_skills, "suggested_role": None}
         if enrollment:
-            match = self.student_df[self.student_df['Enrollment Number'] == enrollment]
-            if not match.empty:
-                profile["suggested_role"] = match.iloc[0].get("Suggested Role", "").strip()
+            profile["suggested_role"] = self.students.suggested_role(enrollment)
         return profile
 
-    def generate_recommendations(self, enrollment: str, aq_score: int, skills: list[str], traits: list[str]) -> list[str]:
-        profile = self._get_student_profile(enrollment, aq_score, skills)
+    def _build_prompt(self, profile: dict, traits: list[str]) -> str:
+        aq_score = profile["aq"]
 
-        # Step 1: Determine the AQ Category based on the score.
-        if aq_score >= 180:
-            aq_category = {"name": "Climber", "description": "You excel at navigating challenges and consistently seek growth. You are highly resilient and resourceful."}
-        elif aq_score >= 140:
-            aq_category = {"name": "Camper", "description": "You are steady and reliable, but may sometimes avoid difficult challenges to stay in a comfortable zone."}
-        else:
-            aq_category = {"name": "Quitter", "description": "You may feel overwhelmed by adversity and have an opportunity to develop stronger resilience strategies."}
+        # Step 1: Determine the AQ Category based on the score (same tiers as the student report).
+        aq_category = aq_category_for(aq_score)
         
         # Step 2: Format the full description to pass to the prompt.
         aq_profile_description = f"{aq_category['name']} - {aq_category['description']}"
 
         # Step 3: Format the prompt, now including the new variable. This is the fix.
-        prompt_text = career_prompt_template_simple.format(
+        return career_prompt_template_simple.format(
             aq_score=profile["aq"],
             skills=", ".join(sorted(profile["skills"], key=str.lower)),
             traits=" + ".join(sorted(traits)) if traits else "None",
             aq_profile_description=aq_profile_description # This line fixes the KeyError
         )
-        
-        # Step 4: Invoke the LLM and process the results.
-        llm_output = self.qa_chain.invoke(prompt_text)
-        llm_result_text = llm_output.get('result', '')
 
+    def _final_careers(self, profile: dict, llm_result_text: str, traits: list[str]) -> list[str]:
         llm_careers = [line.split(".", 1)[1].strip() for line in llm_result_text.strip().split("\n") if "." in line]
         trait_careers = get_trait_based_suggestions(traits)
         
@@ -134,4 +210,108 @@ class GuidanceEngine:
                 final_careers.append(career)
                 seen.add(career.lower())
         
-        return final_careers[:3]
\ No newline at end of file
+        return final_careers[:3]
+
+    def generate_recommendations(self, enrollment: str, aq_score: int, skills: list[str], traits: list[str]) -> list[str]:
+        profile = self._get_student_profile(enrollment, aq_score, skills)
+        prompt_text = self._build_prompt(profile, traits)
+
+        # Step 4: Invoke the LLM (or reuse the answer to an identical prompt) and process the results.
+        llm_result_text = self.recommendation_cache.get_or_compute(
+            prompt_text, lambda: self.qa_chain.invoke(prompt_text).get('result', '')
+        )
+        return self._final_careers(profile, llm_result_text, traits)
+
+    # --- Async path ---
+    async def _ainvoke_with_retries(self, prompt_text: str, timeout: float, retries: int) -> str:
+        """
+        Calls the chain with `ainvoke`, retrying timeouts and transient errors with
+        jittered exponential backoff; other errors are raised at once. On a rate-limit
+        error every concurrent call pauses until the limit has passed, instead of all
+        of them hammering the API.
+        """
+        for attempt in range(retries + 1):
+            await self._wait_for_rate_limit()
+            try:
+                output = await asyncio.wait_for(self.qa_chain.ainvoke(prompt_text), timeout=timeout)
+                return output.get('result', '')
+            except Exception as e:
+                if attempt == retries or not _is_transient_error(e):
+                    raise
+                delay = min(self._BACKOFF_BASE * (2 ** attempt), self._BACKOFF_MAX)
+                if _is_rate_limit_error(e):
+                    delay = max(delay, _retry_after_seconds(e) or 0)
+                    self._rate_limited_until = max(self._rate_limited_until, time.monotonic() + delay)
+                    print(f"LLM rate limited, pausing {delay:.1f}s (attempt {attempt + 1}/{retries + 1})")
+                else:
+                    print(f"LLM call failed ({type(e).__name__}: {e}), retrying (attempt {attempt + 1}/{retries + 1})")
+                # Full jitter, so that retries from concurrent calls don't line up again.
+                await asyncio.sleep(random.uniform(delay / 2, delay))
+
+    async def _wait_for_rate_limit(self):
+        remaining = self._rate_limited_until - time.monotonic()
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+
+    async def agenerate_recommendations(self, enrollment: str, aq_score: int, skills: list[str], traits: list[str],
+                                        timeout: float = 30.0, retries: int = 3) -> list[str]:
+        """
+        Async version of generate_recommendations built on the chain's `ainvoke`,
+        so the event loop can run many LLM round trips at once.
+        """
+        profile = self._get_student_profile(enrollment, aq_score, skills)
+        prompt_text = self._build_prompt(profile, traits)
+        llm_result_text = await self.recommendation_cache.aget_or_compute(
+            prompt_text, lambda: self._ainvoke_with_retries(prompt_text, timeout, retries)
+        )
+        return self._final_careers(profile, llm_result_text, traits)
+
+    async def agenerate_batch(self, profiles: list[dict], concurrency: int = 5,
+                              timeout: float = 30.0, retries: int = 3, progress=None) -> list[dict]:
+        """
+        Generates recommendations for many students at once, with at most
+        `concurrency` LLM calls in flight.
+
+        Each profile is a dict with 'enrollment', 'aq_score', 'skills' and 'traits'.
+        Returns one {'enrollment', 'careers', 'error'} dict per profile, in order;
+        a failed profile has 'careers' = [] and the error message set.
+        `progress(done, total)`, if given, is called as each profile finishes.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        finished = 0
+
+        async def run_one(p: dict) -> dict:
+            nonlocal finished
+            async with semaphore:
+                try:
+                    careers = await self.agenerate_recommendations(
+                        enrollment=p.get('enrollment'), aq_score=p['aq_score'],
+                        skills=p.get('skills', []), traits=p.get('traits', []),
+                        timeout=timeout, retries=retries
+                    )
+                    result = {"enrollment": p.get('enrollment'), "careers": careers, "error": None}
+                except Exception as e:
+                    result = {"enrollment": p.get('enrollment'), "careers": [], "error": str(e) or type(e).__name__}
+            finished += 1
+            if progress:
+                progress(finished, len(profiles))
+            return result
+
+        return await asyncio.gather(*(run_one(p) for p in profiles))
+
+    def generate_batch(self, profiles: list[dict], **kwargs) -> list[dict]:
+        """
+        Synchronous entry point for agenerate_batch (e.g. from a background job).
+        Runs on the engine's event loop and blocks until the batch is done.
+        """
+        return asyncio.run_coroutine_threadsafe(self.agenerate_batch(profiles, **kwargs), self._event_loop()).result()
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        # One loop for the engine's lifetime, on its own thread: the chain's async
+        # client keeps its connection pool bound to the loop that first used it, so
+        # a fresh asyncio.run() per batch would hand it connections of a closed loop.
+        with self._loop_lock:
+            if self._loop is None or self._loop_pid != os.getpid():  # threads don't survive a fork
+                self._loop, self._loop_pid = asyncio.new_event_loop(), os.getpid()
+                threading.Thread(target=self._loop.run_forever, name='guidance-engine-loop', daemon=True).start()
+            return self._loop
@@ -0,0 +1,400 @@
+# LLM/ingest.py
+# Incremental ingestion of the RAG knowledge base (PDFs and CSVs) into the
+# vector store (LLM/vector_store.py).
+#
+# Sources are chunked deterministically - per PDF page, per CSV row - and each
+# chunk is identified by the SHA-256 of its text. A run embeds (in batches) only
+# the chunks whose hash the store has not seen for that source, appends them to
+# the index, and tombstones the chunks that disappeared; files whose own hash is
+# unchanged since the last run are not even opened. The manifest records every
+# source with its file hash and chunk count. Once tombstones make up more than
+# COMPACT_RATIO of the index it is rebuilt from the stored vectors.
+#
+# The app only loads the store (LLM/engine.py); run this as a deploy step. The
+# first run starts from the committed LangChain index (LEGACY_INDEX_DIR), so
+# the research paper isn't embedded again:
+#
+#   python -m LLM.ingest add LLM/data/Research_Paper.pdf      # what the app needs
+#   python -m LLM.ingest add LLM/data docs/handbooks          # PDFs and CSVs, recursively
+#   python -m LLM.ingest add LLM/data --prune                 # also drop files deleted from LLM/data
+#   python -m LLM.ingest remove LLM/data/old_handbook.pdf
+#   python -m LLM.ingest compact --factory HNSW32             # drop tombstones / change index type
+#   python -m LLM.ingest status
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from contextlib import contextmanager
+
+import faiss
+import numpy as np
+
+from . import vector_store
+from .vector_store import DEFAULT_EMBEDDING_MODEL, DEFAULT_FACTORY, DOCSTORE_FILE, INDEX_FILE, SqliteDocstore
+
+try:
+    import fcntl
+except ImportError:  # Windows: runs are not serialized
+    fcntl = None
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.csv')
+# ~250 MiniLM tokens; the embedder truncates anything past 256
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 150
+EMBED_BATCH_SIZE = 64
+COMPACT_RATIO = 0.25
+
+DEFAULT_STORE = os.path.join('LLM', 'embeddings', 'vector_store')
+# Source keys are relative to the repository root, whatever the working directory
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The LangChain index the app shipped with, migrated when a store is created
+LEGACY_INDEX_DIR = os.path.join(PROJECT_ROOT, 'LLM', 'embeddings', 'faiss_index')
+
+
+# --- Chunking ---
+def split_text(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> list:
+    """
+    Splits text into chunks of at most ~`size` characters on word boundaries,
+    consecutive chunks sharing ~`overlap` characters. Depends only on the text,
+    so unchanged text always yields the same chunks.
+    """
+    words = text.split()
+    chunks, start = [], 0
+    while start < len(words):
+        end, length = start, 0
+        while end < len(words) and (end == start or length + len(words[end]) + 1 <= size):
+            length += len(words[end]) + 1
+            end += 1
+        chunks.append(' '.join(words[start:end]))
+        if end == len(words):
+            break
+        back, length = end, 0
+        while back > start + 1 and length + len(words[back - 1]) + 1 <= overlap:
+            back -= 1
+            length += len(words[back]) + 1
+        start = back
+    return chunks
+
+
+def pdf_chunks(path, source):
+    from pypdf import PdfReader
+    for page_number, page in enumerate(PdfReader(path).pages):
+        for chunk in split_text(page.extract_text() or ''):
+            yield chunk, {'source': source, 'page': page_number}
+
+
+def csv_chunks(path, source, rows_per_read: int = 5000):
+    import pandas as pd
+    reader = pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=rows_per_read)
+    row_number = 0
+    for frame in reader:
+        columns = list(frame.columns)
+        for values in frame.itertuples(index=False, name=None):
+            text = '; '.join(f"{column}: {value}" for column, value in zip(columns, values) if value.strip())
+            for chunk in split_text(text):
+                yield chunk, {'source': source, 'row': row_number}
+            row_number += 1
+
+
+def load_chunks(path, source) -> dict:
+    """
+    {chunk_hash: (text, metadata)} of one file, in document order; repeated
+    text is stored once.
+    """
+    reader = pdf_chunks if path.lower().endswith('.pdf') else csv_chunks
+    chunks = {}
+    for text, metadata in reader(path, source):
+        chunks.setdefault(chunk_hash(text), (text, metadata))
+    return chunks
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def file_hash(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_key(path) -> str:
+    """
+    The manifest key of a file: its path relative to PROJECT_ROOT, or its
+    absolute path if it lies outside the repository.
+    """
+    path = os.path.abspath(path)
+    try:
+        relative = os.path.relpath(path, PROJECT_ROOT)
+    except ValueError:  # another drive on Windows
+        relative = os.pardir
+    if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+        relative = path
+    return relative.replace(os.sep, '/')
+
+
+def source_path(source) -> str:
+    return os.path.join(PROJECT_ROOT, *source.split('/')) if not os.path.isabs(source) else source
+
+
+def adopt_chunks(texts, metadatas, source_paths=()) -> tuple:
+    """
+    Gives chunks built outside ingest() (`vector_store build/migrate`) the
+    source keys and hashes ingest() diffs against. Each chunk's metadata
+    'source' is matched to an existing file - as given, or by file name among
+    `source_paths` - and the files found are recorded in the manifest with
+    their current hash, so the next run keeps their chunks until they change.
+    Returns (kept row positions, metadatas, sources, hashes, manifest sources).
+    """
+    by_name = {os.path.basename(p): p for p in source_paths}
+    resolved, seen = {}, set()
+    rows, new_metadatas, sources, hashes = [], [], [], []
+    for position, (text, metadata) in enumerate(zip(texts, metadatas)):
+        original = str((metadata or {}).get('source', ''))
+        if original not in resolved:
+            name = re.split(r'[\\/]', original)[-1]
+            path = next((p for p in (original, source_path(original.replace(os.sep, '/')), by_name.get(name))
+                         if p and os.path.isfile(p)), None)
+            resolved[original] = (source_key(path), path) if path else (original, None)
+        source, digest = resolved[original][0], chunk_hash(text)
+        if (source, digest) in seen:  # ingest() keeps one row per chunk of a source
+            continue
+        seen.add((source, digest))
+        rows.append(position)
+        new_metadatas.append({**(metadata or {}), 'source': source})
+        sources.append(source)
+        hashes.append(digest)
+
+    manifest_sources = {}
+    for source, path in set(resolved.values()):
+        if path:
+            manifest_sources[source] = {'sha256': file_hash(path), 'chunks': sources.count(source),
+                                        'ingested_at': time.time()}
+    return rows, new_metadatas, sources, hashes, manifest_sources
+
+
+def discover(paths) -> list:
+    """
+    The supported files among `paths`, directories expanded recursively, sorted.
+    """
+    files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _dirs, names in os.walk(path):
+                files.update(os.path.join(root, n) for n in names if n.lower().endswith(SUPPORTED_EXTENSIONS))
+        elif path.lower().endswith(SUPPORTED_EXTENSIONS):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Knowledge source not found: {path}")
+            files.add(path)
+    return sorted(files)
+
+
+# --- Store updates ---
+@contextmanager
+def _store_lock(store_dir):
+    # Serializes runs across processes (e.g. gunicorn workers starting at once).
+    os.makedirs(store_dir, exist_ok=True)
+    with open(os.path.join(store_dir, '.lock'), 'w') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _open(store_dir, factory, embedding_model):
+    """
+    (index or None, docstore, manifest) of the store in `store_dir`, empty if it doesn't exist yet.
+    """
+    manifest = vector_store.read_manifest(store_dir) if vector_store.store_exists(store_dir) else {}
+    if manifest and 'sources' not in manifest:
+        # Built by `vector_store build/migrate` before they recorded sources: no source/hash to diff against
+        print(f"[ingest] {store_dir} was not built by ingest; rebuilding it from the sources.")
+        manifest = {}
+    docstore = SqliteDocstore(os.path.join(store_dir, DOCSTORE_FILE), readonly=False)
+    if not manifest:
+        docstore.truncate(0)
+        return None, docstore, {'factory': factory, 'metric': 'inner_product', 'normalized': True,
+                                'embedding_model': embedding_model, 'count': 0, 'tombstones': 0, 'sources': {}}
+
+    if manifest.get('embedding_model', embedding_model) != embedding_model:
+        raise ValueError(f"The store in {store_dir} was embedded with {manifest['embedding_model']}, "
+                         f"not {embedding_model}; rebuild it instead.")
+    index = faiss.read_index(os.path.join(store_dir, INDEX_FILE))
+    # Rows written by a run that stopped before its index was swapped in
+    docstore.truncate(index.ntotal)
+    return index, docstore, manifest
+
+
+def _save(store_dir, index, docstore, manifest):
+    tmp_path = os.path.join(store_dir, INDEX_FILE + '.tmp')
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, os.path.join(store_dir, INDEX_FILE))
+    manifest.update(dimension=index.d, count=len(docstore), tombstones=docstore.tombstone_count())
+    vector_store.write_manifest(store_dir, manifest)
+
+
+def embed_in_batches(embedder, texts, batch_size: int = EMBED_BATCH_SIZE) -> np.ndarray:
+    batches = []
+    for start in range(0, len(texts), batch_size):
+        batches.append(vector_store.normalize(embedder.embed_documents(texts[start:start + batch_size])))
+        print(f"[ingest] Embedded {min(start + batch_size, len(texts))}/{len(texts)} chunks")
+    return np.vstack(batches)
+
+
+def ingest(store_dir, paths, embedder, factory: str = DEFAULT_FACTORY, prune: bool = False,
+           embedding_model: str = DEFAULT_EMBEDDING_MODEL, batch_size: int = EMBED_BATCH_SIZE,
+           legacy_dir=None) -> dict:
+    """
+    Brings the store up to date with the PDFs/CSVs under `paths`. With prune=True,
+    sources under a directory in `paths` whose file no longer exists are removed.
+    If the store doesn't exist yet and `legacy_dir` holds a LangChain FAISS index,
+    that index is migrated first instead of embedding everything again.
+    Returns counts of what changed.
+    """
+    stats = {'files': 0, 'unchanged_files': 0, 'added': 0, 'kept': 0, 'revived': 0, 'tombstoned': 0}
+    with _store_lock(store_dir):
+        if (legacy_dir and not vector_store.store_exists(store_dir)
+                and os.path.exists(os.path.join(legacy_dir, 'index.pkl'))):
+            print(f"[ingest] Migrating the LangChain index {legacy_dir} -> {store_dir}...")
+            vector_store.migrate_langchain_index(legacy_dir, store_dir, factory, embedding_model,
+                                                 source_paths=discover(paths))
+        index, docstore, manifest = _open(store_dir, factory, embedding_model)
+        sources = manifest['sources']
+        pending = []  # (hash, text, metadata, source) to embed
+        dirty = False
+
+        for path in discover(paths):
+            stats['files'] += 1
+            source, digest = source_key(path), file_hash(path)
+            if source in sources and sources[source]['sha256'] == digest:
+                stats['unchanged_files'] += 1
+                continue
+
+            dirty = True
+            chunks = load_chunks(path, source)
+            existing = docstore.source_chunks(source)
+            kept = [(existing[h][0], meta) for h, (_, meta) in chunks.items() if h in existing]
+            revived = [row_id for h, (row_id, deleted) in existing.items() if deleted and h in chunks]
+            removed = [row_id for h, (row_id, deleted) in existing.items() if not deleted and h not in chunks]
+            pending.extend((h, text, meta, source) for h, (text, meta) in chunks.items() if h not in existing)
+
+            docstore.update_metadata(kept)
+            docstore.set_deleted(revived, False)
+            docstore.set_deleted(removed, True)
+            stats['kept'] += len(kept) - len(revived)
+            stats['revived'] += len(revived)
+            stats['tombstoned'] += len(removed)
+            sources[source] = {'sha256': digest, 'chunks': len(chunks), 'ingested_at': time.time()}
+
+        if prune:
+            for directory in (source_key(p) for p in paths if os.path.isdir(p)):
+                prefix = '' if directory == '.' else directory.rstrip('/') + '/'
+                for source in [s for s in sources if s.startswith(prefix) and not os.path.exists(source_path(s))]:
+                    stats['tombstoned'] += docstore.tombstone_source(source)
+                    del sources[source]
+                    dirty = True
+
+        if pending:
+            vectors = embed_in_batches(embedder, [text for _, text, _, _ in pending], batch_size)
+            if index is None:
+                index, manifest['factory'] = vector_store.build_index(vectors, factory)
+                first_id = 0
+            else:
+                first_id = index.ntotal
+                index.add(vectors)
+            docstore.add(range(first_id, first_id + len(pending)), [t for _, t, _, _ in pending],
+                         [m for _, _, m, _ in pending], [s for _, _, _, s in pending], [h for h, _, _, _ in pending], vectors)
+            stats['added'] = len(pending)
+
+        if index is None:
+            print("[ingest] No chunks to index.")
+            return stats
+        if pending or stats['tombstoned'] or stats['revived']:
+            _save(store_dir, index, docstore, manifest)
+        elif dirty:
+            vector_store.write_manifest(store_dir, manifest)  # new file hashes, same chunks
+
+        if manifest.get('tombstones', 0) > COMPACT_RATIO * index.ntotal:
+            _compact(store_dir, index, docstore, manifest, manifest['factory'])
+    print(f"[ingest] {stats}")
+    return stats
+
+
+def remove(store_dir, sources) -> int:
+    """
+    Tombstones every chunk of the given sources (paths as given to ingest()).
+    """
+    with _store_lock(store_dir):
+        index, docstore, manifest = _open(store_dir, DEFAULT_FACTORY, vector_store.read_manifest(store_dir)['embedding_model'])
+        removed = 0
+        for source in map(source_key, sources):
+            removed += docstore.tombstone_source(source)
+            manifest['sources'].pop(source, None)
+        _save(store_dir, index, docstore, manifest)
+    return removed
+
+
+def compact(store_dir, factory: str = None):
+    """
+    Rebuilds the index from the live chunks' stored vectors, dropping tombstones
+    (and switching to `factory` if given). Nothing is re-embedded.
+    """
+    with _store_lock(store_dir):
+        manifest = vector_store.read_manifest(store_dir)
+        index, docstore, manifest = _open(store_dir, manifest['factory'], manifest['embedding_model'])
+        return _compact(store_dir, index, docstore, manifest, factory or manifest['factory'])
+
+
+def _compact(store_dir, index, docstore, manifest, factory):
+    rows = list(docstore.live_rows())
+    if not rows:
+        raise ValueError("The store has no live chunks to compact.")
+    # Stores written before vectors were kept in the docstore fall back to the index's copy
+    vectors = np.vstack([v if v is not None else index.reconstruct(row_id) for row_id, *_, v in rows])
+    print(f"[ingest] Compacting {len(rows)} live chunks (dropping {manifest.get('tombstones', 0)} tombstones)")
+    return vector_store.write_store(
+        store_dir, vectors, [r[1] for r in rows], [r[2] for r in rows], factory, manifest['embedding_model'],
+        sources=[r[3] for r in rows], hashes=[r[4] for r in rows], manifest_extra={'sources': manifest['sources']}
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally update the RAG knowledge base")
+    parser.add_argument('--store', default=os.environ.get('VECTOR_STORE_PATH', DEFAULT_STORE))
+    sub = parser.add_subparsers(dest='command', required=True)
+    add = sub.add_parser('add', help="Add or update PDFs/CSVs (files or directories)")
+    add.add_argument('paths', nargs='+')
+    add.add_argument('--prune', action='store_true', help="Remove sources deleted from the given directories")
+    add.add_argument('--factory', default=DEFAULT_FACTORY, help="Index type when the store is created")
+    add.add_argument('--model', default=DEFAULT_EMBEDDING_MODEL)
+    add.add_argument('--batch-size', type=int, default=EMBED_BATCH_SIZE)
+    add.add_argument('--legacy', default=LEGACY_INDEX_DIR,
+                     help="LangChain FAISS folder to start a new store from ('' to embed everything)")
+    rm = sub.add_parser('remove', help="Remove sources from the store")
+    rm.add_argument('sources', nargs='+')
+    comp = sub.add_parser('compact', help="Rebuild the index without tombstones")
+    comp.add_argument('--factory')
+    sub.add_parser('status', help="Show the manifest")
+    args = parser.parse_args()
+
+    if args.command == 'add':
+        from .embedder import load_embedder
+        ingest(args.store, args.paths, load_embedder(args.model, batch_size=args.batch_size), args.factory,
+               prune=args.prune, embedding_model=args.model, batch_size=args.batch_size, legacy_dir=args.legacy)
+    elif args.command == 'remove':
+        print(f"Tombstoned {remove(args.store, args.sources)} chunks")
+    elif args.command == 'compact':
+        compact(args.store, args.factory)
+    else:
+        print(json.dumps(vector_store.read_manifest(args.store), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# LLM/skill_index.py
+import difflib
+from functools import lru_cache
+
+import numpy as np
+
+
+class SkillIndex:
+    """
+    Fuzzy lookup of a skill in a fixed vocabulary, built once.
+
+    Returns exactly what `difflib.get_close_matches(word, vocabulary, n=1, cutoff=cutoff)`
+    returns, without running a SequenceMatcher against every vocabulary entry:
+
+    1. A character-count matrix of the vocabulary is built once. For a query, one
+       vectorized pass over it gives difflib's `real_quick_ratio` and `quick_ratio`
+       upper bounds for every entry at the same time.
+    2. Entries whose bound is below the cutoff are dropped; the rest are scored
+       with the full `ratio()` in order of decreasing bound, stopping as soon as no
+       remaining entry can beat the best score (ratio <= quick_ratio).
+    3. Results are memoized per input word.
+    """
+
+    def __init__(self, vocabulary, cutoff: float = 0.7, memo_size: int = 4096):
+        self.cutoff = cutoff
+        self.vocabulary = tuple(dict.fromkeys(vocabulary))
+        self._exact = set(self.vocabulary)
+
+        alphabet = sorted({ch for word in self.vocabulary for ch in word})
+        self._columns = {ch: i for i, ch in enumerate(alphabet)}
+        self._counts = np.zeros((len(self.vocabulary), len(alphabet)), dtype=np.int32)
+        for row, word in enumerate(self.vocabulary):
+            for ch in word:
+                self._counts[row, self._columns[ch]] += 1
+        self._lengths = np.array([len(word) for word in self.vocabulary], dtype=np.int64)
+
+        self.match = lru_cache(maxsize=memo_size)(self._match)
+
+    def _upper_bounds(self, word: str):
+        """
+        Returns difflib's quick_ratio() of `word` against every vocabulary entry
+        (real_quick_ratio() is implied: it is never smaller than quick_ratio()).
+        """
+        query = np.zeros(len(self._columns), dtype=np.int32)
+        for ch in word:
+            column = self._columns.get(ch)
+            if column is not None:
+                query[column] += 1
+        shared = np.minimum(self._counts, query).sum(axis=1)
+        total = self._lengths + len(word)
+        # Same expression as SequenceMatcher.quick_ratio(), so the floats are identical.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(total > 0, 2.0 * shared / total, 1.0)
+
+    def _match(self, word: str):
+        """
+        Returns the best match for `word` in the vocabulary, or None.
+        """
+        if word in self._exact:
+            return word
+        if not self.vocabulary:
+            return None
+
+        bounds = self._upper_bounds(word)
+        candidates = np.flatnonzero(bounds >= self.cutoff)
+        if candidates.size == 0:
+            return None
+        candidates = candidates[np.argsort(-bounds[candidates], kind='stable')]
+
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(word)
+        best = None
+        for row in candidates:
+            # No remaining candidate can score higher than its bound.
+            if best is not None and bounds[row] < best[0]:
+                break
+            candidate = self.vocabulary[row]
+            matcher.set_seq1(candidate)
+            score = matcher.ratio()
+            # get_close_matches keeps the largest (score, candidate) pair
+            if score >= self.cutoff and (best is None or (score, candidate) > best):
+                best = (score, candidate)
+
+        return best[1] if best else None
+
+
+def build_skill_index(skills, cutoff: float = 0.7) -> SkillIndex:
+    """
+    Builds the index over the lower-cased skill vocabulary.
+    """
+    return SkillIndex((skill.lower() for skill in skills), cutoff=cutoff)
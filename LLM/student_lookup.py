@@ -0,0 +1,125 @@
+# LLM/student_lookup.py
+import os
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+ENROLLMENT_COLUMN = 'Enrollment Number'
+ROLE_COLUMN = 'Suggested Role'
+SKILLS_COLUMN = 'Final Skills'
+
+
+def parse_skill_list(raw) -> tuple:
+    """
+    Parses one stringified 'Final Skills' cell into a tuple of capitalized skills
+    (same rules the engine has always used).
+    """
+    return tuple(s.strip().capitalize() for s in str(raw).strip("[]'").split(",") if s.strip())
+
+
+class StudentLookup:
+    """
+    Compact, read-only view of the student records the engine needs:
+    enrollment -> suggested role, and the pre-parsed skill tuple of each student.
+
+    Built once at load time so a profile lookup is a dict access instead of a
+    scan of the whole DataFrame, and the DataFrame itself can be dropped.
+    The parsed arrays can be persisted to a pickle-free .npz file so later
+    startups skip CSV parsing entirely.
+    """
+
+    def __init__(self, enrollments, roles, skills):
+        # First occurrence of an enrollment wins, like the old `match.iloc[0]`.
+        role_map = {}
+        for enrollment, role in zip(enrollments, roles):
+            role_map.setdefault(enrollment, role)
+        self.roles = MappingProxyType(role_map)
+        self.skills = tuple(skills)
+
+    # --- Construction ---
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> "StudentLookup":
+        enrollments = [str(v).strip() for v in df[ENROLLMENT_COLUMN]] if ENROLLMENT_COLUMN in df else []
+        roles = [str(v).strip() if pd.notna(v) else "" for v in df[ROLE_COLUMN]] if ROLE_COLUMN in df else [""] * len(enrollments)
+        skills = [parse_skill_list(raw) for raw in df[SKILLS_COLUMN].dropna()] if SKILLS_COLUMN in df else []
+        return cls(enrollments, roles, skills)
+
+    @classmethod
+    def load(cls, csv_path: str, cache_path: str = None) -> "StudentLookup":
+        """
+        Loads the lookup from `cache_path` if it was built from the current CSV,
+        otherwise parses the CSV (only the three needed columns) and refreshes the cache.
+        Pass cache_path='' to disable the cache.
+        """
+        if not os.path.exists(csv_path):
+            raise FileNotFoundError(f"Student data file not found: {csv_path}")
+        if cache_path is None:
+            cache_path = os.path.splitext(csv_path)[0] + '.lookup.npz'
+        source_stamp = cls._source_stamp(csv_path)
+
+        if cache_path and os.path.exists(cache_path):
+            try:
+                lookup = cls._read_npz(cache_path, source_stamp)
+                if lookup is not None:
+                    print(f"Loaded student lookup from {cache_path}")
+                    return lookup
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Ignoring unreadable student lookup cache {cache_path}: {e}")
+
+        print(f"Loading student records from {csv_path}...")
+        df = pd.read_csv(csv_path, usecols=lambda c: c in (ENROLLMENT_COLUMN, ROLE_COLUMN, SKILLS_COLUMN))
+        lookup = cls.from_dataframe(df)
+        if cache_path:
+            try:
+                lookup._write_npz(cache_path, source_stamp)
+            except OSError as e:
+                print(f"Could not write student lookup cache {cache_path}: {e}")
+        return lookup
+
+    @staticmethod
+    def _source_stamp(csv_path):
+        stat = os.stat(csv_path)
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    def _write_npz(self, path, source_stamp):
+        # Columnar and pickle-free: plain unicode arrays, the variable-length skill
+        # tuples flattened with an offsets array.
+        flat = [skill for skills in self.skills for skill in skills]
+        offsets = np.cumsum([0] + [len(skills) for skills in self.skills])
+        np.savez(
+            path,
+            source=np.array([source_stamp]),
+            enrollments=np.array(list(self.roles.keys()), dtype=str),
+            roles=np.array(list(self.roles.values()), dtype=str),
+            skills_flat=np.array(flat, dtype=str),
+            skills_offsets=offsets.astype(np.int64),
+        )
+
+    @classmethod
+    def _read_npz(cls, path, source_stamp):
+        with np.load(path, allow_pickle=False) as data:
+            if str(data['source'][0]) != source_stamp:
+                return None
+            flat = data['skills_flat'].tolist()
+            offsets = data['skills_offsets'].tolist()
+            skills = [tuple(flat[start:end]) for start, end in zip(offsets[:-1], offsets[1:])]
+            return cls(data['enrollments'].tolist(), data['roles'].tolist(), skills)
+
+    # --- Queries ---
+    def suggested_role(self, enrollment: str):
+        """
+        Returns the suggested role recorded for `enrollment`, or None.
+        """
+        if not enrollment:
+            return None
+        return self.roles.get(str(enrollment).strip())
+
+    def all_skills(self) -> list[str]:
+        """
+        Returns the sorted vocabulary of every skill in the records.
+        """
+        return sorted({skill for skills in self.skills for skill in skills})
+
+    def __len__(self):
+        return len(self.roles)
@@ -0,0 +1,362 @@
+# LLM/vector_store.py
+# FAISS vector store for the RAG pipeline, laid out so every gunicorn worker
+# can share it instead of holding its own copy:
+#
+#   <store dir>/index.faiss      the FAISS index, opened with IO_FLAG_MMAP (read-only)
+#   <store dir>/docstore.sqlite  chunk text + metadata, row id = FAISS id
+#   <store dir>/manifest.json    index factory, dimension, metric, embedding model, size
+#
+# Nothing is unpickled at load time: the index pages come from the OS page cache
+# (shared by all processes) and a chunk's text is read from SQLite only when a
+# search returns it.
+#
+# The index type is any faiss.index_factory string, e.g.
+#   "Flat"            exact search (default; fine up to ~100k chunks)
+#   "HNSW32"          graph index, fast approximate search without training
+#   "IVF256,Flat"     inverted lists (needs >= 256 chunks to train)
+#   "IVF256,PQ16"     inverted lists + product quantization (~16 bytes per vector)
+#
+# `build` and `migrate` record each chunk's source and hash, so LLM/ingest.py
+# updates their output incrementally rather than rebuilding it:
+#
+#   python -m LLM.vector_store build --pdf LLM/data/Research_Paper.pdf --out LLM/embeddings/vector_store --factory HNSW32
+#   python -m LLM.vector_store migrate --legacy LLM/embeddings/faiss_index --out LLM/embeddings/vector_store
+import argparse
+import json
+import os
+import re
+from typing import Any, Optional
+
+import faiss
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+import instrumentation
+import sqlite_util
+
+INDEX_FILE = 'index.faiss'
+DOCSTORE_FILE = 'docstore.sqlite'
+MANIFEST_FILE = 'manifest.json'
+
+DEFAULT_FACTORY = 'Flat'
+DEFAULT_EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+
+
+def normalize(vectors) -> np.ndarray:
+    """
+    L2-normalizes embeddings so inner product = cosine similarity (scores in [-1, 1]).
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+# --- Docstore ---
+class SqliteDocstore:
+    """
+    Chunk text and metadata keyed by FAISS id, read on demand.
+
+    Each row also keeps its source, content hash and embedding (used by
+    LLM/ingest.py to update the store incrementally and to compact it without
+    re-embedding). Removed chunks are tombstoned (deleted = 1): their vectors
+    stay in the index until the next compaction, but they are never returned.
+    """
+
+    _COLUMNS = (('source', 'TEXT'), ('chunk_hash', 'TEXT'), ('vector', 'BLOB'), ('deleted', 'INTEGER NOT NULL DEFAULT 0'))
+
+    def __init__(self, path, readonly=True):
+        self.path = path
+        self.readonly = readonly
+        self._connections = sqlite_util.ThreadLocalConnection(path, readonly=readonly)
+        if not readonly:
+            with self._connection() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS documents ("
+                    " id INTEGER PRIMARY KEY, page_content TEXT NOT NULL, metadata TEXT NOT NULL)"
+                )
+                existing = {row[1] for row in conn.execute("PRAGMA table_info(documents)")}
+                for name, kind in self._COLUMNS:
+                    if name not in existing:
+                        conn.execute(f"ALTER TABLE documents ADD COLUMN {name} {kind}")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_source ON documents(source, chunk_hash)")
+
+    def _connection(self):
+        return self._connections.get()
+
+    def add(self, ids, texts, metadatas, sources=None, hashes=None, vectors=None):
+        n = len(texts)
+        sources = sources or [None] * n
+        hashes = hashes or [None] * n
+        blobs = [None] * n if vectors is None else [np.asarray(v, dtype=np.float32).tobytes() for v in vectors]
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO documents (id, page_content, metadata, source, chunk_hash, vector, deleted)"
+                " VALUES (?, ?, ?, ?, ?, ?, 0)",
+                [(int(i), text, json.dumps(meta or {}, default=str), source, chunk_hash, blob)
+                 for i, text, meta, source, chunk_hash, blob in zip(ids, texts, metadatas, sources, hashes, blobs)]
+            )
+
+    def get(self, ids) -> dict:
+        """
+        Returns {id: Document} for the ids that exist and are not tombstoned.
+        """
+        ids = [int(i) for i in ids]
+        if not ids:
+            return {}
+        rows = self._connection().execute(
+            f"SELECT id, page_content, metadata FROM documents WHERE deleted = 0 AND id IN ({', '.join('?' * len(ids))})", ids
+        ).fetchall()
+        return {row_id: Document(page_content=text, metadata=json.loads(meta)) for row_id, text, meta in rows}
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM documents WHERE deleted = 0").fetchone()[0]
+
+    # --- Incremental updates (LLM/ingest.py) ---
+    def source_chunks(self, source) -> dict:
+        """
+        {chunk_hash: (id, deleted)} of every chunk ever stored for `source`.
+        """
+        rows = self._connection().execute(
+            "SELECT chunk_hash, id, deleted FROM documents WHERE source = ?", (source,)
+        ).fetchall()
+        return {chunk_hash: (row_id, bool(deleted)) for chunk_hash, row_id, deleted in rows}
+
+    def set_deleted(self, ids, deleted: bool):
+        with self._connection() as conn:
+            conn.executemany("UPDATE documents SET deleted = ? WHERE id = ?", [(int(deleted), int(i)) for i in ids])
+
+    def update_metadata(self, items):
+        """
+        items: (id, metadata) pairs, e.g. a kept CSV row that moved to another line.
+        """
+        with self._connection() as conn:
+            conn.executemany("UPDATE documents SET metadata = ? WHERE id = ?",
+                             [(json.dumps(meta, default=str), int(i)) for i, meta in items])
+
+    def tombstone_source(self, source) -> int:
+        with self._connection() as conn:
+            return conn.execute("UPDATE documents SET deleted = 1 WHERE source = ? AND deleted = 0", (source,)).rowcount
+
+    def tombstone_count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM documents WHERE deleted = 1").fetchone()[0]
+
+    def truncate(self, ntotal) -> int:
+        """
+        Drops rows whose id is not in an index of `ntotal` vectors (left by an interrupted update).
+        """
+        with self._connection() as conn:
+            return conn.execute("DELETE FROM documents WHERE id >= ?", (int(ntotal),)).rowcount
+
+    def live_rows(self):
+        """
+        Yields (id, page_content, metadata, source, chunk_hash, vector or None) of every live chunk, by id.
+        """
+        rows = self._connection().execute(
+            "SELECT id, page_content, metadata, source, chunk_hash, vector FROM documents WHERE deleted = 0 ORDER BY id"
+        )
+        for row_id, text, meta, source, chunk_hash, blob in rows:
+            yield row_id, text, json.loads(meta), source, chunk_hash, None if blob is None else np.frombuffer(blob, dtype=np.float32)
+
+# --- Building ---
+def _nlist(factory):
+    match = re.search(r'IVF(\d+)', factory)
+    return int(match.group(1)) if match else 0
+
+
+def build_index(vectors: np.ndarray, factory: str = DEFAULT_FACTORY):
+    """
+    Creates, trains and fills an inner-product index from normalized vectors.
+    An IVF factory with more lists than there are vectors to train on falls back to Flat.
+    """
+    dim = vectors.shape[1]
+    if _nlist(factory) > len(vectors):
+        print(f"[vector_store] {len(vectors)} vectors are too few to train '{factory}'; using 'Flat' instead.")
+        factory = 'Flat'
+    index = faiss.index_factory(dim, factory, faiss.METRIC_INNER_PRODUCT)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index, factory
+
+
+def write_store(out_dir, vectors, texts, metadatas, factory=DEFAULT_FACTORY, embedding_model=DEFAULT_EMBEDDING_MODEL,
+                sources=None, hashes=None, manifest_extra=None):
+    """
+    Writes a complete store (index, docstore, manifest) from embeddings and their chunks.
+    The files are written next to the old ones and swapped in at the end.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    vectors = normalize(vectors)
+    index, factory = build_index(vectors, factory)
+
+    tmp_index = os.path.join(out_dir, INDEX_FILE + '.tmp')
+    tmp_docstore = os.path.join(out_dir, DOCSTORE_FILE + '.tmp')
+    if os.path.exists(tmp_docstore):
+        os.remove(tmp_docstore)
+    faiss.write_index(index, tmp_index)
+    SqliteDocstore(tmp_docstore, readonly=False).add(range(len(texts)), texts, metadatas, sources, hashes, vectors)
+
+    os.replace(tmp_index, os.path.join(out_dir, INDEX_FILE))
+    os.replace(tmp_docstore, os.path.join(out_dir, DOCSTORE_FILE))
+    manifest = {
+        'factory': factory, 'dimension': int(vectors.shape[1]), 'metric': 'inner_product', 'normalized': True,
+        'embedding_model': embedding_model, 'count': len(texts), 'tombstones': 0,
+        **(manifest_extra or {}),
+    }
+    write_manifest(out_dir, manifest)
+    print(f"[vector_store] Wrote {len(texts)} chunks to {out_dir} ({factory}).")
+    return manifest
+
+
+def read_manifest(store_dir) -> dict:
+    with open(os.path.join(store_dir, MANIFEST_FILE), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_manifest(store_dir, manifest: dict):
+    tmp_path = os.path.join(store_dir, MANIFEST_FILE + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(store_dir, MANIFEST_FILE))
+
+
+def _write_documents(out_dir, vectors, texts, metadatas, factory, embedding_model, source_paths=()):
+    # Records sources and chunk hashes the way LLM/ingest.py does, so ingest keeps this store
+    from .ingest import adopt_chunks
+    rows, metadatas, sources, hashes, manifest_sources = adopt_chunks(texts, metadatas, source_paths)
+    return write_store(out_dir, np.asarray(vectors)[rows], [texts[i] for i in rows], metadatas, factory,
+                       embedding_model, sources=sources, hashes=hashes, manifest_extra={'sources': manifest_sources})
+
+
+def build_from_documents(documents, embedder, out_dir, factory=DEFAULT_FACTORY, embedding_model=DEFAULT_EMBEDDING_MODEL):
+    texts = [doc.page_content for doc in documents]
+    vectors = np.asarray(embedder.embed_documents(texts), dtype=np.float32)
+    return _write_documents(out_dir, vectors, texts, [doc.metadata for doc in documents], factory, embedding_model)
+
+
+def migrate_langchain_index(legacy_dir, out_dir, factory=DEFAULT_FACTORY, embedding_model=DEFAULT_EMBEDDING_MODEL,
+                            source_paths=()):
+    """
+    Converts a LangChain FAISS.save_local() folder (index.faiss + index.pkl) into
+    this layout, reusing its vectors (no re-embedding). The pickle is read this
+    one time only. A chunk whose recorded source path no longer resolves (e.g.
+    the index was built on another machine) is matched by file name against
+    `source_paths`.
+    """
+    import pickle
+
+    index = faiss.read_index(os.path.join(legacy_dir, 'index.faiss'))
+    vectors = index.reconstruct_n(0, index.ntotal)
+    with open(os.path.join(legacy_dir, 'index.pkl'), 'rb') as f:
+        docstore, index_to_docstore_id = pickle.load(f)  # our own file, written by FAISS.save_local
+
+    documents = [docstore.search(index_to_docstore_id[i]) for i in range(index.ntotal)]
+    return _write_documents(out_dir, vectors, [d.page_content for d in documents], [d.metadata for d in documents],
+                            factory, embedding_model, source_paths)
+
+
+# --- Loading / searching ---
+class VectorStore:
+    """
+    A read-only store opened from disk. search() is safe to call from many threads.
+    """
+
+    def __init__(self, index, docstore: SqliteDocstore, manifest: dict, embedder):
+        self.index = index
+        self.docstore = docstore
+        self.manifest = manifest
+        self.embedder = embedder
+
+    @classmethod
+    def load(cls, store_dir, embedder, mmap=True, nprobe=None, ef_search=None) -> "VectorStore":
+        manifest = read_manifest(store_dir)
+        index_path = os.path.join(store_dir, INDEX_FILE)
+        index = None
+        if mmap:
+            # IO_FLAG_MMAP_IFC (faiss >= 1.8) maps the flat codes and inverted lists
+            # in place; older builds only have IO_FLAG_MMAP (inverted lists). The two
+            # can't be combined, so try them in turn.
+            for flag in (getattr(faiss, 'IO_FLAG_MMAP_IFC', None), faiss.IO_FLAG_MMAP):
+                if flag is None:
+                    continue
+                try:
+                    index = faiss.read_index(index_path, flag | faiss.IO_FLAG_READ_ONLY)
+                    break
+                except RuntimeError as e:
+                    print(f"[vector_store] Memory-mapped load failed ({e}), trying the next way...")
+        if index is None:
+            index = faiss.read_index(index_path)
+
+        params = faiss.ParameterSpace()
+        if nprobe and _nlist(manifest['factory']):
+            params.set_index_parameter(index, 'nprobe', int(nprobe))
+        if ef_search and 'HNSW' in manifest['factory']:
+            params.set_index_parameter(index, 'efSearch', int(ef_search))
+
+        print(f"[vector_store] Loaded {index.ntotal} vectors ({manifest['factory']}) from {store_dir}")
+        return cls(index, SqliteDocstore(os.path.join(store_dir, DOCSTORE_FILE)), manifest, embedder)
+
+    def search(self, query: str, k: int = 4, score_threshold: Optional[float] = None) -> list:
+        """
+        Returns up to k (Document, cosine similarity) pairs, best first.
+        """
+        if self.index.ntotal == 0:
+            return []
+        vector = normalize([self.embedder.embed_query(query)])
+        with instrumentation.timer('retrieval', self.manifest['factory']):
+            # Ask for enough extra neighbours to make up for tombstoned chunks
+            fetch = min(k + self.manifest.get('tombstones', 0), self.index.ntotal)
+            scores, ids = self.index.search(vector, fetch)
+            hits = [(int(i), float(s)) for i, s in zip(ids[0], scores[0])
+                    if i != -1 and (score_threshold is None or s >= score_threshold)]
+            documents = self.docstore.get([i for i, _ in hits])
+        return [(documents[i], score) for i, score in hits if i in documents][:k]
+
+    def as_retriever(self, k: int = 4, score_threshold: Optional[float] = None) -> "VectorStoreRetriever":
+        return VectorStoreRetriever(store=self, k=k, score_threshold=score_threshold)
+
+
+class VectorStoreRetriever(BaseRetriever):
+    """
+    LangChain retriever over a VectorStore (drop-in for FAISS.as_retriever()).
+    """
+    store: Any
+    k: int = 4
+    score_threshold: Optional[float] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list:
+        return [doc for doc, _ in self.store.search(query, k=self.k, score_threshold=self.score_threshold)]
+
+
+def store_exists(store_dir) -> bool:
+    return all(os.path.exists(os.path.join(store_dir, name)) for name in (INDEX_FILE, DOCSTORE_FILE, MANIFEST_FILE))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or migrate the RAG vector store")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help="Embed a PDF into a new store")
+    build.add_argument('--pdf', required=True)
+    migrate = sub.add_parser('migrate', help="Convert a LangChain FAISS folder (index.faiss + index.pkl)")
+    migrate.add_argument('--legacy', required=True)
+    migrate.add_argument('--source', action='append', default=[],
+                         help="File the legacy index was built from, if its recorded path has moved (repeatable)")
+    for command in (build, migrate):
+        command.add_argument('--out', required=True)
+        command.add_argument('--factory', default=DEFAULT_FACTORY)
+        command.add_argument('--model', default=DEFAULT_EMBEDDING_MODEL)
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        migrate_langchain_index(args.legacy, args.out, args.factory, args.model, args.source)
+    else:
+        from langchain_community.document_loaders import PyPDFLoader
+        from .embedder import load_embedder
+        pages = PyPDFLoader(args.pdf).load_and_split()
+        build_from_documents(pages, load_embedder(args.model), args.out, args.factory, args.model)
+
+
+if __name__ == '__main__':
+    main()
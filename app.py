@@ -1,17 +1,29 @@
+import hashlib
+import hmac
 import os
+import re
 import pandas as pd
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from flask import Flask, render_template, request, redirect, url_for, flash, session, send_file, abort, jsonify, make_response
 from flask_login import current_user # Make sure you import this
 from werkzeug.security import generate_password_hash
 from werkzeug.utils import secure_filename
-from model import predict_bloom_level
+import upload_pipeline
+import jobs
+import bulk_provision
+import stats_service as stats
+import roster
+import cohort_analytics
+import report_pdf
+import assessment_rules
+import instrumentation
+from data_access import get_repository, SCORE_COLUMNS, REPORT_COLUMNS
 import json
 from dotenv import load_dotenv
 from supabase import create_client, Client
-import re
 import time # <--- ADD THIS AT THE TOP OF app.py
+import uuid
 
-from LLM.engine import GuidanceEngine
+import registry
 
 load_dotenv()
 
@@ -23,6 +35,15 @@ url: str = os.environ.get("SUPABASE_URL")
 key: str = os.environ.get("SUPABASE_SERVICE_KEY")
 supabase: Client = create_client(url, key)
 
+# Request timing, request-ID'd log lines and template render times (see instrumentation.py)
+instrumentation.init_app(app)
+
+
+@app.before_request
+def _instrument_supabase():
+    # supabase-py rebuilds its HTTP session on auth changes, so re-attach each time (a no-op if attached)
+    instrumentation.instrument_supabase(supabase)
+
 
 # In app.py
 
@@ -76,13 +97,8 @@ def get_skills_for_user(scores_dict):
     #    This handles both 'testdrive' users and real users.
     total_score = scores_dict.get('total_aq_score') or scores_dict.get('aq_score', 0)
     
-    # 2. Determine the AQ level (you can adjust these thresholds)
-    if total_score < 140:
-        level = "low"
-    elif total_score < 180:
-        level = "medium"
-    else:
-        level = "high"
+    # 2. Determine the AQ level (thresholds in assessment_rules.SKILL_TIER_THRESHOLDS)
+    level = assessment_rules.skill_tier(total_score)
     
     # 3. Get the correct skill list from your dictionary
     filtered_skills = SKILL_LEVELS.get(level, [])
@@ -98,16 +114,65 @@ ADMIN_PASSWORD = "hehe"
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'csv', 'xlsx'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Classified question banks (results CSV + summary JSON per upload)
+app.config['RESULTS_FOLDER'] = os.path.join(UPLOAD_FOLDER, 'results')
+# Per-row reports of bulk student uploads
+app.config['REPORTS_FOLDER'] = os.path.join(UPLOAD_FOLDER, 'reports')
+# Background classification jobs (see jobs.py)
+app.config['JOBS_DB'] = os.environ.get('JOBS_DB', os.path.join('cache', 'jobs.sqlite3'))
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', '1'))
+# Public /info statistics: recomputed at most once per STATS_TTL seconds,
+# served stale for up to STATS_STALE_TTL more while refreshing in the background
+app.config['STATS_TTL'] = int(os.environ.get('STATS_TTL', '300'))
+app.config['STATS_STALE_TTL'] = int(os.environ.get('STATS_STALE_TTL', '600'))
+app.config['STATS_CACHE'] = os.environ.get('STATS_CACHE', os.path.join('cache', 'info_stats.json'))
+# Precomputed class analytics (see cohort_analytics.py)
+app.config['COHORT_DB'] = os.environ.get('COHORT_DB', os.path.join('cache', 'cohort.sqlite3'))
+# A teacher's students are reloaded from Supabase on the first dashboard read after this many seconds
+app.config['COHORT_SYNC_TTL'] = int(os.environ.get('COHORT_SYNC_TTL', str(cohort_analytics.SYNC_TTL)))
+# Server-rendered PDFs (see report_pdf.py), cached by content hash
+app.config['PDF_CACHE_DIR'] = os.environ.get('PDF_CACHE_DIR', os.path.join('cache', 'pdf'))
+app.config['PDF_EXPORT_WORKERS'] = int(os.environ.get('PDF_EXPORT_WORKERS', str(os.cpu_count() or 1)))
 
-print("--- FLASK APP STARTING: INITIALIZING GUIDANCE ENGINE ---")
 # Define the paths for the engine's data files
 engine_config = {
     'student_data_path': os.path.join('LLM', 'data', 'Final_Sheet - Sheet3.csv'),
-    'research_paper_path': os.path.join('LLM', 'data', 'Research_Paper.pdf'),
-    'faiss_index_path': os.path.join('LLM', 'embeddings', 'faiss_index')
+    # Built by `python -m LLM.ingest add ...` before the app starts (see LLM/ingest.py)
+    'vector_store_path': os.environ.get('VECTOR_STORE_PATH', os.path.join('LLM', 'embeddings', 'vector_store')),
+    'vector_store_mmap': os.environ.get('VECTOR_STORE_MMAP', '1') == '1',
+    'faiss_nprobe': int(os.environ.get('FAISS_NPROBE', '8')),
+    'faiss_ef_search': int(os.environ.get('FAISS_EF_SEARCH', '64')),
+    # Query/chunk embeddings (LLM/embedder.py): torch, onnx or onnx_int8, cached in SQLite
+    'embedding_backend': os.environ.get('EMBED_BACKEND', 'torch'),
+    'embedding_batch_size': int(os.environ.get('EMBED_BATCH_SIZE', '64')),
+    'embedding_threads': int(os.environ['EMBED_THREADS']) if os.environ.get('EMBED_THREADS') else None,
+    'embedding_cache_path': os.environ.get('EMBED_CACHE_PATH', os.path.join('cache', 'embeddings.sqlite3')),
+    # Passages handed to the LLM, and the minimum cosine similarity a passage needs
+    'retriever_k': int(os.environ.get('RETRIEVER_K', '4')),
+    'retriever_score_threshold': float(os.environ['RETRIEVER_SCORE_THRESHOLD']) if os.environ.get('RETRIEVER_SCORE_THRESHOLD') else None,
+    # Identical recommendation prompts are served from cache for this long (seconds)
+    'recommendation_cache_ttl': int(os.environ.get('RECOMMENDATION_CACHE_TTL', '3600')),
+    'recommendation_cache_size': int(os.environ.get('RECOMMENDATION_CACHE_SIZE', '1024'))
 }
-guidance_engine = GuidanceEngine(config=engine_config)
-print("--- GUIDANCE ENGINE INITIALIZED SUCCESSFULLY ---")
+
+
+def _build_guidance_engine():
+    # Imported here so that the LangChain stack is only pulled in when a report is generated.
+    from LLM.engine import GuidanceEngine
+    return GuidanceEngine(config=engine_config)
+
+
+# The engine (MiniLM embedder, FAISS index, Groq client, student CSV) is built on
+# the first report request, not at import time, so '/', '/home' and the login
+# pages are served without waiting for it.
+guidance_engine = registry.register('guidance_engine', _build_guidance_engine)
+
+# With ADEQUATE_PRELOAD=1 (and gunicorn's preload_app, see gunicorn.conf.py) everything
+# is loaded once here, in the master process, and shared copy-on-write by the workers.
+if registry.preload_enabled():
+    print("--- FLASK APP STARTING: PRELOADING MODELS ---")
+    registry.preload()
+    print("--- MODELS PRELOADED SUCCESSFULLY ---")
 
 
 
@@ -210,40 +275,70 @@ def intro():
     """
     return render_template("intro.html")
 
+
+stats_service = registry.register('stats_service', lambda: stats.StatsService(
+    lambda: stats.count_supabase_stats(supabase), ttl=app.config['STATS_TTL'],
+    stale_ttl=app.config['STATS_STALE_TTL'], cache_path=app.config['STATS_CACHE']
+))
+
+
+_template_digests = {}
+
+
+def _template_digest(name):
+    # Hash of a template's source, read once per process: a deploy that changes the page changes it too.
+    if name not in _template_digests:
+        source, _filename, _uptodate = app.jinja_env.loader.get_source(app.jinja_env, name)
+        _template_digests[name] = hashlib.sha1(source.encode('utf-8')).hexdigest()[:8]
+    return _template_digests[name]
+
+
 @app.route('/info')
 def info():
     """
-    Fetches key statistics from Supabase and renders the info page.
+    Renders the info page with key statistics.
+    The counts come from stats_service (recomputed at most once per STATS_TTL),
+    and the response carries an ETag so repeat visitors get a 304. The ETag
+    covers the counts and the template, so new HTML is never answered with a 304.
     """
-    try:
-        # 1. Total Students Enrolled
-        # head=True gets JUST the count, not the actual data (much faster)
-        students_res = supabase.table('students').select('*', count='exact', head=True).execute()
-        total_students = students_res.count if students_res.count else 0
-
-        # 2. Assessments Completed
-        # instead of checking for "not None", we simply check if the score is greater than 0.
-        completed_res = supabase.table('students').select('*', count='exact', head=True).gt('aq_score', 0).execute()
-        assessments_completed = completed_res.count if completed_res.count else 0
-        
-        # 3. Total Teachers Registered
-        teachers_res = supabase.table('teachers').select('*', count='exact', head=True).execute()
-        total_teachers = teachers_res.count if teachers_res.count else 0
+    cached = stats_service.get().get()
+    etag = f"{cached['etag']}-{_template_digest('info.html')}" if cached['etag'] else None
+    if etag and request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = make_response(render_template("info.html", stats=cached['stats']))
+    if etag:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = (
+            f"public, max-age={cached['max_age']}, stale-while-revalidate={app.config['STATS_STALE_TTL']}"
+        )
+    else:
+        response.headers['Cache-Control'] = 'no-store'
+    return response
 
-    except Exception as e:
-        # If DB fails, print error to console but show 0 on page so it doesn't crash
-        print(f"Error fetching stats from Supabase: {e}")
-        total_students = 0
-        assessments_completed = 0
-        total_teachers = 0
-
-    stats = {
-        'total_students': total_students,
-        'assessments_completed': assessments_completed,
-        'total_teachers': total_teachers
-    }
-    
-    return render_template("info.html", stats=stats)
+
+@app.route('/metrics')
+def metrics():
+    """
+    Prometheus scrape endpoint: per-stage and per-endpoint latency histograms and
+    the cache / tokenizer counters of all workers. With METRICS_TOKEN set it
+    requires `Authorization: Bearer <token>`; without it, only direct requests
+    from this host (no proxy in between) are answered.
+    """
+    token = os.environ.get('METRICS_TOKEN')
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode('utf-8'),
+                                   f"Bearer {token}".encode('utf-8')):
+            abort(401)
+    elif request.remote_addr not in ('127.0.0.1', '::1') or 'X-Forwarded-For' in request.headers \
+            or 'Forwarded' in request.headers:
+        abort(403)
+    if not instrumentation.ENABLED:
+        abort(404)
+    response = make_response(instrumentation.render_metrics())
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
 
 @app.route('/home')
 def home():
@@ -338,6 +433,21 @@ def teacher_login():
 
 
 
+cohort_store = registry.register('cohort_store', lambda: cohort_analytics.CohortStore(
+    app.config['COHORT_DB'], client=supabase, sync_ttl=app.config['COHORT_SYNC_TTL']))
+pdf_cache = registry.register('pdf_cache', lambda: report_pdf.PdfCache(app.config['PDF_CACHE_DIR']))
+
+
+def _record_question_bank(result_id, summary):
+    # Analytics are best effort: a failure here must not fail the upload.
+    try:
+        cohort_store.get().record_question_bank(
+            result_id, summary['teacher_id'], summary['filename'], summary['total'], summary['level_counts']
+        )
+    except Exception as e:
+        print(f"Could not update cohort analytics for upload {result_id}: {e}")
+
+
 @app.route("/teacher/dashboard")
 def teacher_dashboard():
     # Protect the route - only logged-in teachers can access
@@ -348,14 +458,27 @@ def teacher_dashboard():
             'name': session.get('teacher_name', 'Teacher') # Using .get() is safer
         }
         
-        # 2. Pass the entire dictionary to the template as the 'teacher' variable.
-        return render_template("teacher_dashboard.html", teacher=teacher_data)
+        # 2. Class analytics, precomputed whenever scores or uploads change
+        analytics = cohort_store.get().get(session['teacher_id'])
+
+        # 3. Pass the entire dictionary to the template as the 'teacher' variable.
+        return render_template("teacher_dashboard.html", teacher=teacher_data, analytics=analytics)
     
     flash("You need to be logged in to access this page.", "danger")
     return redirect(url_for('teacher_login'))
 
 
 
+@app.route("/api/teacher/analytics")
+def api_teacher_analytics():
+    """
+    The logged-in teacher's precomputed class analytics as JSON.
+    """
+    if 'teacher_id' not in session:
+        return jsonify({'error': 'Not logged in.'}), 401
+    return jsonify(cohort_store.get().get(session['teacher_id']))
+
+
 @app.route("/teacher/students")
 def teacher_students():
     # Protect the route - only logged-in teachers can access
@@ -363,21 +486,49 @@ def teacher_students():
         flash("You need to be logged in to access this page.", "danger")
         return redirect(url_for('teacher_login'))
     
-    # Get the ID of the currently logged-in teacher
-    teacher_id = session['teacher_id']
-    
-    # --- NEW SUPABASE CODE ---
-    # Replaces conn.execute, fetchall, and conn.close
-    response = supabase.table('students').select(
-        'id, enrollment_no, aq_score'
-    ).eq('teacher_id', teacher_id).execute()
-    
-    students = response.data
-    # --- END OF NEW CODE ---
-    
-    # Render a NEW template and pass the student data to it
-    return render_template("teacher_students.html", students=students)
+    # Only the first page is rendered here; teacher_dashboard.js loads the rest
+    # (and re-queries on filter changes) through /api/teacher/students.
+    try:
+        params = roster.parse_params(request.args)
+    except roster.RosterQueryError:
+        params = roster.parse_params({})  # bad query string: fall back to the default listing
+    page = roster.list_students(supabase, params, teacher_id=session['teacher_id'])
+
+    return render_template("teacher_students.html", students=page['students'], page=page,
+                           params=params, aq_bands=roster.AQ_BANDS)
+
 
+@app.route("/api/teacher/students")
+def api_teacher_students():
+    """
+    One page of the logged-in teacher's roster as JSON.
+    Query string: sort, dir, status, band, q, cursor, limit (see roster.parse_params).
+    """
+    if 'teacher_id' not in session:
+        return jsonify({'error': 'Not logged in.'}), 401
+    try:
+        params = roster.parse_params(request.args)
+    except roster.RosterQueryError as e:
+        return jsonify({'error': str(e)}), 400
+
+    page = roster.list_students(supabase, params, teacher_id=session['teacher_id'])
+    for student in page['students']:
+        student['report_url'] = url_for('student_report', student_id=student['id'])
+    return jsonify(page)
+
+
+@app.route("/teacher/regenerate_reports", methods=["POST"])
+def teacher_regenerate_reports():
+    """
+    Queues the regeneration of every report of this teacher's class as a
+    background job. Returns immediately with the URL to poll for progress.
+    """
+    if 'teacher_id' not in session:
+        return jsonify({'error': 'You must be logged in to access this feature.'}), 401
+
+    job_id = job_queue.get().submit('regenerate_reports', {'teacher_id': session['teacher_id']},
+                                    owner=session['teacher_id'])
+    return jsonify({'job_id': job_id, 'status_url': url_for('job_status', job_id=job_id)}), 202
 
 
 @app.route('/teacher/logout')
@@ -409,43 +560,256 @@ def upload_predict():
         return redirect(url_for('teacher_dashboard'))
 
     if file and allowed_file(file.filename):
+        result_id = uuid.uuid4().hex
         filename = secure_filename(file.filename)
-        # Ensure the uploads directory exists
-        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        # Ensure the uploads directories exist
+        os.makedirs(app.config['RESULTS_FOLDER'], exist_ok=True)
+        # werkzeug streams the upload to disk; the id prefix keeps concurrent uploads apart
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{result_id}_{filename}")
         file.save(filepath)
+        paths = upload_pipeline.result_paths(app.config['RESULTS_FOLDER'], result_id)
 
         try:
-            # Read the uploaded file using pandas
-            if filename.endswith('.csv'):
-                df = pd.read_csv(filepath)
-            else:
-                df = pd.read_excel(filepath)
-
-            # Validate that the 'question' column exists
-            if 'question' not in df.columns:
-                flash('The uploaded file must contain a column named "question".', "danger")
-                return redirect(url_for('teacher_dashboard'))
-
-            # Apply the prediction model to each question
-            df['predicted_level'] = df['question'].apply(predict_bloom_level)
-            
-            # Convert the DataFrame into a list of dictionaries.
-            results = df.to_dict(orient='records')
-            
-            # Render the HTML page, sending the results data directly to it.
-            # No need to store in session anymore.
-            return render_template('results.html', results=results)
+            # Read, classify and write the file chunk by chunk (see upload_pipeline.py)
+            summary = upload_pipeline.classify_file(filepath, paths['csv'])
+            summary.update({'teacher_id': session['teacher_id'], 'filename': filename})
+            upload_pipeline.save_summary(paths['summary'], summary)
+            _record_question_bank(result_id, summary)
 
         except Exception as e:
-            flash(f"An error occurred while processing the file: {e}", "danger")
+            # Don't leave a half-written results file behind
+            if os.path.exists(paths['csv']):
+                os.remove(paths['csv'])
+            if isinstance(e, upload_pipeline.UploadFormatError):
+                flash(str(e), "danger")
+            else:
+                flash(f"An error occurred while processing the file: {e}", "danger")
             return redirect(url_for('teacher_dashboard'))
 
+        finally:
+            # The original upload is no longer needed once it has been classified
+            if os.path.exists(filepath):
+                os.remove(filepath)
+
+        return redirect(url_for('classification_results', result_id=result_id))
+
     else:
         flash('Invalid file type. Please upload a .csv or .xlsx file.', "danger")
         return redirect(url_for('teacher_dashboard'))
 
 
+def _load_owned_result(result_id):
+    """
+    Returns (paths, summary) for a classification run of the logged-in teacher, or aborts with 404.
+    """
+    try:
+        paths = upload_pipeline.result_paths(app.config['RESULTS_FOLDER'], result_id)
+    except ValueError:
+        abort(404)
+    summary = upload_pipeline.load_summary(paths['summary'])
+    if not summary or summary.get('teacher_id') != session.get('teacher_id'):
+        abort(404)
+    return paths, summary
+
+
+@app.route('/results/<result_id>')
+def classification_results(result_id):
+    if 'teacher_id' not in session:
+        flash("You must be logged in to access this feature.", "danger")
+        return redirect(url_for('teacher_login'))
+
+    paths, summary = _load_owned_result(result_id)
+
+    # Only one page of rows is read from disk and rendered
+    page_size = upload_pipeline.PAGE_SIZE
+    total_pages = max((summary['total'] + page_size - 1) // page_size, 1)
+    page = min(max(request.args.get('page', 1, type=int), 1), total_pages)
+    results = upload_pipeline.read_results_page(paths['csv'], page, page_size) if summary['total'] else []
+
+    return render_template(
+        'results.html', results=results, summary=summary, result_id=result_id,
+        page=page, total_pages=total_pages
+    )
+
+
+@app.route('/results/<result_id>/download/<fmt>')
+def download_results(result_id, fmt):
+    if 'teacher_id' not in session:
+        return redirect(url_for('teacher_login'))
+
+    paths, summary = _load_owned_result(result_id)
+    download_name = f"{os.path.splitext(summary.get('filename', 'questions'))[0]}_classified"
+
+    if fmt == 'csv':
+        return send_file(os.path.abspath(paths['csv']), as_attachment=True, download_name=f"{download_name}.csv")
+    if fmt == 'xlsx':
+        # Converted on first request, then reused
+        if not os.path.exists(paths['xlsx']):
+            upload_pipeline.write_xlsx(paths['csv'], paths['xlsx'])
+        return send_file(os.path.abspath(paths['xlsx']), as_attachment=True, download_name=f"{download_name}.xlsx")
+    if fmt == 'pdf':
+        # Keyed on the summary and the results file, so a re-classification re-renders
+        stat = os.stat(paths['csv'])
+        key = report_pdf.content_key('classification_results', [result_id, summary, stat.st_size, stat.st_mtime_ns])
+        path = pdf_cache.get().get_or_render(
+            key, report_pdf.classification_results_pdf, summary, paths['csv'],
+            upload_pipeline.QUESTION_COLUMN, upload_pipeline.LEVEL_COLUMN
+        )
+        return send_file(os.path.abspath(path), mimetype='application/pdf', as_attachment=True,
+                         download_name=f"{download_name}.pdf")
+    abort(404)
+
+
+# ---------------------------------------------
+# BACKGROUND CLASSIFICATION JOBS
+# ---------------------------------------------
+def _run_classification_job(payload, progress):
+    """
+    Job handler: classifies an uploaded file into the results folder (runs on a job worker thread).
+    """
+    paths = upload_pipeline.result_paths(app.config['RESULTS_FOLDER'], payload['result_id'])
+    try:
+        summary = upload_pipeline.classify_file(payload['upload_path'], paths['csv'], progress=progress)
+        summary.update({'teacher_id': payload['teacher_id'], 'filename': payload['filename']})
+        upload_pipeline.save_summary(paths['summary'], summary)
+        _record_question_bank(payload['result_id'], summary)
+        return {'total': summary['total']}
+    except Exception:
+        if os.path.exists(paths['csv']):
+            os.remove(paths['csv'])
+        raise
+    finally:
+        if os.path.exists(payload['upload_path']):
+            os.remove(payload['upload_path'])
+
+
+def _run_regenerate_reports_job(payload, progress):
+    """
+    Job handler: regenerates the career suggestions of every student of a teacher
+    who has completed the assessment and picked skills, with the LLM calls run concurrently.
+    """
+    response = supabase.table('students').select(
+        ', '.join(('id', 'enrollment_no') + SCORE_COLUMNS + ('skills',))
+    ).eq('teacher_id', payload['teacher_id']).not_.is_('aq_score', 'null').execute()
+    students = [s for s in response.data if s.get('skills')]
+    progress(0, len(students))
+    if not students:
+        return {'total': 0, 'updated': 0, 'failed': 0}
+
+    profiles = [{
+        'enrollment': s['enrollment_no'],
+        'aq_score': s['aq_score'],
+        'skills': [skill.strip() for skill in s['skills'].split(',') if skill.strip()],
+        'traits': get_top_trait_codes(s)
+    } for s in students]
+
+    results = guidance_engine.get().generate_batch(
+        profiles, concurrency=int(os.environ.get('LLM_CONCURRENCY', '5')), progress=progress
+    )
+
+    updated, failed = 0, 0
+    for student, result in zip(students, results):
+        if result['error'] or not result['careers']:
+            failed += 1
+            print(f"Report regeneration failed for {student['enrollment_no']}: {result['error']}")
+            continue
+        supabase.table('students').update({
+            "career_suggestion": json.dumps(build_report_data(result['careers']))
+        }).eq('id', student['id']).execute()
+        updated += 1
+    return {'total': len(students), 'updated': updated, 'failed': failed}
+
+
+job_queue = registry.register('job_queue', lambda: jobs.JobQueue(
+    app.config['JOBS_DB'],
+    handlers={'classify': _run_classification_job, 'regenerate_reports': _run_regenerate_reports_job},
+    workers=app.config['JOB_WORKERS']
+))
+
+# Pick up jobs queued before a restart right away. With ADEQUATE_PRELOAD the
+# threads started here stay in the master; gunicorn.conf.py's post_fork starts
+# each worker's own.
+if not registry.preload_enabled():
+    job_queue.get().start()
+
+
+def _load_owned_job(job_id):
+    job = job_queue.get().get(job_id)
+    if not job or job['owner'] != str(session.get('teacher_id')):
+        abort(404)
+    return job
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Accepts a question-bank upload and queues it for classification.
+    Returns immediately with the URL to poll for progress.
+    """
+    if 'teacher_id' not in session:
+        return jsonify({'error': 'You must be logged in to access this feature.'}), 401
+
+    file = request.files.get('file')
+    if not file or file.filename == '':
+        return jsonify({'error': 'No file selected.'}), 400
+    if not allowed_file(file.filename):
+        return jsonify({'error': 'Invalid file type. Please upload a .csv or .xlsx file.'}), 400
+
+    job_id = uuid.uuid4().hex
+    filename = secure_filename(file.filename)
+    os.makedirs(app.config['RESULTS_FOLDER'], exist_ok=True)
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{job_id}_{filename}")
+    file.save(filepath)
+
+    # The job id doubles as the result id, so /results/<job_id> shows the output.
+    job_queue.get().submit('classify', {
+        'result_id': job_id,
+        'upload_path': filepath,
+        'filename': filename,
+        'teacher_id': session['teacher_id'],
+    }, owner=session['teacher_id'], job_id=job_id)
+
+    return jsonify({'job_id': job_id, 'status_url': url_for('job_status', job_id=job_id)}), 202
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    if 'teacher_id' not in session:
+        return jsonify({'error': 'You must be logged in to access this feature.'}), 401
+
+    job = _load_owned_job(job_id)
+    response = {
+        'job_id': job_id,
+        'kind': job['kind'],
+        'status': job['status'],
+        'percent': job['percent'],
+        'rows_done': job['done'],
+        'rows_total': job['total'],
+        'error': job['error'],
+    }
+    if job['status'] == jobs.DONE:
+        response['result'] = job['result']
+        if job['kind'] == 'classify':
+            response['results_url'] = url_for('classification_results', result_id=job_id)
+            response['download_url'] = url_for('job_download', job_id=job_id, fmt='csv')
+        else:
+            response['results_url'] = url_for('teacher_students')
+    return jsonify(response)
+
+
+@app.route('/jobs/<job_id>/download/<fmt>')
+def job_download(job_id, fmt):
+    if 'teacher_id' not in session:
+        return redirect(url_for('teacher_login'))
+
+    job = _load_owned_job(job_id)
+    if job['kind'] != 'classify':
+        abort(404)
+    if job['status'] != jobs.DONE:
+        return jsonify({'error': 'The job has not finished yet.', 'status': job['status']}), 409
+    return redirect(url_for('download_results', result_id=job_id, fmt=fmt))
+
+
 # --- Placeholder Routes ---
 # --- Admin Authentication Routes ---
 
@@ -484,9 +848,9 @@ def admin_dashboard():
     # --- NEW SUPABASE CODE ---
     # Replaces conn = get_db_connection()
 
-    # 1. Fetch all students
-    students_response = supabase.table('students').select('enrollment_no').execute()
-    students = students_response.data
+    # 1. First page of students (admin_dashboard.js loads the rest from /api/admin/students)
+    page = roster.list_students(supabase, roster.parse_params({}))
+    students = page['students']
 
     # 2. Fetch all teachers
     teachers_response = supabase.table('teachers').select('id, name').execute()
@@ -495,8 +859,27 @@ def admin_dashboard():
     # Replaces conn.close() (no longer needed)
     # --- END OF NEW CODE ---
     
+    # Link to the per-row report of the last bulk upload, if any
+    report_id = session.get('last_provision_report')
+    report_url = url_for('admin_upload_report', report_id=report_id) if report_id else None
+
     # Render the new dashboard template and pass the 'students' data to it
-    return render_template("admin_dashboard.html", students=students, teachers=teachers)
+    return render_template("admin_dashboard.html", students=students, page=page, teachers=teachers,
+                           aq_bands=roster.AQ_BANDS, report_url=report_url)
+
+
+@app.route("/api/admin/students")
+def api_admin_students():
+    """
+    One page of all student accounts as JSON (optionally ?teacher_id=...).
+    """
+    if not session.get('admin_logged_in'):
+        return jsonify({'error': 'Not logged in.'}), 401
+    try:
+        params = roster.parse_params(request.args)
+    except roster.RosterQueryError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(roster.list_students(supabase, params, teacher_id=request.args.get('teacher_id') or None))
 
 
 @app.route("/admin/logout")
@@ -528,60 +911,40 @@ def admin_upload_students():
             else:
                 df = pd.read_excel(file)
             
-            # Clean column names
-            df.columns = df.columns.str.strip()
-            
-            success_count = 0
-            
-            # 3. Loop through EVERY student
-            for index, row in df.iterrows():
-                # Get enrollment and remove leading/trailing spaces
-                enrollment = str(row['enrollment_no']).strip()
-                
-                # --- PASSWORD LOGIC ---
-                raw_pass = row['password']
-                if pd.isna(raw_pass): continue 
-
-                if isinstance(raw_pass, float):
-                    password = str(int(raw_pass))
-                else:
-                    password = str(raw_pass).strip()
-                
-                # Ensure password is at least 6 characters (Supabase requirement)
-                if len(password) < 6:
-                    password = password + "123"
-
-                # --- FIX: REMOVE SPACES FROM EMAIL ---
-                # "MITU23 BTCSD015" -> "MITU23BTCSD015@mit-university.edu"
-                safe_enrollment = enrollment.replace(" ", "")
-                email = f"{safe_enrollment}@mit-university.edu"
-
-                try:
-                    # Create User
-                    supabase.auth.admin.create_user({
-                        "email": email,
-                        "password": password,
-                        "email_confirm": True, # Auto-confirm
-                        "user_metadata": {
-                            "enrollment_no": enrollment, # Original ID (with space) kept here
-                            "role": "student",
-                            "teacher_id": teacher_id
-                        }
-                    })
-                    success_count += 1
-
-                except Exception as e:
-                    # Ignore "User already registered" errors
-                    if "User already registered" not in str(e):
-                        print(f"Failed on {enrollment}: {str(e)}")
-
-            flash(f"Success! Uploaded {success_count} students.", "success")
+            # 3. Normalize the whole roster at once and create the accounts in parallel
+            #    (see bulk_provision.py)
+            normalized = bulk_provision.normalize_roster(df)
+            result = bulk_provision.provision_students(
+                normalized, teacher_id, bulk_provision.auth_url_from_env(), key,
+                max_workers=int(os.environ.get('PROVISION_WORKERS', '8'))
+            )
+
+            # 4. Per-row report the admin can download
+            report_id = uuid.uuid4().hex
+            bulk_provision.write_report(result, os.path.join(app.config['REPORTS_FOLDER'], f"{report_id}.csv"))
+            session['last_provision_report'] = report_id
+
+            counts = bulk_provision.summarize(result)
+            flash(f"Success! Uploaded {counts['created']} students "
+                  f"({counts['exists']} already registered, {counts['skipped']} skipped, {counts['failed']} failed).",
+                  "success" if not counts['failed'] else "warning")
 
         except Exception as e:
             flash(f"File Error: {str(e)}", "danger")
     
     return redirect(url_for('admin_dashboard'))
 
+@app.route("/admin/upload/report/<report_id>")
+def admin_upload_report(report_id):
+    if not session.get('admin_logged_in'):
+        return redirect(url_for('admin_login'))
+    if not re.fullmatch(r'[0-9a-f]{32}', report_id):
+        abort(404)
+    path = os.path.join(app.config['REPORTS_FOLDER'], f"{report_id}.csv")
+    if not os.path.exists(path):
+        abort(404)
+    return send_file(os.path.abspath(path), as_attachment=True, download_name="student_upload_report.csv")
+
 # --- CORRECTED STUDENT ROUTES FOR DEMO USER ---
 
 @app.route("/student/login", methods=["GET", "POST"])
@@ -767,9 +1130,10 @@ def student_dashboard():
     # ... (Keep your existing testdrive logic here) ...
 
     if student_id != 0: # Real user
-        # 1. Get Student Data
-        response = supabase.table('students').select('aq_score, career_suggestion').eq('id', student_id).single().execute()
-        student = response.data
+        # 1. Get Student Data (and whether feedback exists, in the same round trip)
+        student, has_feedback = get_repository(supabase).get_student_with_feedback(
+            student_id, ('aq_score', 'career_suggestion')
+        )
         
         if student:
             assessment_has_been_taken = student['aq_score'] is not None
@@ -784,10 +1148,11 @@ def student_dashboard():
                     pass # Allow access immediately
                 else:
                     # Otherwise, check the database (for previous logins)
-                    fb_check = supabase.table('student_feedback').select('id').eq('student_id', student_id).execute()
+                    if has_feedback is None:
+                        has_feedback = get_repository(supabase).has_feedback(student_id)
                     
                     # If NO feedback found in DB, force redirect
-                    if not fb_check.data:
+                    if not has_feedback:
                         flash("Please complete this quick feedback to unlock your dashboard.", "warning")
                         return redirect(url_for('student_feedback_form'))
                 # --- FIX END --
@@ -808,31 +1173,30 @@ def submit_assessment():
     if 'student_id' not in session:
         return redirect(url_for('student_login'))
 
-    # ... (Calculations stay the same) ...
-    control_score = sum(int(request.form.get(f'q{i}', 0)) for i in range(1, 4))
-    ownership_score = sum(int(request.form.get(f'q{i}', 0)) for i in range(4, 12))
-    reach_score = sum(int(request.form.get(f'q{i}', 0)) for i in range(12, 17))
-    endurance_score = sum(int(request.form.get(f'q{i}', 0)) for i in range(17, 22))
-    attitude_score = sum(int(request.form.get(f'q{i}', 0)) for i in [22, 23])
-    total_aq_score = (control_score + ownership_score + reach_score + endurance_score + attitude_score) * 2
+    # Which answers make up which dimension lives in assessment_rules
+    scores = assessment_rules.score_answers(request.form)
     
     # ... (Testdrive logic stays the same) ...
 
     if session.get('student_id') != 0:
-        scores_to_update = {
-            "aq_score": total_aq_score,
-            "control_score": control_score,
-            "ownership_score": ownership_score,
-            "reach_score": reach_score,
-            "endurance_score": endurance_score,
-            "attitude_score": attitude_score
-        }
+        scores_to_update = {"aq_score": scores["aq_score"]}
+        scores_to_update.update((column, scores[column]) for column in assessment_rules.SCORE_COLUMNS)
         
         # 1. Update Database
-        response = supabase.table('students').update(scores_to_update).eq('id', session['student_id']).execute()
+        repository = get_repository(supabase)
+        repository.update_student(session['student_id'], scores_to_update)
+
+        # Keep the class analytics current (the update returned the row, so
+        # teacher_id is normally known without another query)
+        try:
+            teacher_id = (repository.get_student(session['student_id'], ('teacher_id',)) or {}).get('teacher_id')
+            cohort_store.get().record_scores(session['student_id'], teacher_id, scores_to_update)
+        except Exception as e:
+            print(f"Could not update cohort analytics: {e}")
         
         # 2. FIX: Save to Session so the next page finds it INSTANTLY
         session['latest_scores'] = scores_to_update  # <--- FIX ADDED HERE
+        session['latest_scores_for'] = session['student_id']  # whose scores these are
         session.modified = True                      # <--- FIX ADDED HERE
 
     return redirect(url_for('show_assessment_results'))
@@ -844,24 +1208,13 @@ def show_assessment_results():
 
     scores = None
 
-    if 'latest_scores' in session:
-        scores = session['latest_scores']
     # --- "testdrive" logic is unchanged ---
     if session.get('student_id') == 0:
         scores = session.get('test_user_scores')
     else:
-        # --- NEW SUPABASE CODE ---
-        # Replaces get_db_connection, conn.execute, fetchone, and conn.close
-        # --- NEW SUPABASE CODE ---
-        # Replaces get_db_connection, conn.execute, fetchone, and conn.close
-        response = supabase.table('students').select(
-            'aq_score, control_score, ownership_score, reach_score, endurance_score, attitude_score'
-        ).eq('id', session['student_id']).limit(1).execute()
-        
-        if response.data:
-            # response.data[0] is already the dictionary we need
-            scores = response.data[0] 
-        # --- END OF NEW CODE ---
+        # The scores submit_assessment just wrote are in the session; only read
+        # the database if they aren't (e.g. a later visit from another login).
+        scores = _session_scores() or get_repository(supabase).get_student(session['student_id'], SCORE_COLUMNS)
 
     # --- CRITICAL FIX: Check for Missing/Null Scores ---
     # The error happened because 'scores' existed (the student row exists), 
@@ -882,6 +1235,26 @@ def show_assessment_results():
     # The template (assessment_results.html) will still call it 'all_skills'
     return render_template("assessment_results.html", scores=scores, all_skills=filtered_skills)
 
+def _session_scores():
+    """
+    Returns the scores submit_assessment stored in the session for the logged-in student, or None.
+    """
+    if session.get('latest_scores') and session.get('latest_scores_for') == session.get('student_id'):
+        return session['latest_scores']
+    return None
+
+
+def get_top_trait_codes(student_data):
+    """
+    Returns the letters (C/O/R/E/A) of the student's two highest-scoring traits.
+    """
+    return assessment_rules.top_trait_codes(student_data)
+
+
+def build_report_data(careers):
+    return {"suggestions": [{"career": career, "reason": "This path aligns well with your calculated strengths and selected skills."} for career in careers]}
+
+
 @app.route("/student/generate_report", methods=["POST"])
 def generate_report():
     if 'student_id' not in session:
@@ -904,33 +1277,26 @@ def generate_report():
             'attitude_score': scores.get('attitude_score')
         }
     else:
-        # --- NEW SUPABASE CODE (SELECT) ---
-        # Replaces get_db_connection, conn.execute, fetchone, and conn.close
-        response = supabase.table('students').select(
-            'enrollment_no, aq_score, control_score, ownership_score, reach_score, endurance_score, attitude_score'
-        ).eq('id', session['student_id']).limit(1).execute()
-        
-        if response.data:
-            student_data = response.data[0] # This is the new "dict(student)"
-        # --- END OF NEW CODE ---
+        # Scores and enrollment number are usually already in the session;
+        # the repository only fetches whatever is still missing.
+        repository = get_repository(supabase)
+        scores = _session_scores()
+        if scores and session.get('enrollment_no'):
+            repository.prime(session['student_id'], dict(scores, enrollment_no=session['enrollment_no']))
+        student_data = repository.get_student(session['student_id'], ('enrollment_no',) + SCORE_COLUMNS) or {}
 
     if not student_data:
         flash("Could not retrieve student data.", "danger")
         return redirect(url_for('student_dashboard'))
     
     # --- This report generation logic is unchanged ---
-    trait_scores = {
-        "C": student_data['control_score'], "O": student_data['ownership_score'],
-        "R": student_data['reach_score'], "E": student_data['endurance_score'],
-        "A": student_data['attitude_score']
-    }
-    top_traits = [trait for trait, score in sorted(trait_scores.items(), key=lambda item: item[1], reverse=True)[:2]]
+    top_traits = get_top_trait_codes(student_data)
 
-    final_recommendations = guidance_engine.generate_recommendations(
+    final_recommendations = guidance_engine.get().generate_recommendations(
         enrollment=student_data['enrollment_no'], aq_score=student_data['aq_score'],
         skills=selected_skills, traits=top_traits
     )
-    report_data = {"suggestions": [{"career": career, "reason": "This path aligns well with your calculated strengths and selected skills."} for career in final_recommendations]}
+    report_data = build_report_data(final_recommendations)
     
     # --- "testdrive" logic is unchanged ---
     if session.get('student_id') == 0:
@@ -941,70 +1307,60 @@ def generate_report():
         # Replaces get_db_connection, conn.execute, conn.commit, and conn.close
         career_suggestion_json = json.dumps(report_data)
         
-        response = supabase.table('students').update({
+        get_repository(supabase).update_student(session['student_id'], {
             "skills": ", ".join(selected_skills),
             "career_suggestion": career_suggestion_json
-        }).eq('id', session['student_id']).execute()
+        })
         # --- END OF NEW CODE ---
     
     return redirect(url_for('student_report'))
 # NEW, SECURE VERSION of student_report
 # --- THIS IS THE NEW, SECURE VERSION of student_report ---
 # --- THIS IS THE FINAL, MIGRATED VERSION ---
-@app.route("/student/report")
-@app.route("/student/report/<int:student_id>")
-def student_report(student_id=None):
-    # conn = get_db_connection() <-- REMOVED
-    student_record = None
+def _load_report_student(student_id):
+    """
+    Returns (student_record, viewer_is_teacher, redirect_response) for the report
+    pages: a teacher may view their own students, a student only themselves.
+    """
     # This new variable will track who is viewing the page
     viewer_is_teacher = False
-    student = None # A helper variable to store the query result
+    student_record = None
 
     # Scenario 1: A teacher is viewing a student's report
     if 'teacher_id' in session and student_id is not None:
         viewer_is_teacher = True # We set this to True for the teacher
         
-        # --- NEW SUPABASE CODE ---
-        response = supabase.table('students').select('*').eq('id', student_id).limit(1).execute()
-        if response.data:
-            student = response.data[0] # This is the new "fetchone()"
-        # --- END OF NEW CODE ---
+        # Only the columns the report needs, not select('*')
+        student = get_repository(supabase).get_student(student_id, REPORT_COLUMNS)
         
         # Security Check: Ensure the student belongs to this teacher
         if student and student['teacher_id'] == session['teacher_id']:
             student_record = student # It's already a dict
         else:
             flash("Permission Denied: You can only view reports for students assigned to you.", "danger")
-            # conn.close() <-- REMOVED
-            return redirect(url_for('teacher_students'))
+            return None, viewer_is_teacher, redirect(url_for('teacher_students'))
 
     # Scenario 2: A student is viewing their own report
     elif 'student_id' in session:
-        student_id_from_session = session['student_id']
-        
-        # --- NEW SUPABASE CODE ---
-        response = supabase.table('students').select('*').eq('id', student_id_from_session).limit(1).execute()
-        if response.data:
-            student = response.data[0] # This is the new "fetchone()"
-        # --- END OF NEW CODE ---
-
-        if student:
-            student_record = student # It's already a dict
+        # Only the columns the report needs, not select('*')
+        student_record = get_repository(supabase).get_student(session['student_id'], REPORT_COLUMNS)
     
     # If no one valid is logged in, redirect them
     else:
-        # conn.close() <-- REMOVED
-        return redirect(url_for('student_login'))
+        return None, viewer_is_teacher, redirect(url_for('student_login'))
 
     # Check if the report data exists before proceeding
     if not student_record or not student_record.get('aq_score'):
         flash("Report data not found. The student may need to complete the assessment first.", "warning")
-        # conn.close() <-- REMOVED
         # Redirect to the correct dashboard based on who is logged in
-        return redirect(url_for('teacher_students') if viewer_is_teacher else url_for('student_dashboard'))
+        return None, viewer_is_teacher, redirect(url_for('teacher_students') if viewer_is_teacher else url_for('student_dashboard'))
+    return student_record, viewer_is_teacher, None
+
 
-    # --- The rest of your report generation logic is unchanged ---
-    # ... (all the logic for suggestions, aq_category, trait_scores, etc. stays exactly the same) ...
+def _report_context(student_record):
+    """
+    Everything the career report shows (HTML page and PDF) for one student record.
+    """
     suggestions = []
     if student_record.get('career_suggestion'):
         # Add a check for empty string, just in case
@@ -1014,65 +1370,106 @@ def student_report(student_id=None):
             except json.JSONDecodeError:
                 suggestions = [] # Handle case where JSON is invalid
     
-    aq_score = student_record['aq_score']
-    if aq_score >= 180:
-        aq_category = {"name": "Climber", "description": "You excel at navigating challenges and consistently seek growth. You are highly resilient and resourceful."}
-    elif aq_score >= 160:
-        aq_category = {"name": "Moderate Climber", "description": "You are resilient and consistently work to overcome challenges, showing a strong capacity for growth and adaptation."}
-    elif aq_score >= 140:
-        aq_category = {"name": "Camper", "description": "You are steady and reliable, but may sometimes avoid difficult challenges to stay in a comfortable zone."}
-    elif aq_score >= 120:
-        aq_category = {"name": "Moderate Camper", "description": "You handle familiar situations well but tend to avoid new or significant challenges. There's a great opportunity to step outside your comfort zone."}
-    else:
-        aq_category = {"name": "Quitter", "description": "You may feel overwhelmed by adversity and have an opportunity to develop stronger resilience strategies."}
-
-    trait_scores = {
-        "Control": student_record.get('control_score', 0), # Use .get() for safety
-        "Ownership": student_record.get('ownership_score', 0),
-        "Reach": student_record.get('reach_score', 0), 
-        "Endurance": student_record.get('endurance_score', 0),
-        "Attitude": student_record.get('attitude_score', 0)
-    }
-    top_traits_list = sorted(trait_scores.items(), key=lambda item: item[1], reverse=True)[:2]
-    
-    bloom_level_map = {
-        "Control": "L1:Remembering, L3: Applying, L4: Analyzing", "Ownership": "L2: Understanding,L3: Applying, L4: Analyzing",
-        "Reach": "L5: Evaluating", "Endurance": "L5: Evaluating", "Attitude": "L4: Analyzing, L6: Creating"
-    }
-    bloom_skill_map = {
-        "L1": ["Remembrance"],
-        "L2": ["Inference"],
-        "L3": ["Solution-finding"],
-        "L4": ["Reasoning"],
-        "L5": ["Judgment"],
-        "L6": ["Abstract resoning"]  # (I kept your spelling)
+    # All the mapping tables are built once in assessment_rules; these are lookups.
+    aq_category = dict(assessment_rules.aq_category(student_record['aq_score']))
+    trait_scores = assessment_rules.trait_scores(student_record)
+    top_traits_list = assessment_rules.top_traits(student_record)
+
+    return {
+        'student': student_record, 'aq_category': aq_category, 'trait_scores': trait_scores,
+        'top_traits': top_traits_list, 'suggestions': suggestions,
+        'bloom_map': dict(assessment_rules.BLOOM_LEVEL_MAP), 'trait_skills_map': assessment_rules.TRAIT_SKILLS,
     }
 
-    trait_skills_map = {}
-    for trait, levels_str in bloom_level_map.items():
-        level_codes = re.findall(r'L\d', levels_str)
-        collected_skills = []
-        for code in level_codes:
-            collected_skills.extend(bloom_skill_map.get(code, []))
-    trait_skills_map[trait] = list(dict.fromkeys(collected_skills))
-    overall_top_skills = []
-    seen_skills = set()
-    for trait_name, trait_score in top_traits_list:
-            skills = trait_skills_map.get(trait_name, [])
-    for skill in skills:
-        if skill not in seen_skills:
-            overall_top_skills.append(skill)
-            seen_skills.add(skill)
-    # conn.close() <-- REMOVED
+
+@app.route("/student/report")
+@app.route("/student/report/<int:student_id>")
+def student_report(student_id=None):
+    student_record, viewer_is_teacher, redirect_response = _load_report_student(student_id)
+    if redirect_response:
+        return redirect_response
+
+    report = _report_context(student_record)
     
     # The final render_template call now includes the new variable
     return render_template(
         'student_report.html',
-        student=student_record, aq_category=aq_category,
-        trait_scores_json=json.dumps(trait_scores), top_traits=top_traits_list,
-        suggestions=suggestions, bloom_map=bloom_level_map, trait_skills_map=trait_skills_map,
-        viewer_is_teacher=viewer_is_teacher  # Pass the new variable to the HTML
+        student=student_record, aq_category=report['aq_category'],
+        trait_scores_json=json.dumps(report['trait_scores']), top_traits=report['top_traits'],
+        suggestions=report['suggestions'], bloom_map=report['bloom_map'], trait_skills_map=report['trait_skills_map'],
+        viewer_is_teacher=viewer_is_teacher,  # Pass the new variable to the HTML
+        pdf_url=url_for('student_report_pdf', student_id=student_id) if viewer_is_teacher else url_for('student_report_pdf')
+    )
+
+
+@app.route("/student/report/pdf")
+@app.route("/student/report/<int:student_id>/pdf")
+def student_report_pdf(student_id=None):
+    """
+    The career report as a PDF, rendered on the server and cached by content
+    (a new score or career_suggestion gives a new cache key).
+    """
+    student_record, _, redirect_response = _load_report_student(student_id)
+    if redirect_response:
+        return redirect_response
+
+    report = _pdf_report_data(student_record)
+    path = pdf_cache.get().get_or_render(
+        report_pdf.content_key('student_report', report), report_pdf.student_report_pdf, report
     )
+    return send_file(os.path.abspath(path), mimetype='application/pdf', as_attachment=True,
+                     download_name=f"career_report_{student_record.get('enrollment_no') or student_record.get('id')}.pdf")
+
+
+def _pdf_report_data(student_record):
+    # Only what the PDF shows, so the cache key changes exactly when the PDF would.
+    report = _report_context(student_record)
+    report['student'] = {'enrollment_no': student_record.get('enrollment_no'), 'aq_score': student_record.get('aq_score')}
+    report.pop('trait_skills_map', None)
+    return report
+
+
+@app.route("/teacher/students/export")
+def teacher_export_reports():
+    """
+    Every assessed student's report of this class as a ZIP of PDFs
+    (missing PDFs are rendered in a process pool, cached ones reused).
+    """
+    if 'teacher_id' not in session:
+        flash("You need to be logged in to access this page.", "danger")
+        return redirect(url_for('teacher_login'))
+
+    # Keyset-paged by id (PostgREST caps a single response)
+    students, last_id = [], None
+    while True:
+        query = supabase.table('students').select(', '.join(REPORT_COLUMNS)).eq(
+            'teacher_id', session['teacher_id']
+        ).gt('aq_score', 0).order('id').limit(1000)
+        if last_id is not None:
+            query = query.gt('id', last_id)
+        page = query.execute().data or []
+        students.extend(page)
+        if len(page) < 1000:
+            break
+        last_id = page[-1]['id']
+
+    if not students:
+        flash("No student has completed the assessment yet.", "info")
+        return redirect(url_for('teacher_students'))
+
+    reports = [
+        (f"career_report_{secure_filename(str(s.get('enrollment_no') or s['id']))}.pdf", _pdf_report_data(s))
+        for s in students
+    ]
+    os.makedirs(app.config['REPORTS_FOLDER'], exist_ok=True)
+    zip_path = os.path.join(app.config['REPORTS_FOLDER'], f"class_{session['teacher_id']}_{uuid.uuid4().hex}.zip")
+    report_pdf.export_reports_zip(reports, pdf_cache.get(), zip_path, max_workers=app.config['PDF_EXPORT_WORKERS'])
+
+    # Stream the file, then delete it (the PDFs themselves stay cached)
+    response = send_file(os.path.abspath(zip_path), mimetype='application/zip', as_attachment=True,
+                         download_name="class_reports.zip")
+    response.call_on_close(lambda: os.remove(zip_path))
+    return response
 
 
 # --- ADD THIS TO app.py ---
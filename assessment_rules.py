@@ -0,0 +1,156 @@
+# assessment_rules.py
+# The AQ assessment's scoring rules and lookup tables, built once at import.
+#
+# Everything here is read-only: the report pages, the guidance engine, the
+# cohort analytics and the roster filters all use these tables instead of
+# keeping their own copies of the thresholds and mappings.
+import re
+from bisect import bisect_right
+from types import MappingProxyType
+
+import numpy as np
+
+# --- Dimensions ---
+# (trait name, code, students column, answer numbers) in the order the assessment asks them
+_DIMENSIONS = (
+    ("Control", "C", "control_score", range(1, 4)),
+    ("Ownership", "O", "ownership_score", range(4, 12)),
+    ("Reach", "R", "reach_score", range(12, 17)),
+    ("Endurance", "E", "endurance_score", range(17, 22)),
+    ("Attitude", "A", "attitude_score", (22, 23)),
+)
+TRAIT_NAMES = tuple(name for name, _, _, _ in _DIMENSIONS)
+TRAIT_CODES = tuple(code for _, code, _, _ in _DIMENSIONS)
+SCORE_COLUMNS = tuple(column for _, _, column, _ in _DIMENSIONS)
+QUESTION_COUNT = max(max(questions) for _, _, _, questions in _DIMENSIONS)
+
+# answers (n x 23) @ QUESTION_WEIGHTS (23 x 5) -> dimension scores (n x 5)
+QUESTION_WEIGHTS = np.zeros((QUESTION_COUNT, len(_DIMENSIONS)), dtype=np.int64)
+for _column, (_, _, _, _questions) in enumerate(_DIMENSIONS):
+    QUESTION_WEIGHTS[[q - 1 for q in _questions], _column] = 1
+QUESTION_WEIGHTS.setflags(write=False)
+
+# --- AQ categories ---
+# (lower bound, band key, name, description), ascending; a score belongs to the
+# last category whose lower bound it reaches.
+_AQ_CATEGORIES = (
+    (None, "quitter", "Quitter", "You may feel overwhelmed by adversity and have an opportunity to develop stronger resilience strategies."),
+    (120, "moderate_camper", "Moderate Camper", "You handle familiar situations well but tend to avoid new or significant challenges. There's a great opportunity to step outside your comfort zone."),
+    (140, "camper", "Camper", "You are steady and reliable, but may sometimes avoid difficult challenges to stay in a comfortable zone."),
+    (160, "moderate_climber", "Moderate Climber", "You are resilient and consistently work to overcome challenges, showing a strong capacity for growth and adaptation."),
+    (180, "climber", "Climber", "You excel at navigating challenges and consistently seek growth. You are highly resilient and resourceful."),
+)
+AQ_THRESHOLDS = tuple(low for low, _, _, _ in _AQ_CATEGORIES[1:])
+AQ_CATEGORIES = tuple(MappingProxyType({"name": name, "description": description, "band": band})
+                      for _, band, name, description in _AQ_CATEGORIES)
+BAND_KEYS = tuple(category["band"] for category in AQ_CATEGORIES)
+
+# band key -> [low, high), highest band first (as the roster filters list them)
+AQ_BANDS = MappingProxyType({
+    band: (low, high)
+    for band, low, high in reversed(list(zip(BAND_KEYS, (None,) + AQ_THRESHOLDS, AQ_THRESHOLDS + (None,))))
+})
+
+# --- Skill tiers offered on the results page (low < 140 <= medium < 180 <= high) ---
+SKILL_TIER_THRESHOLDS = (140, 180)
+SKILL_TIERS = ("low", "medium", "high")
+
+# --- Trait -> Bloom level -> skill ---
+BLOOM_LEVEL_MAP = MappingProxyType({
+    "Control": "L1:Remembering, L3: Applying, L4: Analyzing", "Ownership": "L2: Understanding,L3: Applying, L4: Analyzing",
+    "Reach": "L5: Evaluating", "Endurance": "L5: Evaluating", "Attitude": "L4: Analyzing, L6: Creating"
+})
+BLOOM_SKILL_MAP = MappingProxyType({
+    "L1": ("Remembrance",),
+    "L2": ("Inference",),
+    "L3": ("Solution-finding",),
+    "L4": ("Reasoning",),
+    "L5": ("Judgment",),
+    "L6": ("Abstract resoning",),  # (spelling kept as shown to students)
+})
+# Parsed once: trait -> ("L1", "L3", ...)
+TRAIT_BLOOM_CODES = MappingProxyType({trait: tuple(re.findall(r'L\d', levels)) for trait, levels in BLOOM_LEVEL_MAP.items()})
+# trait -> skills of its Bloom levels, without duplicates
+TRAIT_SKILLS = MappingProxyType({
+    trait: tuple(dict.fromkeys(skill for code in codes for skill in BLOOM_SKILL_MAP.get(code, ())))
+    for trait, codes in TRAIT_BLOOM_CODES.items()
+})
+
+
+# --- Per-student lookups ---
+def aq_category(aq_score):
+    """
+    Returns the AQ category {name, description, band} of one score.
+    """
+    if aq_score is None:
+        return AQ_CATEGORIES[0]
+    return AQ_CATEGORIES[bisect_right(AQ_THRESHOLDS, aq_score)]
+
+
+def skill_tier(aq_score):
+    return SKILL_TIERS[bisect_right(SKILL_TIER_THRESHOLDS, aq_score or 0)]
+
+
+def score_answers(answers) -> dict:
+    """
+    Scores one submitted assessment. `answers` maps 'q1'..'q23' to answer
+    values (e.g. request.form); missing answers count as 0.
+    """
+    scores = {column: sum(int(answers.get(f'q{q}', 0)) for q in questions)
+              for _, _, column, questions in _DIMENSIONS}
+    scores["aq_score"] = sum(scores.values()) * 2
+    return scores
+
+
+def trait_scores(student) -> dict:
+    """
+    {"Control": ..., "Ownership": ...} from a student record.
+    """
+    return {name: student.get(column, 0) for name, _, column, _ in _DIMENSIONS}
+
+
+def top_traits(student, k: int = 2) -> list:
+    """
+    The k highest (trait name, score) pairs; ties keep C/O/R/E/A order.
+    """
+    return sorted(trait_scores(student).items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def top_trait_codes(student, k: int = 2) -> list:
+    codes = dict(zip(TRAIT_NAMES, TRAIT_CODES))
+    return [codes[name] for name, _ in top_traits(student, k)]
+
+
+def top_trait_skills(top) -> list:
+    """
+    Skills of the given (trait, score) pairs, in order, without duplicates.
+    """
+    return list(dict.fromkeys(skill for trait, _ in top for skill in TRAIT_SKILLS.get(trait, ())))
+
+
+# --- Whole cohorts (vectorized) ---
+def score_cohort(answers) -> dict:
+    """
+    Scores many assessments at once. `answers` is an (n, 23) array of answer
+    values (column i = question i+1). Returns arrays keyed like score_answers().
+    """
+    answers = np.asarray(answers, dtype=np.int64)
+    dimensions = answers @ QUESTION_WEIGHTS
+    result = {column: dimensions[:, i] for i, column in enumerate(SCORE_COLUMNS)}
+    result["aq_score"] = dimensions.sum(axis=1) * 2
+    return result
+
+
+def categorize_cohort(aq_scores) -> np.ndarray:
+    """
+    Band keys ('climber', ...) for an array of AQ scores, in one searchsorted.
+    """
+    index = np.searchsorted(np.asarray(AQ_THRESHOLDS, dtype=float), np.asarray(aq_scores, dtype=float), side='right')
+    return np.asarray(BAND_KEYS, dtype=object)[index]
+
+
+def top_trait_indices(trait_matrix, k: int = 2) -> np.ndarray:
+    """
+    Column indices of each row's k highest traits (same tie-breaking as top_traits()).
+    """
+    return np.argsort(-np.asarray(trait_matrix, dtype=float), axis=1, kind='stable')[:, :k]
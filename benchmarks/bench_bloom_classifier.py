@@ -0,0 +1,143 @@
+# benchmarks/bench_bloom_classifier.py
+# Latency and throughput of the Bloom classifier (model.py) on CPU:
+# single-question predict_bloom_level() latency, and batched throughput of the
+# uncached inference path across batch sizes and question lengths.
+#
+# Without --model-path a randomly initialized BERT with the real architecture
+# ('base') or a small one ('tiny') is generated into a temporary directory, so
+# the benchmark runs anywhere; predictions are meaningless, timings are not.
+#
+#   python -m benchmarks.bench_bloom_classifier
+#   python -m benchmarks.bench_bloom_classifier --model-path content/bloom_bert_model --backend onnx
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+BATCH_SIZES = (1, 8, 32, 64)
+# Approximate words per synthetic question
+QUESTION_LENGTHS = (8, 32, 96)
+QUESTIONS_PER_CASE = 256
+SINGLE_CALLS = 50
+SEED = 42
+
+BLOOM_LEVELS = ("Remembering", "Understanding", "Applying", "Analyzing", "Evaluating", "Creating")
+_WORDS = (
+    "explain describe compare evaluate design analyze list define justify create apply identify "
+    "the a of in to and how why what which process system theory model data algorithm network "
+    "photosynthesis democracy economy equation function variable experiment hypothesis structure "
+    "impact cause effect difference example principle method result argument evidence solution"
+).split()
+
+
+def synthetic_questions(count, words, rng):
+    return [" ".join(rng.choices(_WORDS, k=max(1, int(rng.gauss(words, words / 4))))).capitalize() + "?"
+            for _ in range(count)]
+
+
+def build_fixture_model(output_dir, size='tiny'):
+    """
+    Writes a randomly initialized BertForSequenceClassification, its tokenizer and
+    label_mappings.json in the layout model.py loads.
+    """
+    from transformers import BertConfig, BertForSequenceClassification, BertTokenizerFast
+
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "?"] + sorted(set(_WORDS))
+    vocab_path = os.path.join(output_dir, 'vocab.txt')
+    with open(vocab_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(vocab) + "\n")
+    BertTokenizerFast(vocab_file=vocab_path).save_pretrained(output_dir)
+
+    dims = {'tiny': dict(hidden_size=128, num_hidden_layers=2, num_attention_heads=2, intermediate_size=512),
+            'base': dict(hidden_size=768, num_hidden_layers=12, num_attention_heads=12, intermediate_size=3072)}[size]
+    config = BertConfig(vocab_size=len(vocab), num_labels=len(BLOOM_LEVELS), **dims)
+    BertForSequenceClassification(config).save_pretrained(output_dir)
+    with open(os.path.join(output_dir, 'label_mappings.json'), 'w') as f:
+        json.dump({'id2label': {str(i): level for i, level in enumerate(BLOOM_LEVELS)},
+                   'label2id': {level: i for i, level in enumerate(BLOOM_LEVELS)}}, f)
+    return output_dir
+
+
+def _load_model_module(model_path, backend):
+    # model.py reads its configuration at import time.
+    os.environ['BLOOM_MODEL_PATH'] = model_path
+    os.environ['BLOOM_BACKEND'] = backend
+    os.environ['BLOOM_CACHE'] = '0'
+    import model
+    if os.path.normpath(model.MODEL_PATH) != os.path.normpath(model_path):
+        raise RuntimeError("model.py was already imported with another model; run this benchmark in a fresh process.")
+    model.bloom_model.get()
+    return model
+
+
+def run(model_path=None, backend='torch', fixture_size='tiny', batch_sizes=BATCH_SIZES,
+        question_lengths=QUESTION_LENGTHS, questions=QUESTIONS_PER_CASE, single_calls=SINGLE_CALLS, seed=SEED):
+    """
+    Returns one result dict per (question length, batch size), plus one
+    single-question latency row per question length (batch_size None).
+    """
+    import torch
+
+    rng = random.Random(seed)
+    torch.manual_seed(seed)
+    with tempfile.TemporaryDirectory() as fixture_dir:
+        model = _load_model_module(model_path or build_fixture_model(fixture_dir, fixture_size), backend)
+        tokenizer = model.bloom_model.get().tokenizer
+
+        rows = []
+        for words in question_lengths:
+            texts = synthetic_questions(questions, words, rng)
+            mean_tokens = statistics.mean(len(ids) for ids in tokenizer(texts, truncation=True, max_length=model.MAX_LEN)['input_ids'])
+
+            model.predict_bloom_level(texts[0])  # warm-up
+            latencies = []
+            for text in texts[:single_calls]:
+                start = time.perf_counter()
+                model.predict_bloom_level(text)
+                latencies.append((time.perf_counter() - start) * 1000)
+            latencies.sort()
+            rows.append({
+                "question_words": words,
+                "mean_tokens": round(mean_tokens, 1),
+                "batch_size": None,
+                "single_ms_p50": round(latencies[len(latencies) // 2], 3),
+                "single_ms_p95": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+            })
+
+            for batch_size in batch_sizes:
+                model._predict_uncached(texts[:batch_size], batch_size)  # warm-up
+                start = time.perf_counter()
+                model._predict_uncached(texts, batch_size)
+                elapsed = time.perf_counter() - start
+                rows.append({
+                    "question_words": words,
+                    "mean_tokens": round(mean_tokens, 1),
+                    "batch_size": batch_size,
+                    "batch_ms_per_question": round(elapsed * 1000 / len(texts), 3),
+                    "questions_per_s": round(len(texts) / elapsed, 1),
+                })
+    return {"backend": backend, "model": model_path or f"fixture:{fixture_size}",
+            "threads": torch.get_num_threads(), "rows": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bloom classifier latency/throughput")
+    parser.add_argument('--model-path', help="A real model directory (default: generated fixture)")
+    parser.add_argument('--backend', default='torch', help="torch, torch_int8 or onnx")
+    parser.add_argument('--fixture-size', choices=['tiny', 'base'], default='tiny')
+    args = parser.parse_args()
+
+    result = run(args.model_path, args.backend, args.fixture_size)
+    print(f"{result['model']} ({result['backend']}, {result['threads']} threads)")
+    print(f"{'words':>6} {'tokens':>7} {'batch':>6} {'p50 ms':>8} {'p95 ms':>8} {'ms/q':>8} {'q/s':>9}")
+    for row in result['rows']:
+        print(f"{row['question_words']:>6} {row['mean_tokens']:>7} {str(row['batch_size'] or '-'):>6} "
+              f"{row.get('single_ms_p50', ''):>8} {row.get('single_ms_p95', ''):>8} "
+              f"{row.get('batch_ms_per_question', ''):>8} {row.get('questions_per_s', ''):>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+# benchmarks/bench_guidance_engine.py
+# The guidance engine (LLM/engine.py) without the network:
+#   - _correct_skills() as the skill vocabulary grows
+#   - _get_student_profile() as the roster grows
+#   - generate_recommendations() end to end, cold and from the recommendation cache
+#
+# The roster and vocabulary are synthetic. Retrieval runs on a real FAISS store
+# (LLM/vector_store.py) built from synthetic passages with a hashing embedder
+# instead of MiniLM; the LLM is a local stub that answers instantly (or after
+# --llm-latency-ms).
+#
+#   python -m benchmarks.bench_guidance_engine
+import argparse
+import hashlib
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_skill_index import make_queries, synthetic_vocabulary
+
+VOCABULARY_SIZES = (100, 1_000, 5_000)
+ROSTER_SIZES = (1_000, 10_000, 100_000)
+SKILLS_PER_PROFILE = 5
+CALLS = 200
+PASSAGES = 2_000
+EMBEDDING_DIM = 384
+SEED = 42
+
+_ROLES = ("Data Scientist", "Teacher", "Software Engineer", "Project Manager", "Researcher", "Counselor")
+_TRAIT_CODES = ("C", "O", "R", "E", "A")
+
+
+class HashingEmbedder:
+    """
+    Deterministic bag-of-words embeddings (feature hashing); a stand-in for MiniLM.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            digest = hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest()
+            vector[int.from_bytes(digest[:4], 'little') % self.dim] += 1.0 if digest[4] & 1 else -1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+class StubLLMChain:
+    """
+    Mimics RetrievalQA: retrieves k passages for the prompt, then "answers"
+    with a fixed numbered list.
+    """
+
+    def __init__(self, retriever, latency_ms=0.0):
+        self.retriever = retriever
+        self.latency_ms = latency_ms
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        documents = self.retriever.invoke(prompt)
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        careers = random.Random(len(documents) + len(prompt)).sample(_ROLES, 3)
+        return {'result': "\n".join(f"{i}. {career}" for i, career in enumerate(careers, start=1))}
+
+
+def synthetic_roster(size, vocabulary, rng):
+    from LLM.student_lookup import StudentLookup
+    enrollments = [f"EN{n:07d}" for n in range(size)]
+    roles = [rng.choice(_ROLES) for _ in range(size)]
+    skills = [tuple(rng.sample(vocabulary, k=min(4, len(vocabulary)))) for _ in range(size)]
+    return StudentLookup(enrollments, roles, skills)
+
+
+def _bench_engine(roster, store_dir, llm_latency_ms):
+    from LLM.engine import GuidanceEngine
+    from LLM.vector_store import VectorStore
+
+    class BenchEngine(GuidanceEngine):
+        # Same engine, local data: no CSV, no Groq, no MiniLM.
+        def _load_student_data(self):
+            return roster
+
+        def _initialize_rag_pipeline(self):
+            store = VectorStore.load(store_dir, HashingEmbedder())
+            return StubLLMChain(store.as_retriever(k=4), llm_latency_ms)
+
+    return BenchEngine({'recommendation_cache_ttl': 3600, 'recommendation_cache_size': 1024})
+
+
+def _per_call_ms(fn, args_list):
+    start = time.perf_counter()
+    for args in args_list:
+        fn(*args)
+    return (time.perf_counter() - start) * 1000 / len(args_list)
+
+
+def run(vocabulary_sizes=VOCABULARY_SIZES, roster_sizes=ROSTER_SIZES, calls=CALLS, passages=PASSAGES,
+        llm_latency_ms=0.0, seed=SEED):
+    """
+    Returns {'correct_skills': [...], 'student_profile': [...], 'recommendations': [...]}.
+    """
+    from LLM import vector_store
+
+    rng = random.Random(seed)
+    result = {'correct_skills': [], 'student_profile': [], 'recommendations': []}
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        words = synthetic_vocabulary(200, rng)
+        texts = [" ".join(rng.choices(words, k=40)) for _ in range(passages)]
+        vector_store.write_store(store_dir, HashingEmbedder().embed_documents(texts), texts, [{}] * len(texts))
+
+        # Skill correction vs. vocabulary size (roster fixed and small)
+        for size in vocabulary_sizes:
+            vocabulary = synthetic_vocabulary(size, rng)
+            engine = _bench_engine(synthetic_roster(1_000, vocabulary, rng), store_dir, llm_latency_ms)
+            queries = make_queries([w.lower() for w in engine.all_skills_from_csv], calls * SKILLS_PER_PROFILE, rng)
+            batches = [(queries[i:i + SKILLS_PER_PROFILE],) for i in range(0, len(queries), SKILLS_PER_PROFILE)]
+            cold_ms = _per_call_ms(engine._correct_skills, batches)
+            warm_ms = _per_call_ms(engine._correct_skills, batches)
+            result['correct_skills'].append({
+                "vocabulary_size": len(engine.all_skills_from_csv),
+                "skills_per_call": SKILLS_PER_PROFILE,
+                "cold_ms_per_call": round(cold_ms, 4),
+                "memoized_ms_per_call": round(warm_ms, 4),
+            })
+
+        # Profile lookup vs. roster size (vocabulary fixed)
+        vocabulary = synthetic_vocabulary(1_000, rng)
+        for size in roster_sizes:
+            build_start = time.perf_counter()
+            engine = _bench_engine(synthetic_roster(size, vocabulary, rng), store_dir, llm_latency_ms)
+            build_ms = (time.perf_counter() - build_start) * 1000
+            enrollments = [f"EN{rng.randrange(size * 2):07d}" for _ in range(calls)]  # about half unknown
+            skills = [rng.sample(vocabulary, SKILLS_PER_PROFILE) for _ in range(calls)]
+            result['student_profile'].append({
+                "roster_size": size,
+                "engine_build_ms": round(build_ms, 1),
+                "profile_ms_per_call": round(_per_call_ms(
+                    engine._get_student_profile, [(e, 150, s) for e, s in zip(enrollments, skills)]), 4),
+            })
+
+        # End to end: distinct profiles (retrieval + stub LLM), then the same ones again (cache)
+        profiles = [(f"EN{rng.randrange(1_000):07d}", rng.randrange(80, 200), rng.sample(vocabulary, SKILLS_PER_PROFILE),
+                     rng.sample(_TRAIT_CODES, 2)) for _ in range(calls)]
+        engine = _bench_engine(synthetic_roster(1_000, vocabulary, rng), store_dir, llm_latency_ms)
+        for phase in ('cold', 'cached'):
+            latencies = []
+            for enrollment, aq, skills, traits in profiles:
+                start = time.perf_counter()
+                engine.generate_recommendations(enrollment, aq, skills, traits)
+                latencies.append((time.perf_counter() - start) * 1000)
+            latencies.sort()
+            result['recommendations'].append({
+                "phase": phase,
+                "stub_llm_delay": llm_latency_ms,  # ms
+                "passages": passages,
+                "latency_ms_p50": round(latencies[len(latencies) // 2], 3),
+                "latency_ms_p95": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+                "chain_calls": engine.qa_chain.calls,
+            })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Guidance engine benchmarks (local stubs, no network)")
+    parser.add_argument('--llm-latency-ms', type=float, default=0.0, help="Simulated LLM response time")
+    args = parser.parse_args()
+
+    result = run(llm_latency_ms=args.llm_latency_ms)
+    print(f"{'vocab':>7} {'cold ms':>9} {'memo ms':>9}")
+    for row in result['correct_skills']:
+        print(f"{row['vocabulary_size']:>7} {row['cold_ms_per_call']:>9.3f} {row['memoized_ms_per_call']:>9.4f}")
+    print(f"\n{'roster':>8} {'build ms':>9} {'profile ms':>11}")
+    for row in result['student_profile']:
+        print(f"{row['roster_size']:>8} {row['engine_build_ms']:>9.1f} {row['profile_ms_per_call']:>11.4f}")
+    print(f"\n{'phase':>7} {'p50 ms':>8} {'p95 ms':>8} {'chain calls':>12}")
+    for row in result['recommendations']:
+        print(f"{row['phase']:>7} {row['latency_ms_p50']:>8.3f} {row['latency_ms_p95']:>8.3f} {row['chain_calls']:>12}")
+
+
+if __name__ == '__main__':
+    main()
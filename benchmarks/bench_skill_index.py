@@ -0,0 +1,96 @@
+# benchmarks/bench_skill_index.py
+# Per-call latency of skill correction as the vocabulary grows:
+# the old difflib scan vs. the prebuilt SkillIndex (LLM/skill_index.py).
+#
+#   python -m benchmarks.bench_skill_index
+import difflib
+import random
+import string
+import time
+
+from LLM.skill_index import SkillIndex
+
+VOCABULARY_SIZES = (100, 1_000, 5_000, 20_000)
+QUERIES = 200
+SEED = 42
+
+_BASE_SKILLS = [
+    "python", "sql", "machine learning", "data analysis", "communication", "leadership",
+    "java", "javascript", "cloud computing", "project management", "deep learning",
+    "unity", "blender", "agile", "backup software", "data management", "networking",
+]
+
+
+def synthetic_vocabulary(size, rng):
+    words = set(_BASE_SKILLS)
+    while len(words) < size:
+        base = rng.choice(_BASE_SKILLS)
+        suffix = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 8)))
+        words.add(f"{base} {suffix}")
+    return sorted(words)
+
+
+def misspell(word, rng):
+    chars = list(word)
+    for _ in range(rng.randint(0, 2)):
+        i = rng.randrange(len(chars))
+        chars[i] = rng.choice(string.ascii_lowercase)
+    return "".join(chars)
+
+
+def make_queries(vocabulary, count, rng):
+    queries = [misspell(rng.choice(vocabulary), rng) for _ in range(count // 2)]
+    queries += ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 15))) for _ in range(count - len(queries))]
+    return queries
+
+
+def _per_call_ms(fn, queries):
+    start = time.perf_counter()
+    results = [fn(q) for q in queries]
+    return (time.perf_counter() - start) * 1000 / len(queries), results
+
+
+def run(sizes=VOCABULARY_SIZES, queries=QUERIES, seed=SEED):
+    """
+    Returns one result dict per vocabulary size.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for size in sizes:
+        vocabulary = synthetic_vocabulary(size, rng)
+        batch = make_queries(vocabulary, queries, rng)
+
+        difflib_ms, expected = _per_call_ms(
+            lambda q: (difflib.get_close_matches(q, [w.lower() for w in vocabulary], n=1, cutoff=0.7) or [None])[0], batch
+        )
+
+        build_start = time.perf_counter()
+        index = SkillIndex(vocabulary, cutoff=0.7)
+        build_ms = (time.perf_counter() - build_start) * 1000
+        # Unmemoized cost (every query distinct), then the warm memoized cost.
+        index_ms, actual = _per_call_ms(index._match, batch)
+        _per_call_ms(index.match, batch)
+        memo_ms, _ = _per_call_ms(index.match, batch)
+
+        rows.append({
+            "vocabulary_size": size,
+            "queries": len(batch),
+            "difflib_ms_per_call": round(difflib_ms, 4),
+            "index_ms_per_call": round(index_ms, 4),
+            "index_memoized_ms_per_call": round(memo_ms, 4),
+            "index_build_ms": round(build_ms, 2),
+            "speedup": round(difflib_ms / index_ms, 1) if index_ms else None,
+            "identical_results": expected == actual,
+        })
+    return rows
+
+
+def main():
+    print(f"{'vocab':>7} {'difflib ms':>11} {'index ms':>9} {'memo ms':>8} {'build ms':>9} {'speedup':>8} {'same':>5}")
+    for row in run():
+        print(f"{row['vocabulary_size']:>7} {row['difflib_ms_per_call']:>11.3f} {row['index_ms_per_call']:>9.3f} "
+              f"{row['index_memoized_ms_per_call']:>8.4f} {row['index_build_ms']:>9.1f} {row['speedup']:>8} {str(row['identical_results']):>5}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+# benchmarks/run.py
+# Runs the benchmark suites and writes one JSON file per run, optionally
+# comparing it with an earlier run.
+#
+#   python -m benchmarks.run                                   # all suites -> benchmarks/results/<timestamp>.json
+#   python -m benchmarks.run --suite bloom_classifier --output before.json
+#   python -m benchmarks.run --compare before.json --fail-on-regression
+#
+# A metric whose name contains '_ms' is a latency (lower is better); one ending
+# in '_per_s' is a throughput (higher is better). Rows of two runs are matched
+# by their remaining scalar fields (vocabulary_size, batch_size, phase ...).
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+RESULTS_DIR = os.path.join('benchmarks', 'results')
+SUITES = ('skill_index', 'bloom_classifier', 'guidance_engine')
+DEFAULT_THRESHOLD = 0.10
+
+
+def _run_suite(name, args):
+    if name == 'skill_index':
+        from benchmarks import bench_skill_index
+        return bench_skill_index.run()
+    if name == 'bloom_classifier':
+        from benchmarks import bench_bloom_classifier
+        return bench_bloom_classifier.run(args.model_path, args.backend, args.fixture_size)
+    from benchmarks import bench_guidance_engine
+    return bench_guidance_engine.run(llm_latency_ms=args.llm_latency_ms)
+
+
+def environment() -> dict:
+    info = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+    try:
+        info['git_commit'] = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                            text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        info['git_commit'] = None
+    for module in ('numpy', 'torch', 'faiss'):
+        try:
+            info[f'{module}_version'] = __import__(module).__version__
+        except ImportError:
+            info[f'{module}_version'] = None
+    return info
+
+
+# --- Comparison ---
+def _direction(metric):
+    if '_ms' in metric:
+        return -1
+    if metric.endswith('_per_s'):
+        return 1
+    return 0
+
+
+def _flatten(results) -> dict:
+    """
+    {(suite, section, row id): {metric: value}} over every result row.
+    """
+    flat = {}
+
+    def visit(suite, section, value):
+        if isinstance(value, dict) and 'rows' in value:
+            visit(suite, section, value['rows'])
+        elif isinstance(value, dict):
+            for key, inner in value.items():
+                if isinstance(inner, (list, dict)):
+                    visit(suite, key, inner)
+        elif isinstance(value, list):
+            for row in value:
+                if not isinstance(row, dict):
+                    continue
+                row_id = tuple(sorted((k, v) for k, v in row.items()
+                                      if _direction(k) == 0 and not isinstance(v, (bool, float, list, dict))))
+                flat[(suite, section, row_id)] = {k: v for k, v in row.items()
+                                                  if _direction(k) and isinstance(v, (int, float))}
+
+    for suite, value in results.items():
+        visit(suite, '', value)
+    return flat
+
+
+def compare(previous: dict, current: dict, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """
+    Metrics that got worse by more than `threshold` (a fraction): a list of
+    (suite, section, row id, metric, before, after, change).
+    """
+    before, after = _flatten(previous['results']), _flatten(current['results'])
+    regressions = []
+    for key, metrics in after.items():
+        for metric, value in metrics.items():
+            old = before.get(key, {}).get(metric)
+            if not old or value is None:
+                continue
+            change = (value - old) / old
+            if change * _direction(metric) < -threshold:
+                regressions.append((*key, metric, old, value, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suites and save the results as JSON")
+    parser.add_argument('--suite', action='append', choices=SUITES, help="Run only this suite (repeatable)")
+    parser.add_argument('--output', help=f"Result file (default: {RESULTS_DIR}/<timestamp>.json)")
+    parser.add_argument('--compare', help="An earlier result file to compare with")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown (fraction)")
+    parser.add_argument('--fail-on-regression', action='store_true')
+    parser.add_argument('--model-path', help="Bloom model directory (default: generated fixture)")
+    parser.add_argument('--backend', default='torch')
+    parser.add_argument('--fixture-size', choices=['tiny', 'base'], default='tiny')
+    parser.add_argument('--llm-latency-ms', type=float, default=0.0)
+    args = parser.parse_args()
+
+    report = {'environment': environment(), 'results': {}}
+    for name in args.suite or SUITES:
+        print(f"[benchmarks] Running {name}...")
+        started = time.perf_counter()
+        report['results'][name] = _run_suite(name, args)
+        print(f"[benchmarks] {name} done in {time.perf_counter() - started:.1f}s")
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime('%Y%m%d-%H%M%S') + '.json')
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"[benchmarks] Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+        regressions = compare(previous, report, args.threshold)
+        for suite, section, row_id, metric, old, new, change in regressions:
+            where = ", ".join(f"{k}={v}" for k, v in row_id)
+            print(f"REGRESSION {suite}/{section or '-'} [{where}] {metric}: {old} -> {new} ({change:+.0%})")
+        if not regressions:
+            print(f"[benchmarks] No regressions beyond {args.threshold:.0%} against {args.compare}")
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
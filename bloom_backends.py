@@ -0,0 +1,192 @@
+# bloom_backends.py
+# Interchangeable inference backends for the Bloom classifier.
+#
+#   torch       - the fine-tuned fp32 BertForSequenceClassification (default)
+#   torch_int8  - the same model with PyTorch dynamic INT8 quantization of its Linear layers
+#   onnx        - an exported ONNX graph run through onnxruntime
+#
+# Select one with the BLOOM_BACKEND environment variable. The ONNX model has to be
+# exported first:
+#
+#   python -m bloom_backends export --model-path content/bloom_bert_model
+#
+# which writes content/bloom_bert_model_onnx/ next to the original model.
+#
+# torch is imported by the backends that use it, so processes that only talk to
+# the inference server (or run ONNX) never load it.
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+
+BACKENDS = ('torch', 'torch_int8', 'onnx')
+ONNX_FILENAME = 'model.onnx'
+
+
+def onnx_dir_for(model_path):
+    """
+    Returns the directory the ONNX export of `model_path` lives in (a sibling folder).
+    """
+    return os.path.normpath(model_path) + '_onnx'
+
+
+def load_id2label(model_path):
+    with open(os.path.join(model_path, 'label_mappings.json'), 'r') as f:
+        label_mappings = json.load(f)
+    return {int(k): v for k, v in label_mappings['id2label'].items()}
+
+
+class TorchBackend:
+    """
+    Runs the full-precision PyTorch model.
+    """
+    name = 'torch'
+
+    def __init__(self, model_path, device=None):
+        import torch
+        from transformers import BertForSequenceClassification
+
+        self.device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.model = BertForSequenceClassification.from_pretrained(model_path)
+        self.model.to(self.device)
+        self.model.eval()
+        self.id2label = load_id2label(model_path)
+
+    def logits(self, input_ids, attention_mask):
+        """
+        Takes int64 arrays of shape (batch, seq_len) and returns a float32 array of
+        shape (batch, num_labels).
+        """
+        import torch
+
+        with torch.inference_mode():
+            outputs = self.model(
+                input_ids=torch.as_tensor(input_ids).to(self.device),
+                attention_mask=torch.as_tensor(attention_mask).to(self.device),
+            )
+        return outputs.logits.float().cpu().numpy()
+
+
+class TorchInt8Backend(TorchBackend):
+    """
+    Runs the PyTorch model with its Linear layers dynamically quantized to INT8 (CPU only).
+    """
+    name = 'torch_int8'
+
+    def __init__(self, model_path, device=None):
+        import torch
+
+        super().__init__(model_path, device=torch.device('cpu'))
+        self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class OnnxBackend:
+    """
+    Runs the exported ONNX graph with onnxruntime.
+    """
+    name = 'onnx'
+
+    def __init__(self, model_path, device=None):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("BLOOM_BACKEND=onnx requires the 'onnxruntime' package (pip install onnxruntime).") from e
+
+        onnx_path = os.path.join(onnx_dir_for(model_path), ONNX_FILENAME)
+        if not os.path.exists(onnx_path):
+            raise FileNotFoundError(f"ONNX model not found: {onnx_path}. Run `python -m bloom_backends export` first.")
+
+        # The export carries its own copy of the label mapping; it must match the source model.
+        self.id2label = load_id2label(onnx_dir_for(model_path))
+        if os.path.exists(os.path.join(model_path, 'label_mappings.json')) and load_id2label(model_path) != self.id2label:
+            raise ValueError(f"Label mapping of {onnx_path} does not match {model_path}. Re-export the model.")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = os.environ.get('BLOOM_ORT_THREADS')
+        if threads:
+            options.intra_op_num_threads = int(threads)
+        self.session = ort.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+
+    def logits(self, input_ids, attention_mask):
+        outputs = self.session.run(['logits'], {
+            'input_ids': np.asarray(input_ids, dtype=np.int64),
+            'attention_mask': np.asarray(attention_mask, dtype=np.int64),
+        })
+        return outputs[0]
+
+
+_BACKEND_CLASSES = {
+    'torch': TorchBackend,
+    'torch_int8': TorchInt8Backend,
+    'onnx': OnnxBackend,
+}
+
+
+def load_backend(name, model_path, device=None):
+    """
+    Builds the backend called `name` for the model at `model_path`.
+    """
+    if name not in _BACKEND_CLASSES:
+        raise ValueError(f"Unknown Bloom backend '{name}'. Choose one of: {', '.join(BACKENDS)}")
+    return _BACKEND_CLASSES[name](model_path, device=device)
+
+
+def export_onnx(model_path, output_dir=None, opset=17):
+    """
+    Exports the fine-tuned model to ONNX, next to the original model directory.
+
+    The tokenizer files and label_mappings.json are copied alongside, so the export
+    is self-contained and keeps the same id2label mapping.
+    """
+    import torch
+    from transformers import BertTokenizerFast, BertForSequenceClassification
+
+    output_dir = output_dir or onnx_dir_for(model_path)
+    os.makedirs(output_dir, exist_ok=True)
+
+    model = BertForSequenceClassification.from_pretrained(model_path)
+    model.eval()
+    tokenizer = BertTokenizerFast.from_pretrained(model_path)
+
+    dummy = tokenizer(["What is Bloom's taxonomy?"], return_tensors='pt')
+    onnx_path = os.path.join(output_dir, ONNX_FILENAME)
+    print(f"Exporting {model_path} to {onnx_path}...")
+    torch.onnx.export(
+        model,
+        (dummy['input_ids'], dummy['attention_mask']),
+        onnx_path,
+        input_names=['input_ids', 'attention_mask'],
+        output_names=['logits'],
+        dynamic_axes={
+            'input_ids': {0: 'batch', 1: 'sequence'},
+            'attention_mask': {0: 'batch', 1: 'sequence'},
+            'logits': {0: 'batch'},
+        },
+        opset_version=opset,
+    )
+
+    tokenizer.save_pretrained(output_dir)
+    shutil.copyfile(os.path.join(model_path, 'label_mappings.json'), os.path.join(output_dir, 'label_mappings.json'))
+    print(f"ONNX model written to {output_dir}")
+    return onnx_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bloom classifier backend tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help="Export the model to ONNX next to the model directory")
+    export_parser.add_argument('--model-path', default=os.environ.get('BLOOM_MODEL_PATH', 'content/bloom_bert_model'))
+    export_parser.add_argument('--output-dir', default=None)
+    export_parser.add_argument('--opset', type=int, default=17)
+
+    args = parser.parse_args()
+    if args.command == 'export':
+        export_onnx(args.model_path, args.output_dir, args.opset)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+# bulk_provision.py
+# Bulk creation of student accounts from an uploaded roster (/admin/upload).
+#
+#   1. normalize_roster()    - vectorized pandas clean-up of the whole sheet at once
+#   2. provision_students()  - creates the accounts on a bounded thread pool that
+#                              shares one pooled HTTP client, retrying rate limits
+#   3. write_report()        - one line per roster row: created / exists / skipped / failed
+#
+# Accounts are created through the Supabase Auth admin endpoint
+# (POST {SUPABASE_URL}/auth/v1/admin/users). Point `auth_url` at a local stand-in
+# to try a roster without touching the real project:
+#
+#   python -m bulk_provision roster.csv --teacher-id 3 --auth-url http://127.0.0.1:9999/auth/v1
+import argparse
+import csv
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pandas as pd
+
+EMAIL_DOMAIN = "mit-university.edu"
+MIN_PASSWORD_LENGTH = 6  # Supabase requirement
+
+CREATED, EXISTS, SKIPPED, FAILED = 'created', 'exists', 'skipped', 'failed'
+REPORT_COLUMNS = ['row', 'enrollment_no', 'email', 'status', 'error']
+
+
+def normalize_roster(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cleans the uploaded roster column-wise (no iterrows):
+    enrollment numbers are stripped, passwords stringified (1234567.0 -> "1234567")
+    and padded to the minimum length, and emails derived from the enrollment
+    number without spaces. Rows without a password get status 'skipped'.
+    """
+    df = df.copy()
+    df.columns = df.columns.str.strip()
+    for column in ('enrollment_no', 'password'):
+        if column not in df.columns:
+            raise ValueError(f"The roster must contain a column named '{column}'.")
+
+    out = pd.DataFrame(index=df.index)
+    out['row'] = df.index + 2  # spreadsheet row number (header is row 1)
+    out['enrollment_no'] = df['enrollment_no'].astype(str).str.strip()
+
+    raw = df['password']
+    missing = raw.isna()
+    passwords = raw.astype(str).str.strip()
+    # Excel turns numeric passwords into floats: 1234567.0 -> "1234567"
+    if pd.api.types.is_float_dtype(raw):
+        float_mask = ~missing
+    else:
+        float_mask = raw.map(lambda v: isinstance(v, float)) & ~missing
+    if float_mask.any():
+        passwords[float_mask] = raw[float_mask].astype('int64').astype(str)
+    out['password'] = passwords.where(passwords.str.len() >= MIN_PASSWORD_LENGTH, passwords + "123")
+
+    # "MITU23 BTCSD015" -> "MITU23BTCSD015@mit-university.edu"
+    out['email'] = out['enrollment_no'].str.replace(" ", "", regex=False) + f"@{EMAIL_DOMAIN}"
+    out['status'] = None
+    out['error'] = ""
+    out.loc[missing, 'status'] = SKIPPED
+    out.loc[missing, 'error'] = "No password"
+    return out
+
+
+def _is_existing_user(response):
+    if response.status_code not in (400, 409, 422):
+        return False
+    body = response.text.lower()
+    return 'already registered' in body or 'email_exists' in body or 'already been registered' in body
+
+
+def _retry_after(response, attempt, base=0.5, cap=30.0):
+    try:
+        return float(response.headers.get('retry-after'))
+    except (TypeError, ValueError):
+        delay = min(base * (2 ** attempt), cap)
+        return random.uniform(delay / 2, delay)
+
+
+def _create_one(client, row, teacher_id, retries):
+    payload = {
+        "email": row['email'],
+        "password": row['password'],
+        "email_confirm": True,  # Auto-confirm
+        "user_metadata": {
+            "enrollment_no": row['enrollment_no'],  # Original ID (with space) kept here
+            "role": "student",
+            "teacher_id": teacher_id
+        }
+    }
+    for attempt in range(retries + 1):
+        try:
+            response = client.post("/admin/users", json=payload)
+        except httpx.TransportError as e:
+            if attempt == retries:
+                return FAILED, f"{type(e).__name__}: {e}"
+            time.sleep(min(0.5 * (2 ** attempt), 30.0))
+            continue
+
+        if response.status_code in (200, 201):
+            return CREATED, ""
+        if _is_existing_user(response):
+            # Idempotent re-upload: the account is already there.
+            return EXISTS, ""
+        if response.status_code == 429 or response.status_code >= 500:
+            if attempt == retries:
+                return FAILED, f"HTTP {response.status_code} after {retries + 1} attempts"
+            time.sleep(_retry_after(response, attempt))
+            continue
+        return FAILED, f"HTTP {response.status_code}: {response.text[:200]}"
+    return FAILED, "Gave up"
+
+
+def provision_students(roster: pd.DataFrame, teacher_id, auth_url: str, service_key: str,
+                       max_workers: int = 8, retries: int = 4, timeout: float = 15.0) -> pd.DataFrame:
+    """
+    Creates an account for every row of a normalized roster that isn't skipped.
+    Returns the roster with 'status' and 'error' filled in for every row.
+    """
+    headers = {"apikey": service_key, "Authorization": f"Bearer {service_key}"}
+    limits = httpx.Limits(max_connections=max_workers, max_keepalive_connections=max_workers)
+    todo = roster[roster['status'].isna()]
+
+    # One client (and connection pool) shared by all threads: no new TLS handshake per student.
+    with httpx.Client(base_url=auth_url.rstrip('/'), headers=headers, limits=limits, timeout=timeout) as client:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            outcomes = list(pool.map(
+                lambda row: _create_one(client, row, teacher_id, retries),
+                todo[['email', 'password', 'enrollment_no']].to_dict(orient='records')
+            ))
+
+    result = roster.copy()
+    if outcomes:
+        result.loc[todo.index, 'status'] = [status for status, _ in outcomes]
+        result.loc[todo.index, 'error'] = [error for _, error in outcomes]
+    return result
+
+
+def summarize(result: pd.DataFrame) -> dict:
+    counts = result['status'].value_counts()
+    return {status: int(counts.get(status, 0)) for status in (CREATED, EXISTS, SKIPPED, FAILED)}
+
+
+def write_report(result: pd.DataFrame, path: str) -> str:
+    """
+    Writes the per-row result report (never includes passwords).
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    result[REPORT_COLUMNS].to_csv(path, index=False, quoting=csv.QUOTE_MINIMAL)
+    return path
+
+
+def auth_url_from_env() -> str:
+    """
+    Supabase Auth base URL; SUPABASE_AUTH_URL overrides it (e.g. for a local stand-in).
+    """
+    return os.environ.get("SUPABASE_AUTH_URL") or f"{os.environ.get('SUPABASE_URL', '').rstrip('/')}/auth/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create student accounts from a roster file")
+    parser.add_argument('roster', help="CSV or XLSX file with enrollment_no and password columns")
+    parser.add_argument('--teacher-id', required=True)
+    parser.add_argument('--auth-url', default=None, help="defaults to $SUPABASE_AUTH_URL or $SUPABASE_URL/auth/v1")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--report', default='provisioning_report.csv')
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.roster) if args.roster.endswith('.csv') else pd.read_excel(args.roster)
+    started = time.perf_counter()
+    result = provision_students(
+        normalize_roster(df), args.teacher_id, args.auth_url or auth_url_from_env(),
+        os.environ.get("SUPABASE_SERVICE_KEY", ""), max_workers=args.workers
+    )
+    write_report(result, args.report)
+    print(f"{summarize(result)} in {time.perf_counter() - started:.1f}s, report written to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
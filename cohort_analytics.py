@@ -0,0 +1,360 @@
+# cohort_analytics.py
+# Class-level analytics for the teacher dashboard, materialized on write.
+#
+# Every time a student submits the assessment (or a teacher classifies a question
+# bank) the raw numbers are upserted into a local SQLite store and that teacher's
+# aggregates are recomputed from it with vectorized NumPy/pandas, then stored as
+# one JSON document. Loading the dashboard is a single primary-key read - it
+# never scans the students table in Supabase.
+#
+# The store is local to one host, so it is kept in step with Supabase: given a
+# client, the first dashboard read of a teacher (and the first one after
+# SYNC_TTL seconds) starts a background reload of that teacher's students from
+# Supabase and returns the stored aggregates right away; a failed reload is
+# retried no sooner than SYNC_RETRY seconds later. A fresh deploy, or another
+# instance that received the writes, is therefore only briefly behind.
+# Question-bank counts come from uploads classified on this host only.
+#
+# To backfill the whole store at once:
+#
+#   python -m cohort_analytics rebuild [--teacher-id 3]
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from assessment_rules import BAND_KEYS, SCORE_COLUMNS as DIMENSIONS, TRAIT_CODES, categorize_cohort, top_trait_indices
+import sqlite_util
+
+PERCENTILES = (25, 50, 75, 90)
+# Seconds before a teacher's students are reloaded from Supabase on the next read
+SYNC_TTL = 900
+# Seconds before a reload that failed (or is still running) is attempted again
+SYNC_RETRY = 60
+
+
+# --- Aggregation (pure functions) ---
+def summarize_scores(scores: pd.DataFrame) -> dict:
+    """
+    Aggregates one cohort (one row per student with aq_score and the five
+    dimension columns) into the dashboard document.
+    """
+    scores = scores.dropna(subset=['aq_score'])
+    n = len(scores)
+    summary = {
+        'students_assessed': n,
+        'aq_bands': {name: 0 for name in reversed(BAND_KEYS)},
+        'aq': None,
+        'dimensions': {},
+        'top_trait': {code: 0 for code in TRAIT_CODES},
+        'top_two_traits': {code: 0 for code in TRAIT_CODES},
+    }
+    if n == 0:
+        return summary
+
+    aq = scores['aq_score'].to_numpy(dtype=float)
+    traits = scores[list(DIMENSIONS)].fillna(0).to_numpy(dtype=float)
+
+    bands, counts = np.unique(categorize_cohort(aq), return_counts=True)
+    summary['aq_bands'].update({band: int(count) for band, count in zip(bands, counts)})
+    summary['aq'] = _distribution(aq)
+    summary['dimensions'] = {name: _distribution(traits[:, i]) for i, name in enumerate(DIMENSIONS)}
+
+    top = top_trait_indices(traits)
+    first = np.bincount(top[:, 0], minlength=len(TRAIT_CODES))
+    both = np.bincount(top.ravel(), minlength=len(TRAIT_CODES))
+    summary['top_trait'] = {code: int(c) for code, c in zip(TRAIT_CODES, first)}
+    summary['top_two_traits'] = {code: int(c) for code, c in zip(TRAIT_CODES, both)}
+    return summary
+
+
+def _distribution(values: np.ndarray) -> dict:
+    result = {'mean': round(float(values.mean()), 2), 'min': float(values.min()), 'max': float(values.max())}
+    for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        result[f'p{p}'] = round(float(value), 2)
+    return result
+
+
+def summarize_question_banks(banks: pd.DataFrame) -> dict:
+    """
+    Bloom-level mix across a teacher's classified question banks
+    (one row per bank: total and a {level: count} dict).
+    """
+    if banks.empty:
+        return {'files_processed': 0, 'total_questions': 0, 'level_counts': {}, 'level_share': {}}
+    counts = pd.DataFrame(list(banks['level_counts'])).fillna(0).sum().astype(int)
+    total = int(counts.sum())
+    return {
+        'files_processed': len(banks),
+        'total_questions': int(banks['total'].sum()),
+        'level_counts': {level: int(c) for level, c in counts.items()},
+        'level_share': {level: round(float(c) / total, 4) for level, c in counts.items()} if total else {},
+    }
+
+
+# --- Materialized store ---
+class CohortStore:
+    """
+    Local SQLite store of per-student scores, per-upload Bloom counts and the
+    precomputed aggregates of each teacher.
+
+    With a Supabase `client`, get() reloads a teacher's students from Supabase
+    in a background thread when they were never loaded on this host or were
+    loaded more than `sync_ttl` seconds ago.
+    """
+
+    def __init__(self, db_path, client=None, sync_ttl=SYNC_TTL, sync_retry=SYNC_RETRY):
+        self.db_path = db_path
+        self.client = client
+        self.sync_ttl = sync_ttl
+        self.sync_retry = sync_retry
+        self._connections = sqlite_util.ThreadLocalConnection(db_path, pragmas=sqlite_util.WAL_PRAGMAS)
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS student_scores ("
+                " student_id TEXT PRIMARY KEY, teacher_id TEXT, aq_score REAL, "
+                + ", ".join(f"{d} REAL" for d in DIMENSIONS) + ", updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_student_scores_teacher ON student_scores(teacher_id)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS question_banks ("
+                " result_id TEXT PRIMARY KEY, teacher_id TEXT, filename TEXT, total INTEGER NOT NULL,"
+                " level_counts TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_question_banks_teacher ON question_banks(teacher_id)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS aggregates ("
+                " teacher_id TEXT PRIMARY KEY, payload TEXT NOT NULL, computed_at REAL NOT NULL)"
+            )
+            # synced_at = 0: never synced; attempted_at: last time a sync was started
+            conn.execute("CREATE TABLE IF NOT EXISTS teacher_sync ("
+                         " teacher_id TEXT PRIMARY KEY, synced_at REAL NOT NULL, attempted_at REAL)")
+            if 'attempted_at' not in {row[1] for row in conn.execute("PRAGMA table_info(teacher_sync)")}:
+                conn.execute("ALTER TABLE teacher_sync ADD COLUMN attempted_at REAL")
+
+    def _connection(self):
+        return self._connections.get()
+
+    def _write(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so the upsert and the
+        # aggregate recomputation that reads it can't interleave with another writer's.
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    # --- Writes ---
+    def record_scores(self, student_id, teacher_id, scores: dict):
+        """
+        Upserts one student's scores and refreshes the affected teachers' aggregates.
+        """
+        conn = self._write()
+        try:
+            previous = conn.execute(
+                "SELECT teacher_id FROM student_scores WHERE student_id = ?", (str(student_id),)
+            ).fetchone()
+            conn.execute(
+                f"INSERT OR REPLACE INTO student_scores (student_id, teacher_id, aq_score, {', '.join(DIMENSIONS)}, updated_at)"
+                f" VALUES ({', '.join('?' * (len(DIMENSIONS) + 4))})",
+                (str(student_id), _key(teacher_id), scores.get('aq_score'),
+                 *(scores.get(d) for d in DIMENSIONS), time.time())
+            )
+            self._refresh(conn, _key(teacher_id))
+            if previous and previous[0] != _key(teacher_id):
+                self._refresh(conn, previous[0])  # the student moved to another teacher
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def record_question_bank(self, result_id, teacher_id, filename, total, level_counts: dict):
+        conn = self._write()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO question_banks VALUES (?, ?, ?, ?, ?, ?)",
+                (result_id, _key(teacher_id), filename, int(total), json.dumps(level_counts), time.time())
+            )
+            self._refresh(conn, _key(teacher_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def refresh(self, teacher_id) -> dict:
+        """
+        Recomputes and stores one teacher's aggregates from the local tables.
+        """
+        conn = self._write()
+        try:
+            payload = self._refresh(conn, _key(teacher_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return payload
+
+    def _refresh(self, conn, teacher):
+        scores = pd.read_sql_query(
+            f"SELECT aq_score, {', '.join(DIMENSIONS)} FROM student_scores WHERE teacher_id IS ?", conn, params=(teacher,)
+        )
+        banks = pd.read_sql_query(
+            "SELECT total, level_counts FROM question_banks WHERE teacher_id IS ?", conn, params=(teacher,)
+        )
+        banks['level_counts'] = banks['level_counts'].map(json.loads)
+
+        payload = summarize_scores(scores)
+        payload['question_banks'] = summarize_question_banks(banks)
+        payload['computed_at'] = time.time()
+        conn.execute("INSERT OR REPLACE INTO aggregates VALUES (?, ?, ?)",
+                     (teacher, json.dumps(payload), payload['computed_at']))
+        return payload
+
+    # --- Reads ---
+    def get(self, teacher_id) -> dict:
+        """
+        Returns the precomputed aggregates of one teacher (computed once if
+        missing). When a sync from Supabase is due it is started in the
+        background; this read doesn't wait for it.
+        """
+        teacher = _key(teacher_id)
+        if self.client is not None and teacher is not None and self._claim_sync(teacher):
+            threading.Thread(target=self._sync, args=(teacher,), name=f'cohort-sync-{teacher}', daemon=True).start()
+        row = self._connection().execute(
+            "SELECT payload FROM aggregates WHERE teacher_id IS ?", (teacher,)
+        ).fetchone()
+        return json.loads(row[0]) if row else self.refresh(teacher_id)
+
+    def _claim_sync(self, teacher) -> bool:
+        # Records the attempt before starting it, so other threads and workers
+        # don't start the same sync, and a failed one waits sync_retry seconds.
+        now = time.time()
+        row = self._connection().execute(
+            "SELECT synced_at, attempted_at FROM teacher_sync WHERE teacher_id = ?", (teacher,)
+        ).fetchone()
+        if row and (now - row[0] <= self.sync_ttl or now - (row[1] or 0) <= self.sync_retry):
+            return False
+        conn = self._write()
+        try:
+            claimed = conn.execute(
+                "INSERT INTO teacher_sync (teacher_id, synced_at, attempted_at) VALUES (?, 0, ?)"
+                " ON CONFLICT(teacher_id) DO UPDATE SET attempted_at = excluded.attempted_at"
+                " WHERE ? - synced_at > ? AND ? - IFNULL(attempted_at, 0) > ?",
+                (teacher, now, now, self.sync_ttl, now, self.sync_retry)
+            ).rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return bool(claimed)
+
+    def _sync(self, teacher):
+        try:
+            self.rebuild_teacher(self.client, teacher)
+        except Exception as e:
+            # The dashboard keeps showing what this host has; retried after sync_retry.
+            print(f"[cohort_analytics] Could not sync teacher {teacher} from Supabase: {e}")
+
+    # --- Backfill ---
+    def rebuild(self, client, page_size=1000) -> int:
+        """
+        Reloads every assessed student from Supabase (keyset-paged by id) and
+        recomputes all aggregates. Returns the number of students loaded.
+        """
+        loaded, teachers = 0, set()
+        conn = self._connection()
+        for rows in _score_pages(client, page_size):
+            with conn:
+                _insert_scores(conn, rows)
+            teachers.update(_key(r.get('teacher_id')) for r in rows)
+            loaded += len(rows)
+
+        now = time.time()
+        with conn:
+            conn.executemany(_MARK_SYNCED, [(teacher, now) for teacher in teachers if teacher is not None])
+        for teacher in teachers:
+            self.refresh(teacher)
+        return loaded
+
+    def rebuild_teacher(self, client, teacher_id, page_size=1000) -> dict:
+        """
+        Replaces one teacher's students with their current rows in Supabase and
+        returns the recomputed aggregates.
+        """
+        teacher = _key(teacher_id)
+        rows = [row for page in _score_pages(client, page_size, teacher) for row in page]
+        conn = self._write()
+        try:
+            conn.execute("DELETE FROM student_scores WHERE teacher_id = ?", (teacher,))
+            _insert_scores(conn, rows)
+            conn.execute(_MARK_SYNCED, (teacher, time.time()))
+            payload = self._refresh(conn, teacher)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return payload
+
+
+_MARK_SYNCED = ("INSERT INTO teacher_sync (teacher_id, synced_at) VALUES (?, ?)"
+                " ON CONFLICT(teacher_id) DO UPDATE SET synced_at = excluded.synced_at")
+
+
+def _score_pages(client, page_size, teacher=None):
+    # Assessed students from Supabase, keyset-paged by id (optionally of one teacher).
+    columns = 'id, teacher_id, aq_score, ' + ', '.join(DIMENSIONS)
+    last_id = None
+    while True:
+        query = client.table('students').select(columns).not_.is_('aq_score', 'null')
+        if teacher is not None:
+            query = query.eq('teacher_id', teacher)
+        if last_id is not None:
+            query = query.gt('id', last_id)
+        rows = query.order('id').limit(page_size).execute().data or []
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1]['id']
+
+
+def _insert_scores(conn, rows):
+    conn.executemany(
+        f"INSERT OR REPLACE INTO student_scores (student_id, teacher_id, aq_score, {', '.join(DIMENSIONS)}, updated_at)"
+        f" VALUES ({', '.join('?' * (len(DIMENSIONS) + 4))})",
+        [(str(r['id']), _key(r.get('teacher_id')), r['aq_score'], *(r.get(d) for d in DIMENSIONS), time.time())
+         for r in rows]
+    )
+
+
+def _key(teacher_id):
+    return None if teacher_id is None else str(teacher_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cohort analytics store")
+    parser.add_argument('command', choices=['rebuild', 'show'])
+    parser.add_argument('--db', default=os.environ.get('COHORT_DB', os.path.join('cache', 'cohort.sqlite3')))
+    parser.add_argument('--teacher-id')
+    args = parser.parse_args()
+
+    store = CohortStore(args.db)
+    if args.command == 'rebuild':
+        from dotenv import load_dotenv
+        from supabase import create_client
+        load_dotenv()
+        client = create_client(os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_SERVICE_KEY"))
+        if args.teacher_id:
+            payload = store.rebuild_teacher(client, args.teacher_id)
+            print(f"Loaded {payload['students_assessed']} assessed students of teacher {args.teacher_id} into {args.db}")
+        else:
+            print(f"Loaded {store.rebuild(client)} assessed students into {args.db}")
+    else:
+        print(json.dumps(store.get(args.teacher_id), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+# data_access.py
+# Request-scoped data access for the student tables.
+#
+# One StudentRepository lives for the duration of a Flask request (in flask.g).
+# It keeps an identity map of every students row (or part of a row) it has seen,
+# so the same columns are never fetched twice in one request, and writes go
+# through it so a read after an update is answered locally.
+#
+# Columns are always projected explicitly instead of select('*'), and the
+# dashboard's student + feedback check is a single request using PostgREST
+# resource embedding (students -> student_feedback via student_feedback.student_id).
+from flask import g
+
+import assessment_rules
+
+# The columns the score / report pages need
+SCORE_COLUMNS = ('aq_score',) + assessment_rules.SCORE_COLUMNS
+REPORT_COLUMNS = ('id', 'enrollment_no', 'teacher_id', 'career_suggestion', 'skills') + SCORE_COLUMNS
+
+
+# PostgREST's error code for "no relationship between these tables in the schema cache"
+NO_RELATIONSHIP = 'PGRST200'
+
+
+class StudentRepository:
+    # Set to False once PostgREST reports that students has no relationship with
+    # student_feedback; the repository then always uses two plain queries.
+    embedding_supported = True
+
+    def __init__(self, client):
+        self.client = client
+        self._students = {}  # student id -> {column: value} (only the columns fetched so far)
+        self._has_feedback = {}
+        self.round_trips = 0
+
+    def _execute(self, query):
+        self.round_trips += 1
+        return query.execute()
+
+    def prime(self, student_id, values: dict):
+        """
+        Records values that are already known (e.g. just written, or carried in the session).
+        """
+        self._students.setdefault(student_id, {}).update(values)
+
+    def get_student(self, student_id, columns=REPORT_COLUMNS):
+        """
+        Returns {column: value} for the requested columns, or None if the student doesn't exist.
+        Only the columns not already in the identity map are fetched.
+        """
+        known = self._students.get(student_id)
+        missing = [c for c in columns if known is None or c not in known]
+        if missing:
+            response = self._execute(
+                self.client.table('students').select(', '.join(missing)).eq('id', student_id).limit(1)
+            )
+            if not response.data:
+                return None
+            self.prime(student_id, response.data[0])
+            known = self._students[student_id]
+        return {c: known.get(c) for c in columns}
+
+    def get_student_with_feedback(self, student_id, columns=('aq_score', 'career_suggestion')):
+        """
+        Returns (student, has_feedback) with one round trip where the schema allows it.
+        has_feedback is None when it couldn't be fetched together with the student;
+        call has_feedback() if it is actually needed.
+        """
+        if student_id in self._has_feedback:
+            return self.get_student(student_id, columns), self._has_feedback[student_id]
+
+        if StudentRepository.embedding_supported:
+            try:
+                response = self._execute(
+                    self.client.table('students')
+                    .select(', '.join(columns) + ', student_feedback(id)')
+                    .eq('id', student_id).limit(1)
+                )
+                if not response.data:
+                    return None, False
+                row = dict(response.data[0])
+                self._has_feedback[student_id] = bool(row.pop('student_feedback', None))
+                self.prime(student_id, row)
+                return self.get_student(student_id, columns), self._has_feedback[student_id]
+            except Exception as e:
+                if getattr(e, 'code', None) == NO_RELATIONSHIP:
+                    print(f"Embedded select not available, falling back to two queries: {e}")
+                    StudentRepository.embedding_supported = False
+                else:
+                    # A timeout or a 5xx says nothing about the schema: fall back for this call only.
+                    print(f"Embedded select failed ({type(e).__name__}: {e}), trying two queries")
+
+        return self.get_student(student_id, columns), None
+
+    def has_feedback(self, student_id) -> bool:
+        if student_id not in self._has_feedback:
+            response = self._execute(
+                self.client.table('student_feedback').select('id').eq('student_id', student_id).limit(1)
+            )
+            self._has_feedback[student_id] = bool(response.data)
+        return self._has_feedback[student_id]
+
+    def update_student(self, student_id, values: dict):
+        """
+        Writes `values` and keeps them in the identity map (write-through),
+        together with the rest of the row PostgREST returns from the update.
+        """
+        response = self._execute(self.client.table('students').update(values).eq('id', student_id))
+        if response.data:
+            self.prime(student_id, response.data[0])
+        self.prime(student_id, values)
+        return response
+
+
+def get_repository(client) -> StudentRepository:
+    """
+    Returns this request's repository, creating it on first use.
+    """
+    repository = getattr(g, '_student_repository', None)
+    if repository is None:
+        repository = g._student_repository = StudentRepository(client)
+    return repository
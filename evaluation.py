@@ -0,0 +1,339 @@
+# evaluation.py
+# Headless evaluation of the Bloom classifier on a labelled question set.
+#
+# The dataset is streamed from CSV in chunks; each chunk is encoded and run
+# through the model exactly like model.py does it (length-sorted batches padded
+# only to their longest question; long questions truncated or split into
+# windows). Logits go straight into a preallocated array, metrics and the per-class ROC curves are computed with
+# NumPy, and the figures are written with matplotlib's non-interactive Agg
+# backend, so it runs on a server without a display.
+#
+# Several checkpoints and/or backends (see bloom_backends.py) can be evaluated
+# at once, each in its own process; the first run is the baseline the others
+# are compared with.
+#
+#   python -m evaluation --dataset data/bloom_dataset.csv --model content/bloom_bert_model
+#   python -m evaluation --dataset data/bloom_dataset.csv --model content/bloom_bert_model \
+#       --backend torch --backend torch_int8 --backend onnx --workers 3
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_CHUNK_ROWS = 2048
+DEFAULT_OUTPUT_DIR = 'evaluation_results'
+
+
+# --- Data ---
+def read_labels(dataset, label_column):
+    """
+    The label column alone (one cheap pass), to size the arrays and fix the label ids.
+    """
+    return pd.read_csv(dataset, usecols=[label_column], dtype=str, keep_default_na=False)[label_column].to_numpy()
+
+
+def label_ids(labels, id2label):
+    """
+    Maps dataset labels to class ids: by the model's own label names when the
+    dataset uses them, otherwise by sorted order of the distinct labels (how
+    the training notebook numbered them). Returns (ids, class names).
+    """
+    label2id = {name: i for i, name in id2label.items()}
+    distinct = sorted(set(map(str, labels)))
+    if set(distinct) <= set(label2id):
+        names = [id2label[i] for i in range(len(id2label))]
+        mapping = label2id
+    else:
+        print(f"[evaluation] Dataset labels {distinct} are not the model's {sorted(label2id)}; "
+              f"mapping them by sorted order.")
+        names = distinct
+        mapping = {name: i for i, name in enumerate(distinct)}
+    return np.fromiter((mapping[label] for label in labels), dtype=np.int64, count=len(labels)), names
+
+
+def predict_logits(tokenizer, backend, dataset, text_column, n_rows, n_labels, batch_size=DEFAULT_BATCH_SIZE,
+                   chunk_rows=DEFAULT_CHUNK_ROWS, max_len=None, long_inputs=None):
+    """
+    Streams the dataset and returns the (n_rows, n_labels) float32 logits, in
+    file order, and how many questions were longer than max_len tokens.
+    """
+    import model
+
+    max_len = max_len or model.MAX_LEN
+    long_inputs = long_inputs or model.LONG_INPUTS
+    logits = np.empty((n_rows, n_labels), dtype=np.float32)
+    offset = truncated = 0
+    for chunk in pd.read_csv(dataset, usecols=[text_column], dtype=str, keep_default_na=False, chunksize=chunk_rows):
+        texts = chunk[text_column].tolist()
+        input_ids, owners, lengths = model.encode_questions(tokenizer, texts, max_len, long_inputs)
+        logits[offset:offset + len(texts)] = model.predict_logits(tokenizer, backend, input_ids, owners, len(texts),
+                                                                  batch_size)
+        truncated += int(np.count_nonzero(lengths > max_len))
+        offset += len(texts)
+    return logits, truncated
+
+
+# --- Metrics ---
+def softmax(logits):
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def confusion(y_true, y_pred, n_classes) -> np.ndarray:
+    return np.bincount(y_true * n_classes + y_pred, minlength=n_classes * n_classes).reshape(n_classes, n_classes)
+
+
+def classification_metrics(cm: np.ndarray) -> dict:
+    """
+    Accuracy and per-class / macro / weighted precision, recall and F1 from a confusion matrix.
+    """
+    tp = np.diag(cm).astype(float)
+    support = cm.sum(axis=1).astype(float)
+    predicted = cm.sum(axis=0).astype(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(predicted > 0, tp / predicted, 0.0)
+        recall = np.where(support > 0, tp / support, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    weights = support / support.sum() if support.sum() else support
+    return {
+        'accuracy': float(tp.sum() / cm.sum()) if cm.sum() else 0.0,
+        'precision': precision, 'recall': recall, 'f1': f1, 'support': support.astype(int),
+        'macro': {'precision': float(precision.mean()), 'recall': float(recall.mean()), 'f1': float(f1.mean())},
+        'weighted': {'precision': float(precision @ weights), 'recall': float(recall @ weights), 'f1': float(f1 @ weights)},
+    }
+
+
+def roc_curves(y_true, scores) -> list:
+    """
+    One-vs-rest ROC of every class: [(fpr, tpr, auc), ...]. Each curve is built
+    from one sort and two cumulative sums, with tied scores merged into one point.
+    """
+    curves = []
+    order = np.argsort(-scores, axis=0, kind='stable')
+    for k in range(scores.shape[1]):
+        ranked = scores[order[:, k], k]
+        positive = (y_true[order[:, k]] == k)
+        # Last index of every run of equal scores
+        cut = np.r_[np.flatnonzero(np.diff(ranked)), len(ranked) - 1]
+        tps = np.cumsum(positive)[cut]
+        fps = (cut + 1) - tps
+        tpr = np.r_[0.0, tps / tps[-1]] if tps[-1] else np.zeros(len(cut) + 1)
+        fpr = np.r_[0.0, fps / fps[-1]] if fps[-1] else np.zeros(len(cut) + 1)
+        curves.append((fpr, tpr, float(np.trapezoid(tpr, fpr) if hasattr(np, 'trapezoid') else np.trapz(tpr, fpr))))
+    return curves
+
+
+# --- Figures ---
+def save_figures(output_dir, cm, metrics, curves, class_names):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(8, 6))
+    image = ax.imshow(cm, cmap='Blues')
+    fig.colorbar(image, ax=ax)
+    ax.set_xticks(range(len(class_names)), class_names, rotation=45, ha='right')
+    ax.set_yticks(range(len(class_names)), class_names)
+    threshold = cm.max() / 2 if cm.size else 0
+    for (i, j), value in np.ndenumerate(cm):
+        ax.text(j, i, str(value), ha='center', va='center', color='white' if value > threshold else 'black')
+    ax.set_title('Confusion Matrix')
+    ax.set_xlabel('Predicted Labels')
+    ax.set_ylabel('True Labels')
+    fig.tight_layout()
+    fig.savefig(os.path.join(output_dir, 'confusion_matrix.png'))
+    plt.close(fig)
+
+    fig, ax = plt.subplots(figsize=(12, 7))
+    x = np.arange(len(class_names))
+    for i, name in enumerate(('precision', 'recall', 'f1')):
+        ax.bar(x + (i - 1) * 0.27, metrics[name], width=0.27, label=name)
+    ax.set_xticks(x, class_names, rotation=45, ha='right')
+    ax.set_title('Performance Metrics per Class')
+    ax.set_ylabel('Score')
+    ax.grid(axis='y', linestyle='--')
+    ax.legend(loc='lower right')
+    fig.tight_layout()
+    fig.savefig(os.path.join(output_dir, 'metrics_bar_chart.png'))
+    plt.close(fig)
+
+    fig, ax = plt.subplots(figsize=(10, 8))
+    for name, (fpr, tpr, area) in zip(class_names, curves):
+        ax.plot(fpr, tpr, lw=2, label=f'ROC curve for {name} (area = {area:0.2f})')
+    ax.plot([0, 1], [0, 1], 'k--', lw=2)
+    ax.set_xlim([0.0, 1.0])
+    ax.set_ylim([0.0, 1.05])
+    ax.set_xlabel('False Positive Rate')
+    ax.set_ylabel('True Positive Rate')
+    ax.set_title('Multiclass Receiver Operating Characteristic (ROC)')
+    ax.legend(loc='lower right')
+    fig.savefig(os.path.join(output_dir, 'roc_curve_multiclass.png'))
+    plt.close(fig)
+
+
+# --- One run ---
+def run_name(model_path, backend):
+    return f"{os.path.basename(os.path.normpath(model_path))}-{backend}"
+
+
+def evaluate(model_path, backend_name, dataset, output_dir=DEFAULT_OUTPUT_DIR, text_column='question',
+             label_column='label', batch_size=DEFAULT_BATCH_SIZE, chunk_rows=DEFAULT_CHUNK_ROWS,
+             class_names=None, threads=None, figures=True, max_len=None, long_inputs=None) -> dict:
+    """
+    Evaluates one model/backend. Writes metrics.json (and the figures) to
+    <output_dir>/<model>-<backend>/ and returns the summary plus the predictions.
+    """
+    import torch
+    from transformers import BertTokenizerFast
+    from bloom_backends import load_backend
+
+    if threads:
+        torch.set_num_threads(threads)
+        os.environ.setdefault('BLOOM_ORT_THREADS', str(threads))
+    name = run_name(model_path, backend_name)
+    print(f"[evaluation] {name}: loading...")
+    tokenizer = BertTokenizerFast.from_pretrained(model_path)
+    backend = load_backend(backend_name, model_path)
+
+    labels = read_labels(dataset, label_column)
+    y_true, names = label_ids(labels, backend.id2label)
+    class_names = list(class_names or names)
+
+    started = time.perf_counter()
+    logits, truncated = predict_logits(tokenizer, backend, dataset, text_column, len(labels),
+                                       len(backend.id2label), batch_size, chunk_rows, max_len, long_inputs)
+    elapsed = time.perf_counter() - started
+
+    y_pred = logits.argmax(axis=1)
+    n_classes = max(len(class_names), logits.shape[1])
+    cm = confusion(y_true, y_pred, n_classes)
+    metrics = classification_metrics(cm)
+    curves = roc_curves(y_true, softmax(logits))
+
+    run_dir = os.path.join(output_dir, name)
+    os.makedirs(run_dir, exist_ok=True)
+    summary = {
+        'run': name, 'model_path': model_path, 'backend': backend_name, 'dataset': dataset,
+        'questions': int(len(y_true)), 'truncated': truncated, 'seconds': round(elapsed, 3),
+        'questions_per_s': round(len(y_true) / elapsed, 1) if elapsed else None,
+        'accuracy': metrics['accuracy'], 'macro': metrics['macro'], 'weighted': metrics['weighted'],
+        'per_class': {
+            cls: {'precision': float(p), 'recall': float(r), 'f1': float(f), 'support': int(s), 'roc_auc': curve[2]}
+            for cls, p, r, f, s, curve in zip(class_names, metrics['precision'], metrics['recall'],
+                                               metrics['f1'], metrics['support'], curves)
+        },
+        'confusion_matrix': cm.tolist(),
+    }
+    with open(os.path.join(run_dir, 'metrics.json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+    if figures:
+        save_figures(run_dir, cm, metrics, curves, class_names)
+    report = [f"[evaluation] {name}: accuracy {metrics['accuracy']:.4f}, {summary['questions_per_s']} questions/s, "
+              f"{truncated} over the token limit",
+              f"{'':<16} {'precision':>9} {'recall':>9} {'f1':>9} {'support':>8} {'auc':>6}"]
+    report += [f"{cls:<16} {m['precision']:>9.4f} {m['recall']:>9.4f} {m['f1']:>9.4f} {m['support']:>8} {m['roc_auc']:>6.3f}"
+               for cls, m in summary['per_class'].items()]
+    print("\n".join(report))
+    return {'summary': summary, 'predictions': y_pred}
+
+
+def _evaluate_job(kwargs):
+    # Runs in a worker process; a backend that can't be loaded is reported, not fatal.
+    try:
+        return evaluate(**kwargs)
+    except (ImportError, FileNotFoundError, ValueError) as e:
+        return {'error': f"{type(e).__name__}: {e}", 'run': run_name(kwargs['model_path'], kwargs['backend_name'])}
+
+
+def evaluate_many(runs, workers=1, **kwargs) -> list:
+    """
+    Evaluates every (model_path, backend) pair, in `workers` processes. The
+    CPU is split between them, so parallel runs don't oversubscribe it.
+    """
+    jobs = [dict(kwargs, model_path=model_path, backend_name=backend) for model_path, backend in runs]
+    workers = max(1, min(workers, len(jobs)))
+    if workers == 1:
+        return [_evaluate_job(job) for job in jobs]
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    for job in jobs:
+        job.setdefault('threads', threads)
+    # 'spawn': each worker starts with its own clean torch/onnxruntime state
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return list(pool.map(_evaluate_job, jobs))
+
+
+def comparison_table(results) -> list:
+    """
+    Accuracy of every run against the first successful one, and how often they agree.
+    """
+    finished = [r for r in results if 'summary' in r]
+    if not finished:
+        return []
+    baseline = finished[0]
+    rows = []
+    for result in results:
+        if 'summary' not in result:
+            rows.append({'run': result['run'], 'skipped': result['error']})
+            continue
+        summary = result['summary']
+        rows.append({
+            'run': summary['run'], 'accuracy': summary['accuracy'],
+            'delta': summary['accuracy'] - baseline['summary']['accuracy'],
+            'agreement': float(np.mean(result['predictions'] == baseline['predictions'])),
+            'questions_per_s': summary['questions_per_s'],
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate Bloom classifier checkpoints/backends on a labelled CSV")
+    parser.add_argument('--dataset', required=True, help="CSV with a question and a label column")
+    parser.add_argument('--model', action='append', dest='models',
+                        help="Model directory (repeatable; default: $BLOOM_MODEL_PATH or content/bloom_bert_model)")
+    parser.add_argument('--backend', action='append', dest='backends',
+                        help="torch, torch_int8 or onnx (repeatable; default: torch)")
+    parser.add_argument('--text-column', default='question')
+    parser.add_argument('--label-column', default='label')
+    parser.add_argument('--class-names', help="Comma-separated display names, in class-id order")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument('--max-len', type=int, help="Token limit (default: model.MAX_LEN / $BLOOM_MAX_LEN)")
+    parser.add_argument('--long-inputs', choices=['truncate', 'window'],
+                        help="Questions over the limit (default: $BLOOM_LONG_INPUTS or truncate)")
+    parser.add_argument('--workers', type=int, default=1, help="Runs evaluated in parallel processes")
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument('--no-figures', action='store_true')
+    args = parser.parse_args(argv)
+
+    models = args.models or [os.environ.get('BLOOM_MODEL_PATH', 'content/bloom_bert_model')]
+    runs = [(model, backend) for model in models for backend in (args.backends or ['torch'])]
+    results = evaluate_many(
+        runs, workers=args.workers, dataset=args.dataset, output_dir=args.output_dir,
+        text_column=args.text_column, label_column=args.label_column, batch_size=args.batch_size,
+        chunk_rows=args.chunk_rows, figures=not args.no_figures, max_len=args.max_len, long_inputs=args.long_inputs,
+        class_names=args.class_names.split(',') if args.class_names else None,
+    )
+
+    rows = comparison_table(results)
+    print(f"\n{'run':<40} {'accuracy':>9} {'delta':>9} {'agreement':>10} {'q/s':>9}")
+    for row in rows:
+        if 'skipped' in row:
+            print(f"{row['run']:<40} skipped: {row['skipped']}")
+        else:
+            print(f"{row['run']:<40} {row['accuracy']:>9.4f} {row['delta']:>+9.4f} {row['agreement']:>10.4f} "
+                  f"{row['questions_per_s']:>9}")
+    os.makedirs(args.output_dir, exist_ok=True)
+    with open(os.path.join(args.output_dir, 'comparison.json'), 'w', encoding='utf-8') as f:
+        json.dump(rows, f, indent=2)
+    return rows
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+# gunicorn.conf.py
+# Picked up automatically by `gunicorn app:app` when run from the project root.
+import gc
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", "2"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+
+# ADEQUATE_PRELOAD=1 imports app.py in the master process, where registry.preload()
+# loads the BERT model and the GuidanceEngine once. The forked workers then share
+# those weights copy-on-write instead of each loading their own copy.
+# Without it, every worker starts instantly and loads models on first use.
+# With BLOOM_INFERENCE_URL set, the Bloom model isn't loaded by the app at all:
+# every worker sends its questions to `python -m inference_server` instead.
+preload_app = os.environ.get("ADEQUATE_PRELOAD", "0").lower() in ("1", "true", "yes")
+
+
+def when_ready(server):
+    if preload_app:
+        # Move everything loaded so far out of the GC's reach, so that garbage
+        # collection in the workers doesn't touch (and copy) the shared pages.
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        # Threads don't survive the fork: start this worker's background job threads
+        # (and requeue jobs left stale by a crashed worker).
+        import app
+        app.job_queue.get().start()
@@ -0,0 +1,403 @@
+# inference_server.py
+# One Bloom classifier per host, shared by every gunicorn worker.
+#
+# Without it, each worker that classifies questions loads its own copy of the
+# BERT weights and runs its own torch thread pool, and concurrent uploads fight
+# over the cores. With it, a single process holds the model, sizes the torch
+# intra-op pool once, and merges the questions of concurrent callers into full
+# batches (micro-batching): a request waits at most BLOOM_BATCH_WAIT_MS for
+# company before its batch runs.
+#
+# The queue is bounded (BLOOM_MAX_PENDING questions). When it is full the server
+# answers 503 with Retry-After (whole seconds, for any HTTP client) and
+# X-Retry-After-Ms, its estimate of how long the queue takes to drain. The
+# client waits that long, but never less than its own jittered exponential
+# backoff. A burst of uploads therefore slows the callers down instead of
+# piling up memory in the server, and the workers don't retry in lockstep.
+#
+#   python -m inference_server                     # listens on $BLOOM_INFERENCE_URL
+#   python -m inference_server --url unix:///tmp/bloom.sock --threads 8
+#
+# The workers use it when BLOOM_INFERENCE_URL is set (see model.py), e.g.
+#   BLOOM_INFERENCE_URL=http://127.0.0.1:8765 or unix:///run/adequate/bloom.sock
+# Start the server with the same BLOOM_* settings as the app, and the same
+# METRICS_DIR: its token counters (truncated questions ...) then show up on the
+# app's /metrics next to the workers' own.
+#
+#   POST /predict {"texts": [...]} -> {"labels": [...]}
+#   GET  /health                   -> backend, model fingerprint, queue and batching counters
+#
+# The workers key their prediction caches on the fingerprint the server reports,
+# so restarting it with a different model invalidates their cached labels.
+import argparse
+import collections
+import json
+import math
+import os
+import random
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import httpx
+
+import instrumentation
+
+DEFAULT_URL = 'http://127.0.0.1:8765'
+MAX_BATCH = int(os.environ.get('BLOOM_MAX_BATCH', 64))
+BATCH_WAIT_MS = float(os.environ.get('BLOOM_BATCH_WAIT_MS', 5))
+MAX_PENDING = int(os.environ.get('BLOOM_MAX_PENDING', 2048))
+# Questions per request sent by the client; bigger lists are split
+CLIENT_CHUNK = 256
+CLIENT_TIMEOUT = float(os.environ.get('BLOOM_INFERENCE_TIMEOUT', 120))
+
+
+class ServerBusy(Exception):
+    """
+    Raised by MicroBatcher.submit() when the queue is full.
+    """
+
+
+class InferenceUnavailable(RuntimeError):
+    """
+    Raised by the client when the server can't be reached or stays busy past the timeout.
+    """
+
+
+def parse_url(url):
+    """
+    'unix:///path/to.sock' -> ('unix', path); 'http://host:port' -> ('tcp', (host, port)).
+    """
+    parsed = urlparse(url)
+    if parsed.scheme == 'unix':
+        return 'unix', parsed.path
+    if parsed.scheme == 'http':
+        return 'tcp', (parsed.hostname or '127.0.0.1', parsed.port or 80)
+    raise ValueError(f"Unsupported inference server URL '{url}' (use http://host:port or unix:///path)")
+
+
+# --- Server ---
+class _Request:
+    __slots__ = ('texts', 'labels', 'error', 'done', 'enqueued')
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.labels = None
+        self.error = None
+        self.done = threading.Event()
+        self.enqueued = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Queues the questions of concurrent callers and classifies them together on
+    one thread, `max_batch` questions at a time.
+
+    `classify(texts)` returns one label per text. A batch is started as soon as
+    `max_batch` questions are waiting, or `max_wait` seconds after its oldest
+    request arrived.
+    """
+
+    def __init__(self, classify, max_batch=MAX_BATCH, max_wait=BATCH_WAIT_MS / 1000, max_pending=MAX_PENDING):
+        self.classify = classify
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+
+        self._queue = collections.deque()
+        self._pending = 0  # questions queued, not yet taken by a batch
+        self._cond = threading.Condition()
+        self._counters = {'requests': 0, 'rejected': 0, 'batches': 0, 'questions': 0, 'errors': 0}
+        self._batch_seconds = 0.05  # moving average of one batch, for the drain estimate
+        self._thread = threading.Thread(target=self._run, name='bloom-micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, texts):
+        """
+        Blocks until the texts are classified and returns their labels. Raises
+        ServerBusy when accepting them would exceed max_pending questions.
+        """
+        request = _Request(texts)
+        with self._cond:
+            # An oversized request is still accepted when nothing else is waiting.
+            if self._pending and self._pending + len(texts) > self.max_pending:
+                self._counters['rejected'] += 1
+                raise ServerBusy(f"{self._pending} questions queued")
+            self._queue.append(request)
+            self._pending += len(texts)
+            self._counters['requests'] += 1
+            self._cond.notify()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.labels
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            deadline = self._queue[0].enqueued + self.max_wait
+            while self._pending < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch, size = [], 0
+            while self._queue and (not batch or size + len(self._queue[0].texts) <= self.max_batch):
+                request = self._queue.popleft()
+                batch.append(request)
+                size += len(request.texts)
+            self._pending -= size
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter()
+            for request in batch:
+                instrumentation.observe('inference_queue_wait', started - request.enqueued)
+            texts = [text for request in batch for text in request.texts]
+            try:
+                labels = self.classify(texts)
+            except Exception as e:
+                print(f"[inference_server] Batch of {len(texts)} questions failed: {type(e).__name__}: {e}")
+                for request in batch:
+                    request.error = e
+                    request.done.set()
+                with self._cond:
+                    self._counters['errors'] += 1
+                continue
+
+            offset = 0
+            for request in batch:
+                request.labels = labels[offset:offset + len(request.texts)]
+                offset += len(request.texts)
+                request.done.set()
+            elapsed = time.perf_counter() - started
+            with self._cond:
+                self._counters['batches'] += 1
+                self._counters['questions'] += len(texts)
+                self._batch_seconds += 0.2 * (elapsed - self._batch_seconds)
+            instrumentation.observe('inference_batch', elapsed)
+            instrumentation.maybe_flush()
+
+    def drain_seconds(self) -> float:
+        """
+        Rough time until the questions queued now have been classified.
+        """
+        with self._cond:
+            return math.ceil(self._pending / self.max_batch) * self._batch_seconds
+
+    def stats(self) -> dict:
+        with self._cond:
+            counters = dict(self._counters, pending=self._pending, queued_requests=len(self._queue))
+        counters['mean_batch_size'] = counters['questions'] / counters['batches'] if counters['batches'] else 0.0
+        return counters
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive: one connection per client thread
+    server_version = 'BloomInference/1'
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != '/health':
+            self._send_json(404, {'error': 'not found'})
+            return
+        import model
+        self._send_json(200, {
+            'status': 'ok',
+            'backend': model.BACKEND,
+            'model_fingerprint': self.server.model_fingerprint,
+            'max_len': model.MAX_LEN,
+            'long_inputs': model.LONG_INPUTS,
+            'batching': self.server.batcher.stats(),
+            'tokens': model.token_stats.stats(),
+        })
+
+    def do_POST(self):
+        if self.path != '/predict':
+            self._send_json(404, {'error': 'not found'})
+            return
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            texts = ["" if text is None else str(text) for text in payload['texts']]
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {'error': f"Expected {{\"texts\": [...]}}: {e}"})
+            return
+        try:
+            labels = self.server.batcher.submit(texts)
+        except ServerBusy as e:
+            drain = self.server.batcher.drain_seconds()
+            self._send_json(503, {'error': f"busy: {e}"}, {
+                'Retry-After': str(max(1, math.ceil(drain))),  # RFC 9110: whole seconds
+                'X-Retry-After-Ms': str(int(drain * 1000)),
+            })
+            return
+        except Exception as e:
+            self._send_json(500, {'error': f"{type(e).__name__}: {e}"})
+            return
+        self._send_json(200, {'labels': labels})
+
+    def address_string(self):
+        # Unix-socket peers have no address.
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        # One line per request would drown the log; errors are printed where they happen.
+        pass
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ('unix', 0)
+
+
+def serve(url=None, threads=None, max_batch=MAX_BATCH, max_wait_ms=BATCH_WAIT_MS, max_pending=MAX_PENDING):
+    """
+    Loads the model and serves /predict on `url` until interrupted.
+    """
+    import torch
+    import model
+
+    url = url or os.environ.get('BLOOM_INFERENCE_URL') or DEFAULT_URL
+    # The only torch pool on the host: give it the cores.
+    torch.set_num_threads(threads or os.cpu_count() or 1)
+    model.bloom_model.get()
+    model_fingerprint = model._local_fingerprint()  # of the files just loaded
+
+    def classify(texts):
+        return model._predict_uncached(texts, model.BATCH_SIZE)
+
+    kind, address = parse_url(url)
+    if kind == 'unix':
+        if os.path.exists(address):
+            os.unlink(address)  # left over from a previous run
+        httpd = _UnixHTTPServer(address, _Handler)
+    else:
+        httpd = ThreadingHTTPServer(address, _Handler)
+        httpd.daemon_threads = True
+    httpd.batcher = MicroBatcher(classify, max_batch, max_wait_ms / 1000, max_pending)
+    httpd.model_fingerprint = model_fingerprint
+    print(f"[inference_server] Serving {model.BACKEND} model on {url} "
+          f"({torch.get_num_threads()} threads, batches of up to {max_batch}, {max_wait_ms} ms wait)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        if kind == 'unix' and os.path.exists(address):
+            os.unlink(address)
+
+
+# --- Client ---
+def _backoff(response, attempt, base=0.05, cap=2.0):
+    # Jittered exponential backoff, or the server's drain estimate if that is longer.
+    delay = min(base * (2 ** attempt), cap)
+    delay = random.uniform(delay / 2, delay)
+    if response is not None:
+        try:
+            delay = max(delay, int(response.headers['x-retry-after-ms']) / 1000)
+        except (KeyError, ValueError):
+            pass
+    return delay
+
+
+class InferenceClient:
+    """
+    Talks to the inference server. Thread-safe: one pooled httpx client per
+    process (it is rebuilt after a fork, connections must not be shared).
+    """
+
+    def __init__(self, url, timeout=CLIENT_TIMEOUT, chunk_size=CLIENT_CHUNK):
+        self.url = url
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self._client = None
+        self._client_pid = None
+        self._lock = threading.Lock()
+
+    def _http(self):
+        if self._client is None or self._client_pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._client_pid != os.getpid():
+                    kind, address = parse_url(self.url)
+                    if kind == 'unix':
+                        self._client = httpx.Client(transport=httpx.HTTPTransport(uds=address),
+                                                    base_url='http://inference', timeout=self.timeout)
+                    else:
+                        self._client = httpx.Client(base_url=self.url.rstrip('/'), timeout=self.timeout)
+                    self._client_pid = os.getpid()
+        return self._client
+
+    def _predict_chunk(self, texts, deadline):
+        attempt = 0
+        while True:
+            try:
+                response = self._http().post('/predict', json={'texts': texts})
+            except httpx.TransportError as e:
+                if time.monotonic() >= deadline:
+                    raise InferenceUnavailable(f"Inference server at {self.url} unreachable: {e}") from e
+                response = None
+            if response is not None:
+                if response.status_code == 200:
+                    return response.json()['labels']
+                if response.status_code != 503:
+                    raise InferenceUnavailable(f"Inference server error {response.status_code}: {response.text[:200]}")
+                if time.monotonic() >= deadline:
+                    raise InferenceUnavailable(f"Inference server at {self.url} still busy after {self.timeout:.0f}s")
+            time.sleep(min(_backoff(response, attempt), max(deadline - time.monotonic(), 0)))
+            attempt += 1
+
+    def predict(self, texts):
+        """
+        Returns one label per text, in order.
+        """
+        deadline = time.monotonic() + self.timeout
+        labels = []
+        for start in range(0, len(texts), self.chunk_size):
+            labels.extend(self._predict_chunk(texts[start:start + self.chunk_size], deadline))
+        return labels
+
+    def health(self) -> dict:
+        return self._http().get('/health').json()
+
+    def model_fingerprint(self) -> str:
+        """
+        Fingerprint of the model the server has loaded (see model._local_fingerprint).
+        """
+        try:
+            return self.health()['model_fingerprint']
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            raise InferenceUnavailable(f"Could not read the model fingerprint from {self.url}: {e}") from e
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the Bloom classifier to every worker on this host")
+    parser.add_argument('--url', help=f"http://host:port or unix:///path (default: $BLOOM_INFERENCE_URL or {DEFAULT_URL})")
+    parser.add_argument('--threads', type=int, help="torch intra-op threads (default: all cores)")
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    parser.add_argument('--max-wait-ms', type=float, default=BATCH_WAIT_MS)
+    parser.add_argument('--max-pending', type=int, default=MAX_PENDING)
+    args = parser.parse_args()
+    serve(args.url, args.threads, args.max_batch, args.max_wait_ms, args.max_pending)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,437 @@
+# instrumentation.py
+# Latency instrumentation for the hot paths, exposed in the Prometheus text
+# format on /metrics.
+#
+#   with instrumentation.timer('bert_forward'):
+#       ...
+#
+#   @instrumentation.timed('retrieval')
+#   def search(...): ...
+#
+# Every stage feeds one histogram, adequate_stage_seconds{stage=..., detail=...}.
+# Each HTTP request is timed as well and ends with one structured (JSON) log
+# line carrying its request ID and the time it spent in every stage, so a slow
+# /student/generate_report can be attributed to Supabase, retrieval, encoding
+# or the LLM.
+#
+# Metrics live in the memory of each process. Every worker writes a snapshot
+# to METRICS_DIR now and then, and /metrics adds up the snapshots of all live
+# workers, so a scrape sees the whole server and not only the worker that
+# answered it. The histograms and counters of a worker that exited are folded
+# into one retired snapshot, so restarting a worker never makes a total drop.
+#
+# Components with their own counters (caches, the tokenizer ...) register a
+# stats source; its counters go into the same snapshots and are exposed as
+# adequate_<component>_<stat>_total (counters) or adequate_<component>_<stat>
+# (gauges), summed over the workers.
+#
+# INSTRUMENTATION=0 turns everything off: timer() then hands back a shared
+# no-op context manager and observe() returns immediately.
+import contextvars
+import functools
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+
+try:
+    import fcntl
+except ImportError:  # Windows: retiring snapshots is not serialized
+    fcntl = None
+
+ENABLED = os.environ.get('INSTRUMENTATION', '1').lower() in ('1', 'true', 'yes')
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join('cache', 'metrics'))
+# Seconds between snapshot writes of one worker
+FLUSH_INTERVAL = 5.0
+# Histograms and counters of exited workers, added up
+RETIRED_FILE = 'retired.json'
+
+# Upper bounds (seconds) of the histogram buckets, from a cache hit to an LLM call
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_METRIC = 'adequate_stage_seconds'
+REQUEST_METRIC = 'adequate_http_request_seconds'
+_HELP = {
+    STAGE_METRIC: "Time spent in an instrumented stage (tokenization, BERT forward, retrieval, LLM, Supabase, templates ...).",
+    REQUEST_METRIC: "Time to handle an HTTP request, by endpoint.",
+}
+
+logger = logging.getLogger('adequate.requests')
+
+_NOOP = nullcontext()
+# Per-request {stage: seconds}, set while a request is being handled
+_request_stages = contextvars.ContextVar('request_stages', default=None)
+
+
+class Histogram:
+    """
+    Bucket counts, sum and count of one labelled series.
+    """
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last bucket: +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+_series = {}  # (metric, ((label, value), ...)) -> Histogram
+_stats_sources = {}  # component -> (source, counters, gauges)
+_lock = threading.Lock()
+_last_flush = 0.0
+
+
+# --- Recording ---
+def observe(stage, seconds, detail=None):
+    """
+    Records `seconds` spent in `stage` (and adds it to the current request's breakdown).
+    """
+    if not ENABLED:
+        return
+    _record(STAGE_METRIC, (('stage', stage), ('detail', detail or '')), seconds)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+def _record(metric, labels, seconds):
+    key = (metric, labels)
+    with _lock:
+        series = _series.get(key)
+        if series is None:
+            series = _series[key] = Histogram()
+        series.observe(seconds)
+
+
+@contextmanager
+def _timer(stage, detail):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started, detail)
+
+
+def timer(stage, detail=None):
+    """
+    Context manager timing the block as `stage`.
+    """
+    return _timer(stage, detail) if ENABLED else _NOOP
+
+
+def timed(stage, detail=None):
+    """
+    Decorator timing every call of the function as `stage`.
+    """
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _timer(stage, detail):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def register_stats(component, source, counters=(), gauges=()):
+    """
+    Exposes `source()` (a dict of numbers, or {} while there is nothing to
+    report) on /metrics. Only the keys named in `counters` (monotonic) and
+    `gauges` are exported; ratios and percentiles can't be summed over workers.
+    Registering a component again replaces its source.
+    """
+    _stats_sources[component] = (source, tuple(counters), tuple(gauges))
+
+
+def _collect_stats():
+    rows = []
+    for component, (source, counters, gauges) in list(_stats_sources.items()):
+        try:
+            values = source() or {}
+        except Exception as e:
+            print(f"[instrumentation] Stats of '{component}' unavailable: {type(e).__name__}: {e}")
+            continue
+        for kind, keys in (('counter', counters), ('gauge', gauges)):
+            for key in keys:
+                value = values.get(key)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    rows.append([component, key, kind, value])
+    return rows
+
+
+# --- Flask integration ---
+def init_app(app):
+    """
+    Times every request (histogram + one JSON log line with its request ID)
+    and every template render.
+    """
+    if not ENABLED:
+        return
+    from flask import before_render_template, g, request, template_rendered
+
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    @app.before_request
+    def _start_request():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        g.request_started = time.perf_counter()
+        g.request_stages_token = _request_stages.set({})
+
+    @app.after_request
+    def _finish_request(response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or 'unmatched'
+        _record(REQUEST_METRIC, (('endpoint', endpoint), ('method', request.method),
+                                 ('status', str(response.status_code))), elapsed)
+        response.headers['X-Request-ID'] = g.request_id
+        if endpoint != 'static':
+            stages = _request_stages.get() or {}
+            logger.info(json.dumps({
+                'ts': round(time.time(), 3), 'request_id': g.request_id, 'method': request.method,
+                'path': request.path, 'endpoint': endpoint, 'status': response.status_code,
+                'duration_ms': round(elapsed * 1000, 2),
+                'stages_ms': {stage: round(seconds * 1000, 2) for stage, seconds in stages.items()},
+            }, separators=(',', ':')))
+        maybe_flush()
+        return response
+
+    @app.teardown_request
+    def _end_request(_error=None):
+        token = g.pop('request_stages_token', None)
+        if token is not None:
+            _request_stages.reset(token)
+
+    renders = threading.local()
+
+    def _before_render(sender, template, context, **extra):
+        if not hasattr(renders, 'stack'):
+            renders.stack = []
+        renders.stack.append(time.perf_counter())
+
+    def _after_render(sender, template, context, **extra):
+        stack = getattr(renders, 'stack', None)
+        if stack:
+            observe('template_render', time.perf_counter() - stack.pop(), template.name)
+
+    # weak=False: the receivers are closures that nothing else keeps alive
+    before_render_template.connect(_before_render, app, weak=False)
+    template_rendered.connect(_after_render, app, weak=False)
+
+
+def instrument_supabase(client):
+    """
+    Times every HTTP call the Supabase client makes (PostgREST and auth) via
+    httpx event hooks, as stage 'supabase' with detail "<METHOD> <service>/<resource>".
+    Idempotent and cheap, so it can run before each request: supabase-py
+    replaces its PostgREST session when the auth state changes.
+    """
+    if not ENABLED:
+        return
+    sessions = []
+    try:
+        sessions.append(client.postgrest.session)
+    except Exception:
+        pass
+    sessions.append(getattr(getattr(client, 'auth', None), '_http_client', None))
+    for session in sessions:
+        hooks = getattr(session, 'event_hooks', None)
+        if hooks is None or _on_httpx_response in hooks.get('response', ()):
+            continue
+        session.event_hooks = {
+            'request': list(hooks.get('request', ())) + [_on_httpx_request],
+            'response': list(hooks.get('response', ())) + [_on_httpx_response],
+        }
+
+
+def _on_httpx_request(request):
+    request.extensions['adequate_started'] = time.perf_counter()
+
+
+def _on_httpx_response(response):
+    # Runs once the response headers have arrived (time to first byte).
+    started = response.request.extensions.get('adequate_started')
+    if started is None:
+        return
+    parts = response.request.url.path.strip('/').split('/')
+    resource = f"{parts[0]}/{parts[2]}" if len(parts) > 2 else '/'.join(parts)
+    observe('supabase', time.perf_counter() - started, f"{response.request.method} {resource}")
+
+
+# --- Exposition ---
+def _snapshot():
+    with _lock:
+        histograms = [[metric, [list(pair) for pair in labels], list(h.counts), h.sum, h.count]
+                      for (metric, labels), h in _series.items()]
+    return {'histograms': histograms, 'stats': _collect_stats()}
+
+
+def maybe_flush(force=False):
+    """
+    Writes this process's snapshot to METRICS_DIR (at most every FLUSH_INTERVAL seconds).
+    """
+    global _last_flush
+    now = time.monotonic()
+    if not force and now - _last_flush < FLUSH_INTERVAL:
+        return
+    _last_flush = now
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        _write_snapshot(os.path.join(METRICS_DIR, f"{os.getpid()}.json"), _snapshot())
+    except OSError as e:
+        print(f"[instrumentation] Could not write metrics snapshot: {e}")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge(snapshots):
+    # (histograms by (metric, labels), stats by (component, key, kind)) summed over `snapshots`
+    merged, stats = {}, {}
+    for snapshot in snapshots:
+        if isinstance(snapshot, list):  # written before stats sources existed
+            snapshot = {'histograms': snapshot, 'stats': []}
+        for metric, labels, counts, total, count in snapshot['histograms']:
+            key = (metric, tuple(tuple(pair) for pair in labels))
+            series = merged.setdefault(key, Histogram())
+            series.counts = [a + b for a, b in zip(series.counts, counts)]
+            series.sum += total
+            series.count += count
+        for component, key, kind, value in snapshot['stats']:
+            stats[(component, key, kind)] = stats.get((component, key, kind), 0) + value
+    return merged, stats
+
+
+def _as_snapshot(histograms, stats):
+    # The inverse of _merge() for one snapshot
+    return {
+        'histograms': [[metric, [list(pair) for pair in labels], h.counts, h.sum, h.count]
+                       for (metric, labels), h in histograms.items()],
+        'stats': [[component, key, kind, value] for (component, key, kind), value in stats.items()],
+    }
+
+
+def _read_snapshot(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_snapshot(path, snapshot):
+    fd, tmp_path = tempfile.mkstemp(dir=METRICS_DIR, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+
+def _retire(path):
+    # Folds an exited worker's histograms and counters into RETIRED_FILE, so the
+    # sums on /metrics never go down (Prometheus would take that for a counter
+    # reset). Its gauges go with it.
+    claimed = f"{path}.{os.getpid()}.retiring"
+    try:
+        os.rename(path, claimed)  # whoever renames it first folds it, exactly once
+    except OSError:
+        return
+    dead = _read_snapshot(claimed)
+    if dead:
+        histograms, stats = _merge([dead])
+        counters = {key: value for key, value in stats.items() if key[2] == 'counter'}
+        retired_path = os.path.join(METRICS_DIR, RETIRED_FILE)
+        with open(os.path.join(METRICS_DIR, '.retired.lock'), 'w') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            retired = [_read_snapshot(retired_path) or _as_snapshot({}, {}), _as_snapshot(histograms, counters)]
+            _write_snapshot(retired_path, _as_snapshot(*_merge(retired)))
+    try:
+        os.remove(claimed)
+    except OSError:
+        pass
+
+
+def _merged_series():
+    # Sums the snapshots of all live processes plus the retired totals of exited ones.
+    maybe_flush(force=True)
+    try:
+        entries = [e for e in os.scandir(METRICS_DIR) if e.name.endswith('.json')]
+    except OSError:
+        entries = []
+    snapshots = []
+    for entry in entries:
+        pid = int(entry.name[:-5]) if entry.name[:-5].isdigit() else None
+        if pid is not None and pid != os.getpid() and not _pid_alive(pid):
+            try:
+                _retire(entry.path)
+            except OSError as e:
+                print(f"[instrumentation] Could not retire metrics snapshot {entry.name}: {e}")
+            continue
+        if entry.name != RETIRED_FILE:
+            snapshots.append(_read_snapshot(entry.path))
+    snapshots.append(_read_snapshot(os.path.join(METRICS_DIR, RETIRED_FILE)))
+    snapshots = [snapshot for snapshot in snapshots if snapshot]
+    return _merge(snapshots or [_snapshot()])
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_metrics() -> str:
+    """
+    All histograms and registered stats in the Prometheus text exposition format (version 0.0.4).
+    """
+    histograms, stats = _merged_series()
+    by_metric = {}
+    for (metric, labels), series in sorted(histograms.items()):
+        by_metric.setdefault(metric, []).append((labels, series))
+
+    lines = []
+    for metric, entries in by_metric.items():
+        lines.append(f"# HELP {metric} {_HELP.get(metric, metric)}")
+        lines.append(f"# TYPE {metric} histogram")
+        for labels, series in entries:
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in labels)
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float('inf'),), series.counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{metric}_bucket{{{label_text},le="{le}"}} {cumulative}')
+            lines.append(f"{metric}_sum{{{label_text}}} {series.sum:.6f}")
+            lines.append(f"{metric}_count{{{label_text}}} {series.count}")
+
+    for (component, key, kind), value in sorted(stats.items()):
+        metric = f"adequate_{component}_{key}"
+        if kind == 'counter' and not metric.endswith('_total'):
+            metric += '_total'
+        lines.append(f"# HELP {metric} {key.replace('_', ' ').capitalize()} of {component.replace('_', ' ')}, all workers.")
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.append(f"{metric} {value}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,182 @@
+# jobs.py
+# A small local job queue: SQLite for state, a few daemon threads for work.
+#
+# No broker is needed. The jobs table lives in one SQLite file shared by every
+# gunicorn worker, so a job submitted to one worker can be polled from any other.
+# Each process runs its own worker threads, which claim queued jobs atomically;
+# the request that submitted a job returns immediately instead of waiting for it.
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+import sqlite_util
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+# A running job whose progress hasn't been updated for this long is assumed to
+# belong to a worker that died, and is handed to another one.
+STALE_AFTER_SECONDS = 15 * 60
+
+
+class JobQueue:
+    """
+    Persists jobs in SQLite and runs them on a pool of background threads.
+
+    `handlers` maps a job kind to a function `handler(payload, progress)`;
+    the handler calls `progress(done, total)` as it goes and may return a
+    JSON-serialisable result.
+    """
+
+    def __init__(self, db_path, handlers, workers=2, poll_interval=1.0):
+        self.db_path = db_path
+        self.handlers = handlers
+        self.workers = workers
+        self.poll_interval = poll_interval
+
+        self._connections = sqlite_util.ThreadLocalConnection(db_path, pragmas=('journal_mode=WAL',),
+                                                              row_factory=sqlite3.Row)
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._threads_pid = None
+        self._start_lock = threading.Lock()
+
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, kind TEXT NOT NULL, owner TEXT, status TEXT NOT NULL,"
+                " payload TEXT NOT NULL, result TEXT, error TEXT,"
+                " done INTEGER NOT NULL DEFAULT 0, total INTEGER NOT NULL DEFAULT 0,"
+                " created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at)")
+
+    def _connection(self):
+        return self._connections.get()
+
+    # --- Public API ---
+    def submit(self, kind, payload, owner=None, job_id=None):
+        """
+        Queues a job and returns its id.
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind '{kind}'")
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, owner, status, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, None if owner is None else str(owner), QUEUED, json.dumps(payload), now, now),
+            )
+        self._ensure_workers()
+        self._wakeup.set()
+        return job_id
+
+    def start(self):
+        """
+        Requeues stale running jobs and starts this process's worker threads.
+        Call it once the process is up (after gunicorn's fork); get() and
+        submit() start the workers too, if nobody did.
+        """
+        now = time.time()
+        with self._connection() as conn:
+            requeued = conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ? AND updated_at < ?",
+                (QUEUED, now, RUNNING, now - STALE_AFTER_SECONDS),
+            ).rowcount
+        if requeued:
+            print(f"[jobs] Requeued {requeued} stale job(s)")
+        self._ensure_workers()
+        self._wakeup.set()
+
+    def get(self, job_id):
+        """
+        Returns the job as a dict (with a 'percent' field), or None.
+        """
+        # A poll may be the first thing this process does: queued jobs must not wait for a submit.
+        self._ensure_workers()
+        return self._load(job_id)
+
+    def _load(self, job_id):
+        row = self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        if job['status'] == DONE:
+            job['percent'] = 100
+        else:
+            job['percent'] = int(100 * job['done'] / job['total']) if job['total'] else 0
+        return job
+
+    # --- Workers ---
+    def _ensure_workers(self):
+        # Threads don't survive a fork, so (re)start them in whichever process uses the queue.
+        with self._start_lock:
+            if self._threads_pid == os.getpid() and all(t.is_alive() for t in self._threads):
+                return
+            self._threads = []
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self._threads_pid = os.getpid()
+
+    def _claim(self):
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = ? OR (status = ? AND updated_at < ?) ORDER BY created_at LIMIT 1",
+                (QUEUED, RUNNING, now - STALE_AFTER_SECONDS),
+            ).fetchone()
+            if row is None:
+                return None
+            # Only one worker (in any process) wins this update.
+            claimed = conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND (status = ? OR updated_at < ?)",
+                (RUNNING, now, row['id'], QUEUED, now - STALE_AFTER_SECONDS),
+            ).rowcount
+        return self._load(row['id']) if claimed else None
+
+    def _worker_loop(self):
+        while True:
+            job = self._claim()
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job):
+        conn = self._connection()
+
+        def progress(done, total):
+            # May be called from another thread (e.g. the engine's event loop)
+            with self._connection() as progress_conn:
+                progress_conn.execute(
+                    "UPDATE jobs SET done = ?, total = ?, updated_at = ? WHERE id = ?",
+                    (done, total, time.time(), job['id']),
+                )
+
+        try:
+            result = self.handlers[job['kind']](job['payload'], progress)
+            with conn:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, result = ?, updated_at = ? WHERE id = ?",
+                    (DONE, json.dumps(result), time.time(), job['id']),
+                )
+        except Exception as e:
+            print(f"Job {job['id']} ({job['kind']}) failed: {e}")
+            traceback.print_exc()
+            with conn:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                    (FAILED, str(e), time.time(), job['id']),
+                )
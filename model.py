@@ -1,56 +1,312 @@
-import torch
-from transformers import BertTokenizer, BertForSequenceClassification
-import json
+import numpy as np
+import os
+import threading
 
-# --- 1. Load the model and tokenizer ONCE ---
-MODEL_PATH = r'D:\new_hopes\Blooms_Phase_4\content\bloom_bert_model'
-MAX_LEN = 128
+import httpx
 
-# Set device
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+import instrumentation
+import registry
+from bloom_backends import BACKENDS, load_backend, onnx_dir_for
+from inference_server import InferenceClient
+from prediction_cache import PredictionCache, model_fingerprint
 
-print("Loading model...")
-# Load the fine-tuned model and tokenizer
-model = BertForSequenceClassification.from_pretrained(MODEL_PATH)
-tokenizer = BertTokenizer.from_pretrained(MODEL_PATH)
+# --- 1. Configuration ---
+MODEL_PATH = os.environ.get('BLOOM_MODEL_PATH', r'D:\new_hopes\Blooms_Phase_4\content\bloom_bert_model')
+# Longest token sequence the classifier sees; shorter batches are padded only to their longest question
+MAX_LEN = int(os.environ.get('BLOOM_MAX_LEN', 128))
+BATCH_SIZE = 32
+# Questions longer than MAX_LEN tokens: 'truncate' classifies the first MAX_LEN
+# tokens; 'window' classifies overlapping MAX_LEN windows (sharing
+# BLOOM_WINDOW_STRIDE tokens) and averages their logits.
+LONG_INPUTS = os.environ.get('BLOOM_LONG_INPUTS', 'truncate')
+LONG_INPUT_MODES = ('truncate', 'window')
+WINDOW_STRIDE = int(os.environ.get('BLOOM_WINDOW_STRIDE', 32))
+# One of bloom_backends.BACKENDS: 'torch' (fp32), 'torch_int8' or 'onnx'
+BACKEND = os.environ.get('BLOOM_BACKEND', 'torch')
+# Prediction cache (see prediction_cache.py); set BLOOM_CACHE=0 to turn it off
+CACHE_ENABLED = os.environ.get('BLOOM_CACHE', '1').lower() in ('1', 'true', 'yes')
+CACHE_PATH = os.environ.get('BLOOM_CACHE_PATH', os.path.join('cache', 'bloom_predictions.sqlite3'))
+# Seconds between checks of the model files for a replaced model
+CACHE_CHECK_SECONDS = float(os.environ.get('BLOOM_CACHE_CHECK_SECONDS', 30))
+# Classify through the shared inference server (see inference_server.py) instead of
+# loading the model in this process, e.g. http://127.0.0.1:8765 or unix:///run/adequate/bloom.sock
+INFERENCE_URL = os.environ.get('BLOOM_INFERENCE_URL')
 
-# Load the label mappings
-with open(f'{MODEL_PATH}/label_mappings.json', 'r') as f:
-    label_mappings = json.load(f)
-    id2label = {int(k): v for k, v in label_mappings['id2label'].items()}
 
-# Move model to the correct device
-model.to(device)
-model.eval() # Set model to evaluation mode
-print("Model loaded successfully on device:", device)
+class BloomModel:
+    """
+    The fine-tuned BERT classifier (behind the configured inference backend)
+    together with its tokenizer and label mapping.
+    """
 
+    def __init__(self, model_path=MODEL_PATH, backend=BACKEND):
+        # Imported here (and torch in bloom_backends) so that importing this module stays cheap.
+        from transformers import BertTokenizerFast
 
-# --- 2. Prediction function ---
-def predict_bloom_level(question_text):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown BLOOM_BACKEND '{backend}'. Choose one of: {', '.join(BACKENDS)}")
+        if LONG_INPUTS not in LONG_INPUT_MODES:
+            raise ValueError(f"Unknown BLOOM_LONG_INPUTS '{LONG_INPUTS}'. Choose one of: {', '.join(LONG_INPUT_MODES)}")
+
+        print(f"Loading model ({backend} backend)...")
+        # The fast (Rust) tokenizer encodes a whole list of questions in one call.
+        self.tokenizer = BertTokenizerFast.from_pretrained(model_path)
+        # The torch backends pick CUDA when it is available
+        self.backend = load_backend(backend, model_path)
+        # Every backend reads the same label_mappings.json, so labels are identical.
+        self.id2label = self.backend.id2label
+        print("Model loaded successfully on device:", getattr(self.backend, 'device', 'cpu'))
+
+
+# --- 2. Load the model ONCE, on first use ---
+# Nothing is loaded at import time; see registry.py for the preload mode.
+# With an inference server the weights live there, so they are never preloaded here.
+if INFERENCE_URL:
+    bloom_model = registry.LazySingleton('bloom_model', BloomModel)
+    inference_client = InferenceClient(INFERENCE_URL)
+else:
+    bloom_model = registry.register('bloom_model', BloomModel)
+    inference_client = None
+
+
+def _local_fingerprint():
+    # Changes whenever a file in the model directory (or its ONNX export) changes.
+    return model_fingerprint(MODEL_PATH, onnx_dir_for(MODEL_PATH), extra=f"{BACKEND}|{MAX_LEN}|{LONG_INPUTS}")
+
+
+def _current_fingerprint():
+    # With an inference server the labels come from the model it loaded, not from
+    # whatever is (or isn't) in this process's MODEL_PATH.
+    if inference_client is not None:
+        return inference_client.model_fingerprint()
+    return _local_fingerprint()
+
+
+prediction_cache = registry.register('prediction_cache', lambda: PredictionCache(
+    CACHE_PATH, _current_fingerprint, check_interval=CACHE_CHECK_SECONDS
+))
+
+
+class TokenLengthStats:
     """
-    Takes a question string and returns the predicted Bloom's level.
+    Token lengths of the questions this process has classified, how many were
+    longer than MAX_LEN, and how much of each forward pass was padding.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histogram = np.zeros(MAX_LEN + 1, dtype=np.int64)
+        self.truncated = 0
+        self.windows = 0
+        self.real_tokens = 0
+        self.padded_tokens = 0
+
+    def record_questions(self, lengths, windows):
+        counts = np.bincount(lengths)
+        with self._lock:
+            if len(counts) > len(self.histogram):
+                self.histogram = np.pad(self.histogram, (0, len(counts) - len(self.histogram)))
+            self.histogram[:len(counts)] += counts
+            self.truncated += int(np.count_nonzero(lengths > MAX_LEN))
+            self.windows += windows
+
+    def record_batch(self, attention_mask):
+        with self._lock:
+            self.real_tokens += int(attention_mask.sum())
+            self.padded_tokens += attention_mask.size
+
+    def stats(self) -> dict:
+        with self._lock:
+            histogram = self.histogram.copy()
+            truncated, windows = self.truncated, self.windows
+            real, padded = self.real_tokens, self.padded_tokens
+        questions = int(histogram.sum())
+        if not questions:
+            return {}
+        cumulative = np.cumsum(histogram)
+        return {
+            'questions': questions,
+            'truncated': truncated,
+            'truncated_ratio': truncated / questions,
+            'long_inputs': LONG_INPUTS,
+            'max_len': MAX_LEN,
+            'windows': windows,
+            'tokens_p50': int(np.searchsorted(cumulative, questions * 0.50)),
+            'tokens_p95': int(np.searchsorted(cumulative, questions * 0.95)),
+            'tokens_max': int(np.flatnonzero(histogram)[-1]),
+            'real_tokens': real,
+            'padded_tokens': padded,
+            'padding_ratio': (padded - real) / padded if padded else 0.0,
+        }
+
+
+token_stats = TokenLengthStats()
+# The process that runs the model (this one, or the inference server) reports these on /metrics.
+instrumentation.register_stats('bloom_tokens', token_stats.stats,
+                               counters=('questions', 'truncated', 'windows', 'real_tokens', 'padded_tokens'))
+
+
+# --- 3. Prediction functions ---
+def encode_questions(tokenizer, texts, max_len=MAX_LEN, long_inputs=LONG_INPUTS, stride=WINDOW_STRIDE):
     """
-    # Tokenize the input
-    encoding = tokenizer.encode_plus(
-        question_text,
+    Tokenizes every question in a single fast-tokenizer call, without padding.
+
+    Returns (input_ids, owners, lengths): the token ids of every sequence to
+    run, the index of the question each one belongs to, and the full token
+    length of every question before truncation. A question longer than max_len
+    overflows into further windows that repeat the last `stride` tokens of the
+    previous one; 'truncate' keeps only the first window of each question,
+    'window' keeps them all.
+    """
+    stride = min(stride, max_len // 2)
+    encodings = tokenizer(
+        texts,
         add_special_tokens=True,
-        max_length=MAX_LEN,
+        max_length=max_len,
+        truncation=True,
+        padding=False,
+        return_overflowing_tokens=True,
+        stride=stride,
         return_token_type_ids=False,
-        padding='max_length',
-        return_attention_mask=True,
-        return_tensors='pt',
-        truncation=True
+        return_attention_mask=False,
     )
+    input_ids = encodings['input_ids']
+    owners = np.asarray(encodings['overflow_to_sample_mapping'], dtype=np.int64)
+    window_lengths = np.fromiter((len(ids) for ids in input_ids), dtype=np.int64, count=len(input_ids))
+
+    # Every window carries [CLS] and [SEP]; consecutive windows share `stride` tokens.
+    windows = np.bincount(owners, minlength=len(texts))
+    lengths = (np.bincount(owners, weights=window_lengths - 2, minlength=len(texts)).astype(np.int64)
+               - (windows - 1) * stride + 2)
+
+    if long_inputs == 'truncate':
+        first = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+        input_ids = [input_ids[i] for i in first]
+        owners = owners[first]
+    return input_ids, owners, lengths
+
+
+def predict_logits(tokenizer, backend, input_ids, owners, n_texts, batch_size=BATCH_SIZE, stats=None):
+    """
+    Runs the encoded sequences through the backend and returns a (n_texts,
+    num_labels) float32 array: each question's logits, averaged over its windows.
+
+    The sequences are sorted by token length and run in batches, each one padded
+    only to the longest sequence it contains, so the cost of a batch follows the
+    real question length rather than MAX_LEN.
+    """
+    order = np.argsort([len(ids) for ids in input_ids], kind='stable')
+    pooled = None
+
+    for start in range(0, len(order), batch_size):
+        rows = order[start:start + batch_size]
+        batch = tokenizer.pad(
+            {'input_ids': [input_ids[i] for i in rows]},
+            padding='longest',
+            return_attention_mask=True,
+            return_tensors='np',
+        )
+        if stats is not None:
+            stats.record_batch(batch['attention_mask'])
+        with instrumentation.timer('bert_forward', backend.name):
+            logits = backend.logits(batch['input_ids'], batch['attention_mask'])
+        if pooled is None:
+            pooled = np.zeros((n_texts, logits.shape[1]), dtype=np.float32)
+        np.add.at(pooled, owners[rows], logits)
+
+    return pooled / np.bincount(owners, minlength=n_texts).astype(np.float32)[:, None]
+
+
+def _predict_uncached(texts, batch_size):
+    """
+    Runs the classifier on every text (no cache), on the configured backend
+    (see bloom_backends.py). See encode_questions() for how questions longer
+    than MAX_LEN are handled and predict_logits() for the batching.
+    """
+    loaded = bloom_model.get()
+
+    with instrumentation.timer('tokenization'):
+        input_ids, owners, lengths = encode_questions(loaded.tokenizer, texts)
+    # Truncated questions are counted here and reported on /metrics (adequate_bloom_tokens_truncated_total)
+    token_stats.record_questions(lengths, len(input_ids))
+
+    logits = predict_logits(loaded.tokenizer, loaded.backend, input_ids, owners, len(texts), batch_size, token_stats)
+    return [loaded.id2label[prediction_id] for prediction_id in np.argmax(logits, axis=1).tolist()]
+
+
+def _predict_remote(texts, batch_size):
+    # The server picks its own batch size: it merges these texts with other workers' questions.
+    with instrumentation.timer('bert_forward', 'remote'):
+        return inference_client.predict(texts)
+
+
+def predict_bloom_levels(texts, batch_size=BATCH_SIZE):
+    """
+    Takes a list of question strings and returns the predicted Bloom's levels,
+    in the same order as the input.
+
+    Questions already classified by the current model are answered from the
+    prediction cache; only the misses (each distinct one once) go through
+    batched inference, in this process or, with BLOOM_INFERENCE_URL, on the
+    shared inference server.
+    """
+    texts = ["" if text is None else str(text) for text in texts]
+    if not texts:
+        return []
+    classify = _predict_remote if inference_client is not None else _predict_uncached
+    if not CACHE_ENABLED:
+        return classify(texts, batch_size)
 
-    input_ids = encoding['input_ids'].to(device)
-    attention_mask = encoding['attention_mask'].to(device)
+    cache = prediction_cache.get()
+    keys, found = cache.get_many(texts)
 
-    # Get prediction
-    with torch.no_grad():
-        outputs = model(input_ids=input_ids, attention_mask=attention_mask)
-        logits = outputs.logits
+    # One representative text per missing key.
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in found and key not in missing:
+            missing[key] = text
 
-    prediction_id = torch.argmax(logits, dim=1).item()
-    predicted_label = id2label[prediction_id]
+    if missing:
+        labels = classify(list(missing.values()), batch_size)
+        fresh = dict(zip(missing.keys(), labels))
+        cache.put_many(fresh)
+        found.update(fresh)
 
-    return predicted_label
\ No newline at end of file
+    return [found[key] for key in keys]
+
+
+def prediction_cache_stats():
+    """
+    Returns the prediction cache's hit/miss counters (empty if the cache is off or unused).
+    """
+    if not CACHE_ENABLED or not prediction_cache.is_loaded:
+        return {}
+    return prediction_cache.get().stats()
+
+
+instrumentation.register_stats('bloom_prediction_cache', prediction_cache_stats,
+                               counters=('hits', 'misses', 'memory_hits', 'disk_hits', 'evictions'),
+                               gauges=('memory_entries',))
+
+
+def truncation_stats():
+    """
+    Returns the token-length distribution of the questions classified so far,
+    how many exceeded MAX_LEN, and the share of padding in the forward passes
+    (empty before the first prediction). With an inference server, these are
+    the server's numbers.
+    """
+    if inference_client is not None:
+        try:
+            return inference_client.health().get('tokens', {})
+        except (httpx.HTTPError, ValueError) as e:
+            print(f"[model] Inference server stats unavailable: {type(e).__name__}: {e}")
+            return {}
+    return token_stats.stats()
+
+
+def predict_bloom_level(question_text):
+    """
+    Takes a question string and returns the predicted Bloom's level.
+    """
+    return predict_bloom_levels([question_text])[0]
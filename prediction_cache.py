@@ -0,0 +1,211 @@
+# prediction_cache.py
+# Content-addressed cache in front of the Bloom classifier.
+#
+# Teachers re-upload the same question banks every semester; with this cache a
+# question is only run through BERT again if its text or the model changed.
+#
+#   key   = sha256(model fingerprint + normalized question text)
+#   tier1 = in-process LRU (OrderedDict)
+#   tier2 = on-disk SQLite table, trimmed to `max_disk_entries` (least recently used first)
+#
+# The model fingerprint is derived from the files in the model directory, so
+# replacing the model invalidates every cached label automatically (within
+# FINGERPRINT_CHECK_SECONDS, or at once after reload()).
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import sqlite_util
+
+_WHITESPACE = re.compile(r'\s+')
+# How often lookups re-read the model directory to notice a replaced model
+FINGERPRINT_CHECK_SECONDS = 30.0
+
+
+def normalize_question(text):
+    """
+    Normalizes a question so that trivially different copies share a cache entry:
+    Unicode NFKC, no leading/trailing whitespace, internal whitespace collapsed.
+    """
+    text = unicodedata.normalize('NFKC', "" if text is None else str(text))
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def model_fingerprint(*model_dirs, extra=""):
+    """
+    Hashes the name, size and modification time of every file in the given model
+    directories (plus `extra`, e.g. the backend name). Any change to the model
+    files produces a different fingerprint.
+    """
+    digest = hashlib.sha256(extra.encode('utf-8'))
+    for model_dir in model_dirs:
+        if not os.path.isdir(model_dir):
+            continue
+        for root, _dirs, files in os.walk(model_dir):
+            for filename in sorted(files):
+                path = os.path.join(root, filename)
+                stat = os.stat(path)
+                digest.update(f"{os.path.relpath(path, model_dir)}|{stat.st_size}|{stat.st_mtime_ns};".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+class PredictionCache:
+    """
+    Two-tier (memory + SQLite) cache mapping question text to a predicted label.
+
+    `fingerprint_fn` is called on the first lookup and then at most every
+    `check_interval` seconds; when its value changes (the model directory was
+    modified) both tiers drop the entries of the old model.
+    """
+
+    def __init__(self, db_path, fingerprint_fn, memory_size=10_000, max_disk_entries=200_000,
+                 check_interval=FINGERPRINT_CHECK_SECONDS):
+        self.db_path = db_path
+        self.fingerprint_fn = fingerprint_fn
+        self.check_interval = check_interval
+        self.memory_size = memory_size
+        self.max_disk_entries = max_disk_entries
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._connections = sqlite_util.ThreadLocalConnection(db_path, pragmas=sqlite_util.WAL_PRAGMAS)
+        self._fingerprint = None
+        self._checked_at = 0.0
+
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                " key TEXT PRIMARY KEY, label TEXT NOT NULL, fingerprint TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_last_used ON predictions(last_used)")
+
+    def _connection(self):
+        return self._connections.get()
+
+    def reload(self):
+        """
+        Re-checks the model fingerprint on the next lookup (call it after swapping the model).
+        """
+        self._checked_at = 0.0
+
+    def _check_fingerprint(self):
+        now = time.monotonic()
+        if self._fingerprint is not None and now - self._checked_at < self.check_interval:
+            return self._fingerprint
+        fingerprint = self.fingerprint_fn()
+        self._checked_at = now
+        if fingerprint != self._fingerprint:
+            with self._lock:
+                self._memory.clear()
+            with self._connection() as conn:
+                conn.execute("DELETE FROM predictions WHERE fingerprint != ?", (fingerprint,))
+            self._fingerprint = fingerprint
+        return fingerprint
+
+    def key_for(self, text, fingerprint=None):
+        fingerprint = fingerprint or self._fingerprint
+        return hashlib.sha256(f"{fingerprint}\x00{normalize_question(text)}".encode('utf-8')).hexdigest()
+
+    def get_many(self, texts):
+        """
+        Looks up every text. Returns (keys, found) where `keys[i]` is the cache key of
+        texts[i] and `found` maps the keys that were cached to their labels.
+        """
+        fingerprint = self._check_fingerprint()
+        keys = [self.key_for(text, fingerprint) for text in texts]
+        found = {}
+
+        # Tier 1: memory
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+        memory_found = len(found)
+
+        # Tier 2: SQLite, for whatever memory didn't have
+        missing = list(dict.fromkeys(key for key in keys if key not in found))
+        conn = self._connection()
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(f"SELECT key, label FROM predictions WHERE key IN ({placeholders})", chunk).fetchall()
+            found.update(rows)
+        disk_keys = [key for key in missing if key in found]
+        if disk_keys:
+            now = time.time()
+            with conn:
+                conn.executemany("UPDATE predictions SET last_used = ? WHERE key = ?", [(now, key) for key in disk_keys])
+            self._remember({key: found[key] for key in disk_keys})
+
+        # Counters are per requested text (duplicates in one upload count individually).
+        hit_count = sum(1 for key in keys if key in found)
+        with self._lock:
+            self.hits += hit_count
+            self.misses += len(keys) - hit_count
+            self.memory_hits += memory_found
+            self.disk_hits += len(disk_keys)
+        return keys, found
+
+    def put_many(self, labels_by_key):
+        """
+        Stores freshly predicted {key: label} pairs in both tiers.
+        """
+        if not labels_by_key:
+            return
+        self._remember(labels_by_key)
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO predictions (key, label, fingerprint, last_used) VALUES (?, ?, ?, ?)",
+                [(key, label, self._fingerprint, now) for key, label in labels_by_key.items()],
+            )
+        self._evict(conn)
+
+    def _remember(self, labels_by_key):
+        with self._lock:
+            for key, label in labels_by_key.items():
+                self._memory[key] = label
+                self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def _evict(self, conn):
+        # Size-based eviction: trim the least recently used rows down to 90% of the limit.
+        count = conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+        if count <= self.max_disk_entries:
+            return
+        to_remove = count - int(self.max_disk_entries * 0.9)
+        with conn:
+            conn.execute(
+                "DELETE FROM predictions WHERE key IN (SELECT key FROM predictions ORDER BY last_used LIMIT ?)",
+                (to_remove,),
+            )
+        with self._lock:
+            self.evictions += to_remove
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'memory_entries': len(self._memory),
+            }
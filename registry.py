@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+
+
+class LazySingleton:
+    """
+    Holds one expensive object (a model, an engine, ...) that is only built
+    the first time somebody asks for it.
+
+    get() is thread-safe: concurrent first callers wait on a lock and the
+    factory runs exactly once per process.
+    """
+
+    def __init__(self, name, factory):
+        self.name = name
+        self._factory = factory
+        self._instance = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def get(self):
+        # Fast path: no locking once the object exists.
+        if self._loaded:
+            return self._instance
+
+        with self._lock:
+            if not self._loaded:
+                print(f"[registry] Loading '{self.name}'...")
+                started = time.perf_counter()
+                self._instance = self._factory()
+                self._loaded = True
+                print(f"[registry] '{self.name}' ready in {time.perf_counter() - started:.2f}s")
+        return self._instance
+
+    @property
+    def is_loaded(self):
+        return self._loaded
+
+    def _reset_lock(self):
+        # A lock copied into a forked child may be in the "held" state.
+        self._lock = threading.Lock()
+
+
+_singletons = {}
+
+
+def register(name, factory):
+    """
+    Registers a lazily built object under `name` and returns its LazySingleton.
+    """
+    if name in _singletons:
+        raise ValueError(f"'{name}' is already registered")
+    singleton = LazySingleton(name, factory)
+    _singletons[name] = singleton
+    return singleton
+
+
+def get(name):
+    """
+    Returns the object registered under `name`, building it on first use.
+    """
+    return _singletons[name].get()
+
+
+def preload(names=None):
+    """
+    Builds every registered object (or just `names`) right now.
+
+    Call this in the gunicorn master before it forks (see gunicorn.conf.py):
+    the workers then share the already loaded weights copy-on-write instead
+    of each loading their own copy.
+    """
+    for name in (names or list(_singletons)):
+        _singletons[name].get()
+
+
+def status():
+    """
+    Returns {name: loaded?} for every registered object.
+    """
+    return {name: singleton.is_loaded for name, singleton in _singletons.items()}
+
+
+def preload_enabled():
+    return os.environ.get("ADEQUATE_PRELOAD", "0").lower() in ("1", "true", "yes")
+
+
+def _after_fork_in_child():
+    for singleton in _singletons.values():
+        singleton._reset_lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,303 @@
+# report_pdf.py
+# Server-side PDFs for the student career report and the classification results,
+# rendered with fpdf2 (pure Python, no browser, no CDN scripts).
+#
+# Rendered files are cached on disk under a hash of everything that goes into
+# them, so a report is only rendered again when its data (scores,
+# career_suggestion, ...) actually changes - a changed report simply gets a new
+# key, and old files age out of the cache.
+#
+# Fonts: the bundled DejaVu Sans (static/fonts, see LICENSE-DejaVu.txt there),
+# or REPORT_FONT_PATH / REPORT_BOLD_FONT_PATH. They are required: the core PDF
+# fonts only cover Latin-1, and names or recommendations in other scripts
+# would come out as '?'.
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from fpdf import FPDF
+from fpdf.enums import XPos, YPos
+from fpdf.fonts import FontFace
+
+# Bump when the layout changes so cached files are re-rendered
+RENDERER_VERSION = 2
+# A report renders in ~20 ms; below this many missing reports, starting worker
+# processes costs more than it saves
+PARALLEL_MIN_REPORTS = 150
+
+_FONT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'fonts')
+FONT_PATH = os.environ.get('REPORT_FONT_PATH', os.path.join(_FONT_DIR, 'DejaVuSans.ttf'))
+BOLD_FONT_PATH = os.environ.get('REPORT_BOLD_FONT_PATH', os.path.join(_FONT_DIR, 'DejaVuSans-Bold.ttf'))
+
+ACCENT = (0, 122, 255)
+MUTED = (110, 110, 120)
+HEADINGS = FontFace(emphasis='BOLD', fill_color=(235, 240, 250))
+TRAIT_COLORS = [(54, 162, 235), (255, 159, 64), (75, 192, 192), (255, 99, 132), (153, 102, 255)]
+
+
+class ReportPDF(FPDF):
+    def __init__(self, title):
+        super().__init__(orientation='portrait', unit='mm', format='A4')
+        self.title_text = title
+        self.set_auto_page_break(auto=True, margin=15)
+        self.set_title(title)
+        for path in (FONT_PATH, BOLD_FONT_PATH):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Report font not found: {path}. The DejaVu Sans TTFs ship in static/fonts; "
+                                        f"or point REPORT_FONT_PATH / REPORT_BOLD_FONT_PATH at a Unicode TTF.")
+        self.add_font('Report', '', FONT_PATH)
+        self.add_font('Report', 'B', BOLD_FONT_PATH)
+        self.family = 'Report'
+
+    @staticmethod
+    def text_safe(text):
+        return '' if text is None else str(text)
+
+    def font(self, size, bold=False, color=(0, 0, 0)):
+        self.set_font(self.family, 'B' if bold else '', size)
+        self.set_text_color(*color)
+
+    def footer(self):
+        self.set_y(-12)
+        self.font(8, color=MUTED)
+        self.cell(0, 8, self.text_safe(f"{self.title_text} - page {self.page_no()}"), align='C')
+
+    def heading(self, text):
+        self.ln(4)
+        self.font(14, bold=True, color=ACCENT)
+        self.cell(0, 9, self.text_safe(text), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        self.set_draw_color(*ACCENT)
+        self.line(self.l_margin, self.get_y(), self.w - self.r_margin, self.get_y())
+        self.ln(2)
+
+    def paragraph(self, text, size=10, bold=False, color=(0, 0, 0), align='L'):
+        self.font(size, bold=bold, color=color)
+        self.multi_cell(0, size * 0.55, self.text_safe(text), align=align, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+
+# --- Student report ---
+def student_report_pdf(report: dict) -> bytes:
+    """
+    Renders the career report. `report` is the same data the HTML page gets:
+    student, aq_category, trait_scores, top_traits, suggestions, bloom_map.
+    """
+    student = report['student']
+    pdf = ReportPDF(f"Career Report {student.get('enrollment_no') or ''}".strip())
+    pdf.add_page()
+
+    pdf.paragraph("Your Personalized Career Report", size=20, bold=True, align='C')
+    pdf.paragraph(f"Enrollment No: {student.get('enrollment_no') or 'N/A'}", size=10, color=MUTED, align='C')
+
+    pdf.heading("Your Adversity Quotient (AQ) Profile")
+    pdf.paragraph(report['aq_category'].get('name', 'Category not available'), size=16, bold=True, align='C')
+    pdf.paragraph(f"Your Score: {student.get('aq_score') or 'Score not available'}", size=11, align='C')
+    pdf.paragraph(report['aq_category'].get('description', ''), size=10, color=MUTED, align='C')
+
+    pdf.heading("Your AQ Trait Breakdown")
+    _trait_bars(pdf, report['trait_scores'])
+
+    pdf.heading("Profile Summary")
+    rows = [("Overall AQ Score", student.get('aq_score') or 'N/A', "(Overall Resilience Indicator)")]
+    for i, (trait, score) in enumerate(report['top_traits'][:2], start=1):
+        rows.append((f"Top Trait {i}: {trait}", f"Score: {_doubled(score)}", report['bloom_map'].get(trait, 'N/A')))
+    _table(pdf, ("Metric", "Value", "Associated Bloom's Taxonomy Level"), rows, widths=(55, 35, 100))
+
+    pdf.heading("AI-Powered Career Recommendations")
+    if report['suggestions']:
+        for i, suggestion in enumerate(report['suggestions'], start=1):
+            pdf.paragraph(f"{i}. {suggestion.get('career') or 'Career not specified'}", size=12, bold=True)
+            if suggestion.get('reason'):
+                pdf.paragraph(suggestion['reason'], size=9, color=MUTED)
+            pdf.ln(1)
+    else:
+        pdf.paragraph("No career suggestions could be generated at this time. "
+                      "Please ensure you have completed all steps.", size=10)
+    return bytes(pdf.output())
+
+
+def _number(score):
+    # Trait scores arrive as numbers, numeric strings or None (not answered yet).
+    try:
+        return float(score)
+    except (TypeError, ValueError):
+        return None
+
+
+def _doubled(score):
+    # The report shows trait scores doubled, like the chart's data labels; 'N/A' when missing.
+    value = _number(score)
+    if value is None:
+        return 'N/A'
+    return f"{value * 2:g}"
+
+
+def _trait_bars(pdf, trait_scores):
+    # Horizontal bars instead of the browser's Chart.js pie (labels show the
+    # doubled score, like the chart's data labels).
+    max_score = max([_number(s) or 0 for s in trait_scores.values()] + [1])
+    width = pdf.w - pdf.l_margin - pdf.r_margin - 60
+    for (trait, score), color in zip(trait_scores.items(), TRAIT_COLORS):
+        y = pdf.get_y()
+        pdf.font(10)
+        pdf.cell(35, 7, pdf.text_safe(trait))
+        pdf.set_fill_color(*color)
+        pdf.rect(pdf.l_margin + 35, y + 1.5, max(width * (_number(score) or 0) / max_score, 0.5), 4, style='F')
+        pdf.set_xy(pdf.l_margin + 35 + width + 3, y)
+        pdf.font(10, bold=True)
+        pdf.cell(20, 7, _doubled(score), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+
+def _table(pdf, headings, rows, widths):
+    pdf.font(9)
+    with pdf.table(col_widths=widths, text_align='LEFT', line_height=6,
+                   headings_style=HEADINGS) as table:
+        header = table.row()
+        for heading in headings:
+            header.cell(pdf.text_safe(heading))
+        for values in rows:
+            row = table.row()
+            for value in values:
+                row.cell(pdf.text_safe(value))
+
+
+# --- Classification results ---
+def classification_results_pdf(summary: dict, results_csv: str, question_column: str = 'question',
+                               level_column: str = 'predicted_level', chunk_size: int = 2000) -> bytes:
+    """
+    Renders a classified question bank: the Bloom-level counts, then every
+    question with its level (read from the results CSV in chunks).
+    """
+    import pandas as pd  # only needed here; keeps export worker start-up light
+    pdf = ReportPDF(f"Classification Results - {summary.get('filename', 'questions')}")
+    pdf.add_page()
+    pdf.paragraph("Classification Results", size=20, bold=True, align='C')
+    pdf.paragraph(f"{summary.get('filename', '')} - {summary.get('total', 0)} questions", size=10, color=MUTED, align='C')
+
+    pdf.heading("Bloom Level Summary")
+    total = summary.get('total') or 1
+    _table(pdf, ("Bloom Level", "Questions", "Share"),
+           [(level, count, f"{100 * count / total:.1f}%") for level, count in summary.get('level_counts', {}).items()],
+           widths=(90, 50, 50))
+
+    pdf.heading("Questions")
+    chunks = pd.read_csv(results_csv, usecols=[question_column, level_column], chunksize=chunk_size,
+                         dtype=str, keep_default_na=False)
+    pdf.font(9)
+    with pdf.table(col_widths=(150, 40), text_align=('LEFT', 'RIGHT'), line_height=5,
+                   headings_style=HEADINGS) as table:
+        header = table.row()
+        header.cell("Question")
+        header.cell("Bloom Level")
+        for chunk in chunks:
+            for question, level in zip(chunk[question_column], chunk[level_column]):
+                row = table.row()
+                row.cell(pdf.text_safe(question))
+                row.cell(pdf.text_safe(level))
+    return bytes(pdf.output())
+
+
+# --- Cache ---
+def content_key(kind: str, data) -> str:
+    """
+    Hash of everything that determines a PDF's content.
+    """
+    canonical = json.dumps([RENDERER_VERSION, kind, data], sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class PdfCache:
+    """
+    Content-addressed PDF files on disk (<cache_dir>/<key>.pdf), trimmed to
+    `max_entries` by last use.
+    """
+
+    def __init__(self, cache_dir, max_entries: int = 2000):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        os.makedirs(cache_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pdf")
+
+    def get_or_render(self, key, render, *args) -> str:
+        """
+        Returns the path of the cached PDF for `key`, calling render(*args) -> bytes on a miss.
+        """
+        path = self.path_for(key)
+        if os.path.exists(path):
+            self.hits += 1
+            os.utime(path)  # last use, for trimming
+            return path
+        self.misses += 1
+        self.store(key, render(*args))
+        self._trim()
+        return path
+
+    def store(self, key, data: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path_for(key))  # concurrent renders of the same key are harmless
+
+    def _trim(self):
+        entries = [e for e in os.scandir(self.cache_dir) if e.name.endswith('.pdf')]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - int(self.max_entries * 0.9)]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+# --- Bulk export ---
+def _render_report_file(args):
+    # Runs in a worker process: render one report into the cache directory.
+    cache_dir, key, report = args
+    path = os.path.join(cache_dir, f"{key}.pdf")
+    if not os.path.exists(path):
+        PdfCache(cache_dir).store(key, student_report_pdf(report))
+    return path
+
+
+def export_reports_zip(reports, cache: PdfCache, zip_path: str, max_workers: int = None) -> int:
+    """
+    Writes one PDF per report into a ZIP. Reports missing from the cache are
+    rendered in a process pool (rendering is CPU-bound); `reports` is a list of
+    (filename, report) pairs. Returns the number of files written.
+    """
+    keyed = [(name, content_key('student_report', report), report) for name, report in reports]
+    missing = []
+    for _, key, report in keyed:
+        try:
+            os.utime(cache.path_for(key))  # a hit is in use now: a concurrent _trim() removes older files first
+        except FileNotFoundError:
+            missing.append((cache.cache_dir, key, report))
+
+    if len(missing) >= PARALLEL_MIN_REPORTS and (max_workers or os.cpu_count() or 1) > 1:
+        workers = min(max_workers or os.cpu_count() or 1, len(missing))
+        # 'spawn': forking a threaded web worker is unsafe
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            list(pool.map(_render_report_file, missing, chunksize=max(1, len(missing) // (workers * 4))))
+    else:
+        for args in missing:
+            _render_report_file(args)
+
+    with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, key, report in keyed:
+            try:
+                with open(cache.path_for(key), 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                # Trimmed by a concurrent render in the meantime
+                data = student_report_pdf(report)
+            archive.writestr(name, data)
+    cache._trim()
+    return len(keyed)
@@ -0,0 +1,138 @@
+# roster.py
+# Keyset-paginated student listings for the teacher roster and the admin dashboard.
+#
+# A page is fetched with `ORDER BY <sort column>, id LIMIT n+1` and the next page
+# starts strictly after the last (sort value, id) pair, carried in an opaque cursor.
+# Unlike OFFSET, the database never reads past the rows it returns, so every page
+# costs the same however large the roster is (given the indexes in
+# sql/roster_indexes.sql). No exact total is computed for the same reason.
+import base64
+import json
+
+from assessment_rules import AQ_BANDS  # band key -> [low, high), as shown on the student report
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+SORT_COLUMNS = ('enrollment_no', 'aq_score')
+STATUSES = ('all', 'completed', 'pending')
+
+LIST_COLUMNS = 'id, enrollment_no, aq_score'
+
+
+class RosterQueryError(ValueError):
+    """
+    Raised for an unknown sort/filter value or a malformed cursor.
+    """
+
+
+def parse_params(args) -> dict:
+    """
+    Validates the listing query string (a dict-like, e.g. request.args).
+    """
+    sort = args.get('sort', 'enrollment_no')
+    if sort not in SORT_COLUMNS:
+        raise RosterQueryError(f"Unknown sort column '{sort}'.")
+    direction = args.get('dir', 'asc')
+    if direction not in ('asc', 'desc'):
+        raise RosterQueryError("dir must be 'asc' or 'desc'.")
+    status = args.get('status', 'all')
+    if status not in STATUSES:
+        raise RosterQueryError(f"Unknown status '{status}'.")
+    band = args.get('band') or None
+    if band is not None and band not in AQ_BANDS:
+        raise RosterQueryError(f"Unknown AQ band '{band}'.")
+    try:
+        limit = min(max(int(args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except (TypeError, ValueError):
+        raise RosterQueryError("limit must be an integer.")
+    return {
+        'sort': sort,
+        'desc': direction == 'desc',
+        'status': status,
+        'band': band,
+        'search': (args.get('q') or '').strip(),
+        'cursor': decode_cursor(args.get('cursor')) if args.get('cursor') else None,
+        'limit': limit,
+    }
+
+
+# --- Cursors ---
+def encode_cursor(row, sort) -> str:
+    raw = json.dumps([row.get(sort), row['id']], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, last_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError):
+        raise RosterQueryError("Malformed cursor.")
+    if not isinstance(last_id, int) or not (value is None or isinstance(value, (str, int, float))):
+        raise RosterQueryError("Malformed cursor.")
+    return value, last_id
+
+
+def _literal(value):
+    # PostgREST filter value inside or=(...): quote strings so commas, dots and
+    # parentheses in enrollment numbers don't break the expression.
+    if isinstance(value, str):
+        return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    return str(value)
+
+
+def _after_cursor(query, sort, desc, cursor):
+    """
+    Restricts `query` to rows after (value, id) in ORDER BY sort [DESC], id.
+    Postgres sorts NULLs last ascending and first descending.
+    """
+    value, last_id = cursor
+    if value is None:
+        if desc:
+            # In the NULL block at the top: later NULLs, then every non-NULL row.
+            return query.or_(f"and({sort}.is.null,id.gt.{last_id}),{sort}.not.is.null")
+        return query.is_(sort, 'null').gt('id', last_id)
+
+    op = 'lt' if desc else 'gt'
+    v = _literal(value)
+    tail = '' if desc else f",{sort}.is.null"
+    return query.or_(f"{sort}.{op}.{v},and({sort}.eq.{v},id.gt.{last_id}){tail}")
+
+
+# --- Listing ---
+def list_students(client, params: dict, teacher_id=None, columns: str = LIST_COLUMNS) -> dict:
+    """
+    Returns one page: {'students': [...], 'next_cursor': str | None, 'has_more': bool}.
+    Pass teacher_id to restrict the listing to one teacher's students.
+    """
+    sort, desc = params['sort'], params['desc']
+    query = client.table('students').select(columns)
+    if teacher_id is not None:
+        query = query.eq('teacher_id', teacher_id)
+
+    if params['status'] == 'completed':
+        query = query.gt('aq_score', 0)
+    elif params['status'] == 'pending':
+        query = query.or_('aq_score.is.null,aq_score.eq.0')
+    if params['band']:
+        low, high = AQ_BANDS[params['band']]
+        if low is not None:
+            query = query.gte('aq_score', low)
+        if high is not None:
+            query = query.lt('aq_score', high)
+    if params['search']:
+        # Substring match on the enrollment number (trigram-indexed)
+        pattern = params['search'].replace('*', '').replace('%', '')
+        query = query.ilike('enrollment_no', f"*{pattern}*")
+    if params['cursor'] is not None:
+        query = _after_cursor(query, sort, desc, params['cursor'])
+
+    rows = query.order(sort, desc=desc).order('id').limit(params['limit'] + 1).execute().data or []
+    has_more = len(rows) > params['limit']
+    rows = rows[:params['limit']]
+    return {
+        'students': rows,
+        'next_cursor': encode_cursor(rows[-1], sort) if has_more else None,
+        'has_more': has_more,
+    }
@@ -0,0 +1,18 @@
+-- sql/roster_indexes.sql
+-- Indexes behind the keyset-paginated roster listings (roster.py).
+-- Run once in the Supabase SQL editor; every statement is idempotent.
+--
+-- Each listing is ORDER BY <sort column>, id with an optional teacher_id filter,
+-- so each (filter, sort) pair gets a composite index that matches it exactly.
+
+-- Teacher roster (/api/teacher/students)
+create index if not exists students_teacher_enrollment_idx on public.students (teacher_id, enrollment_no, id);
+create index if not exists students_teacher_aq_idx on public.students (teacher_id, aq_score, id);
+
+-- Admin roster (/api/admin/students)
+create index if not exists students_enrollment_idx on public.students (enrollment_no, id);
+create index if not exists students_aq_idx on public.students (aq_score, id);
+
+-- Enrollment number search (ilike '%...%')
+create extension if not exists pg_trgm;
+create index if not exists students_enrollment_trgm_idx on public.students using gin (enrollment_no gin_trgm_ops);
@@ -0,0 +1,47 @@
+# sqlite_util.py
+# The SQLite connection handling shared by the local stores (prediction cache,
+# job queue, cohort analytics, embedding cache, vector store docstore).
+#
+# A connection must not be used by two threads at once, nor survive a fork
+# (gunicorn workers inherit the master's objects), so every store keeps one
+# connection per thread and per process.
+import os
+import sqlite3
+import threading
+
+# For stores written by several processes: readers don't block the writer
+WAL_PRAGMAS = ('journal_mode=WAL', 'synchronous=NORMAL')
+
+
+class ThreadLocalConnection:
+    """
+    Opens `path` lazily, once per thread and per process; get() returns the
+    calling thread's connection. With readonly=True the database is opened
+    read-only (mode=ro), for files that are only ever replaced, not written.
+    """
+
+    def __init__(self, path, pragmas=(), row_factory=None, readonly=False):
+        self.path = path
+        self.pragmas = pragmas
+        self.row_factory = row_factory
+        self.readonly = readonly
+        self._local = threading.local()
+
+    def get(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _connect(self):
+        if self.readonly:
+            conn = sqlite3.connect(f"file:{os.path.abspath(self.path)}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.path, timeout=30)
+        if self.row_factory is not None:
+            conn.row_factory = self.row_factory
+        for pragma in self.pragmas:
+            conn.execute(f"PRAGMA {pragma}")
+        return conn
@@ -34,6 +34,67 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
+    // --- Lazy-loaded student list ---
+    // The server renders the first page; the rest is fetched from
+    // /api/admin/students (keyset cursor) as the list scrolls, and changing
+    // a filter re-queries from the top.
+    const rosterTable = document.getElementById('roster-table');
+    if (rosterTable && window.fetch) {
+        const rosterBody = document.getElementById('roster-body');
+        const rosterEmpty = document.getElementById('roster-empty');
+        const moreMarker = document.getElementById('roster-more');
+        const filterForm = document.getElementById('roster-filters');
+        let nextCursor = moreMarker.dataset.nextCursor || null;
+        let loading = false;
+        let requestId = 0;  // a filter change supersedes any page still loading
+        let searchTimer = null;
+
+        const loadPage = reset => {
+            if (loading && !reset) return;
+            loading = true;
+            const token = ++requestId;
+            const params = new URLSearchParams(new FormData(filterForm));
+            if (!reset && nextCursor) params.set('cursor', nextCursor);
+
+            fetch(`${rosterTable.dataset.apiUrl}?${params}`, { credentials: 'same-origin' })
+                .then(response => response.json())
+                .then(page => {
+                    if (token !== requestId) return;
+                    if (page.error) throw new Error(page.error);
+                    if (reset) rosterBody.replaceChildren();
+                    page.students.forEach(student => {
+                        const row = document.createElement('tr');
+                        const td = document.createElement('td');
+                        td.textContent = student.enrollment_no;
+                        row.appendChild(td);
+                        rosterBody.appendChild(row);
+                    });
+                    nextCursor = page.next_cursor;
+                    moreMarker.hidden = !page.has_more;
+                    const empty = rosterBody.children.length === 0;
+                    rosterTable.hidden = empty;
+                    rosterEmpty.hidden = !empty;
+                })
+                .catch(() => { moreMarker.hidden = true; })
+                .finally(() => { if (token === requestId) loading = false; });
+        };
+
+        filterForm.addEventListener('submit', e => { e.preventDefault(); loadPage(true); });
+        filterForm.querySelectorAll('select').forEach(select => {
+            select.addEventListener('change', () => loadPage(true));
+        });
+        filterForm.querySelector('input[name="q"]').addEventListener('input', () => {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(() => loadPage(true), 300);
+        });
+
+        if ('IntersectionObserver' in window) {
+            new IntersectionObserver(entries => {
+                if (entries[0].isIntersecting && !moreMarker.hidden) loadPage(false);
+            }, { root: document.getElementById('roster-container') }).observe(moreMarker);
+        }
+    }
+
     // The "Interactive Glass Panel Tilt Effect" block has been completely removed.
     // The panels will no longer move with the cursor.
 
@@ -2,24 +2,19 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Find the download button by its ID
     const downloadButton = document.getElementById('download-btn');
+    if (!downloadButton) {
+        return;
+    }
 
     // Add a click event listener to the button
     downloadButton.addEventListener('click', function() {
         
-        // 1. Find the element that contains the content for the PDF
-        const element = document.getElementById('pdf-content');
-
-        // 2. Define options for the PDF file
-        const options = {
-            margin:       1,
-            filename:     'classification_results.pdf',
-            image:        { type: 'jpeg', quality: 0.98 },
-            html2canvas:  { scale: 2 }, // Improves the quality/resolution
-            jsPDF:        { unit: 'in', format: 'letter', orientation: 'portrait' }
-        };
-
-        // 3. Use html2pdf library to generate the PDF from the element
-        //    and automatically trigger the download.
-        html2pdf().from(element).set(options).save();
+        // The PDF is rendered (and cached) on the server; the button only
+        // needs to know where to fetch it from, e.g.
+        // <button id="download-btn" data-pdf-url="/results/<id>/download/pdf">
+        const pdfUrl = downloadButton.dataset.pdfUrl;
+        if (pdfUrl) {
+            window.location.href = pdfUrl;
+        }
     });
 });
@@ -8,7 +8,8 @@ document.addEventListener('DOMContentLoaded', () => {
     allLinks.forEach(link => {
         link.addEventListener('click', e => {
             const destination = link.getAttribute('href');
-            if (destination && destination !== '#' && !destination.startsWith('javascript:')) {
+            // Downloads don't leave the page, so they must not fade it out
+            if (destination && !link.hasAttribute('download') && destination !== '#' && !destination.startsWith('javascript:')) {
                 e.preventDefault();
                 body.classList.add('is-leaving');
                 setTimeout(() => {
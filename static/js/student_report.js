@@ -121,95 +121,20 @@ function showChartError(message) {
 }
 
 function initializePDFDownload() {
+    // The PDF is rendered on the server (the button is a plain link to it);
+    // this only gives feedback while the download is being prepared.
     const downloadButton = document.getElementById('download-btn');
-    const reportContent = document.getElementById('report-content');
-
-    if (!downloadButton || !reportContent) {
-        console.error('Download button or report content not found');
+    if (!downloadButton) {
         return;
     }
 
     downloadButton.addEventListener('click', function () {
-        handlePDFDownload(downloadButton, reportContent);
-    });
-}
-
-function handlePDFDownload(button, content) {
-    try {
-        // Show loading state
-        const originalText = button.textContent;
-        button.textContent = 'Generating PDF...';
-        button.disabled = true;
-
-        // Get enrollment number from template or use default
-        const enrollmentNo = getEnrollmentNumber();
-
-        const options = {
-            margin: [0.5, 0.3, 0.5, 0.3], // Increased top/bottom margin
-            filename: `career_report_${enrollmentNo}.pdf`,
-            image: { 
-                type: 'jpeg', 
-                quality: 0.98 
-            },
-            html2canvas: { 
-                scale: 2, 
-                useCORS: true 
-            },
-            jsPDF: { 
-                unit: 'in', 
-                format: 'a4', 
-                orientation: 'portrait' 
-            },
-            pagebreak: { mode: ['avoid-all', 'css', 'legacy'] } 
-        };
-        
-        // Generate PDF
-        html2pdf()
-            .from(content)
-            .set(options)
-            .save()
-            .then(function() {
-                // Success - reset button
-                resetDownloadButton(button, originalText);
-            })
-            .catch(function(error) {
-                // Error - show error state
-                handleDownloadError(button, originalText, error);
-            });
-            
-    } catch (error) {
-        console.error('Download initialization error:', error);
-        button.textContent = 'Download Error';
-        button.disabled = false;
-        
-        // Reset after delay
-        setTimeout(function() {
-            button.textContent = 'Download Report as PDF';
+        const originalText = downloadButton.textContent;
+        downloadButton.textContent = 'Preparing PDF...';
+        setTimeout(function () {
+            downloadButton.textContent = originalText;
         }, 3000);
-    }
-}
-
-function handleDownloadError(button, originalText, error) {
-    console.error('PDF generation error:', error);
-    button.textContent = 'Downloading';
-    button.disabled = false;
-    
-    // Reset button text after a delay
-    setTimeout(function() {
-        button.textContent = originalText;
-    }, 3000);
-}
-
-function getEnrollmentNumber() {
-    // Correctly read the enrollment number from the data attribute
-    const reportContent = document.getElementById('report-content');
-    if (reportContent && reportContent.dataset.enrollment) {
-        return reportContent.dataset.enrollment;
-    }
-    
-    // Fallback to timestamp if not found
-    console.warn('Enrollment number not found in data attribute, using timestamp as fallback.');
-    return new Date().getTime();
+    });
 }
 
 // Additional utility functions
@@ -243,7 +168,6 @@ if (typeof module !== 'undefined' && module.exports) {
     module.exports = {
         initializeChart,
         initializePDFDownload,
-        showChartError,
-        handlePDFDownload
+        showChartError
     };
 }
\ No newline at end of file
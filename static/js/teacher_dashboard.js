@@ -8,7 +8,8 @@ document.addEventListener('DOMContentLoaded', () => {
     allLinks.forEach(link => {
         link.addEventListener('click', e => {
             const destination = link.getAttribute('href');
-            if (destination && destination !== '#' && !destination.startsWith('javascript:')) {
+            // Downloads don't leave the page, so they must not fade it out
+            if (destination && !link.hasAttribute('download') && !destination.startsWith('#') && !destination.startsWith('javascript:')) {
                 e.preventDefault();
                 body.classList.add('is-leaving');
                 setTimeout(() => {
@@ -60,4 +61,201 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
+
+    // --- BACKGROUND JOBS WITH PROGRESS POLLING ---
+    // Long work (classifying an upload, regenerating the class's reports) is
+    // queued as a job and we poll its status, so the request returns at once.
+    // `describe(job)` gives the progress text while the job runs, `onDone(job)`
+    // handles the finished job.
+    const jobTracker = (progressBox, submitButton, { label, describe, onDone }) => {
+        const progressBar = progressBox.querySelector('.progress-bar');
+        const progressText = progressBox.querySelector('.progress-text');
+
+        const showProgress = (percent, text) => {
+            progressBox.classList.remove('hidden');
+            progressBar.style.width = `${percent}%`;
+            progressText.textContent = text;
+        };
+
+        const showError = message => {
+            showProgress(0, message);
+            progressBox.classList.add('failed');
+            submitButton.disabled = false;
+        };
+
+        const pollJob = statusUrl => {
+            fetch(statusUrl, { credentials: 'same-origin' })
+                .then(response => {
+                    // 4xx (logged out, unknown job) won't get better: stop polling.
+                    // 5xx and network errors are retried below.
+                    if (response.status >= 400 && response.status < 500) {
+                        showError(response.status === 401
+                            ? 'Your session has expired. Please log in again.'
+                            : `Could not check the job's progress (HTTP ${response.status}).`);
+                        return null;
+                    }
+                    if (!response.ok) {
+                        throw new Error(`HTTP ${response.status}`);
+                    }
+                    return response.json();
+                })
+                .then(job => {
+                    if (!job) {
+                        return;
+                    }
+                    if (job.status === 'done') {
+                        onDone(job, showProgress);
+                    } else if (job.status === 'failed') {
+                        showError(`${label} failed: ${job.error || 'unknown error'}`);
+                    } else {
+                        showProgress(job.percent, job.rows_total ? describe(job) : 'Waiting for a free worker...');
+                        setTimeout(() => pollJob(statusUrl), 1000);
+                    }
+                })
+                .catch(() => setTimeout(() => pollJob(statusUrl), 3000));
+        };
+
+        // POSTs `body` to `url` and follows the job it queues
+        const submit = (url, body, startText) => {
+            progressBox.classList.remove('failed');
+            submitButton.disabled = true;
+            showProgress(0, startText);
+
+            fetch(url, { method: 'POST', body, credentials: 'same-origin' })
+                .then(response => response.json().then(json => ({ ok: response.ok, json })))
+                .then(({ ok, json }) => {
+                    if (!ok) {
+                        showError(json.error || `${label} failed.`);
+                        return;
+                    }
+                    pollJob(json.status_url);
+                })
+                .catch(() => showError(`${label} failed. Please try again.`));
+        };
+
+        return { submit, showProgress };
+    };
+
+    const uploadForm = document.querySelector('.upload-form');
+    const progressBox = document.getElementById('job-progress');
+    if (uploadForm && progressBox && window.fetch) {
+        const tracker = jobTracker(progressBox, uploadForm.querySelector('button[type="submit"]'), {
+            label: 'Classification',
+            describe: job => `Classifying... ${job.rows_done} of ${job.rows_total} questions (${job.percent}%)`,
+            onDone: (job, showProgress) => {
+                showProgress(100, 'Done! Opening results...');
+                window.location.href = job.results_url;
+            }
+        });
+
+        uploadForm.addEventListener('submit', e => {
+            e.preventDefault();
+            tracker.submit(progressBox.dataset.submitUrl, new FormData(uploadForm), 'Uploading...');
+        });
+    }
+
+    const regenerateForm = document.getElementById('regenerate-form');
+    const regenerateBox = document.getElementById('regenerate-progress');
+    if (regenerateForm && regenerateBox && window.fetch) {
+        const regenerateButton = regenerateForm.querySelector('button[type="submit"]');
+        const tracker = jobTracker(regenerateBox, regenerateButton, {
+            label: 'Report regeneration',
+            describe: job => `Regenerating... ${job.rows_done} of ${job.rows_total} reports (${job.percent}%)`,
+            onDone: (job, showProgress) => {
+                const { total, updated, failed } = job.result;
+                showProgress(100, total === 0
+                    ? 'No students with a completed assessment and selected skills yet.'
+                    : `Regenerated ${updated} reports.` + (failed ? ` ${failed} failed, please try again.` : ''));
+                if (failed) {
+                    regenerateBox.classList.add('failed');
+                }
+                regenerateButton.disabled = false;
+            }
+        });
+
+        regenerateForm.addEventListener('submit', e => {
+            e.preventDefault();
+            tracker.submit(regenerateForm.action, new FormData(regenerateForm), 'Queuing...');
+        });
+    }
+
+
+    // --- LAZY-LOADED ROSTER (My Students page) ---
+    // The first page is rendered by the server; further pages come from the
+    // JSON API with the cursor it returns, and filter changes re-query in place.
+    const rosterTable = document.getElementById('roster-table');
+    if (rosterTable && window.fetch) {
+        const rosterBody = document.getElementById('roster-body');
+        const rosterEmpty = document.getElementById('roster-empty');
+        const moreButton = document.getElementById('roster-more');
+        const filterForm = document.getElementById('roster-filters');
+        let nextCursor = moreButton.dataset.nextCursor || null;
+        let loading = false;
+        let requestId = 0;  // a filter change supersedes any page still loading
+
+        const cell = (content) => {
+            const td = document.createElement('td');
+            if (content instanceof Node) td.appendChild(content); else td.textContent = content;
+            return td;
+        };
+
+        const renderRow = student => {
+            const status = document.createElement('span');
+            status.style.color = student.aq_score ? '#32d74b' : '#ffcc00';
+            status.textContent = student.aq_score ? 'Completed' : 'Pending';
+
+            const link = document.createElement('a');
+            link.href = student.report_url;
+            link.className = 'btn-view-report';
+            link.title = 'View Report';
+            link.innerHTML = '<i class="fas fa-eye"></i>';
+
+            const row = document.createElement('tr');
+            row.append(cell(student.enrollment_no), cell(status), cell(student.aq_score || 'N/A'), cell(link));
+            return row;
+        };
+
+        const loadPage = (reset) => {
+            if (loading && !reset) return;
+            loading = true;
+            const token = ++requestId;
+            const params = new URLSearchParams(new FormData(filterForm));
+            if (!reset && nextCursor) params.set('cursor', nextCursor);
+
+            fetch(`${rosterTable.dataset.apiUrl}?${params}`, { credentials: 'same-origin' })
+                .then(response => response.json())
+                .then(page => {
+                    if (token !== requestId) return;
+                    if (page.error) throw new Error(page.error);
+                    if (reset) rosterBody.replaceChildren();
+                    page.students.forEach(student => rosterBody.appendChild(renderRow(student)));
+                    nextCursor = page.next_cursor;
+                    moreButton.hidden = !page.has_more;
+                    const empty = rosterBody.children.length === 0;
+                    rosterTable.hidden = empty;
+                    rosterEmpty.hidden = !empty;
+                })
+                .catch(() => { moreButton.hidden = false; })
+                .finally(() => { if (token === requestId) loading = false; });
+        };
+
+        moreButton.addEventListener('click', () => loadPage(false));
+
+        filterForm.addEventListener('submit', e => {
+            e.preventDefault();
+            history.replaceState(null, '', `?${new URLSearchParams(new FormData(filterForm))}`);
+            loadPage(true);
+        });
+        filterForm.querySelectorAll('select').forEach(select => {
+            select.addEventListener('change', () => filterForm.requestSubmit());
+        });
+
+        // Load the next page automatically when the button scrolls into view
+        if ('IntersectionObserver' in window) {
+            new IntersectionObserver(entries => {
+                if (entries[0].isIntersecting && !moreButton.hidden) loadPage(false);
+            }).observe(moreButton);
+        }
+    }
+
 });
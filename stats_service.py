@@ -0,0 +1,146 @@
+# stats_service.py
+# Aggregate statistics for the public /info page, computed at most once per TTL.
+#
+#   fresh  (age < ttl)                  -> served from cache
+#   stale  (ttl <= age < ttl + stale)   -> served from cache, one background refresh started
+#   expired / missing                   -> computed in the request (one caller computes,
+#                                          concurrent callers wait for its result)
+#
+# The last value is also written to a small JSON file, so every gunicorn worker
+# (and a restarted process) shares it instead of running its own query set.
+import hashlib
+import json
+import os
+import threading
+import time
+
+DEFAULT_STATS = {'total_students': 0, 'assessments_completed': 0, 'total_teachers': 0}
+
+
+def count_supabase_stats(client) -> dict:
+    """
+    Runs the three count queries behind the /info page.
+    head=True gets JUST the count, not the actual data.
+    """
+    def count(query):
+        return query.execute().count or 0
+
+    return {
+        'total_students': count(client.table('students').select('id', count='exact', head=True)),
+        # instead of checking for "not None", we simply check if the score is greater than 0.
+        'assessments_completed': count(client.table('students').select('id', count='exact', head=True).gt('aq_score', 0)),
+        'total_teachers': count(client.table('teachers').select('id', count='exact', head=True)),
+    }
+
+
+class StatsService:
+    """
+    Caches the result of `compute()` for `ttl` seconds and keeps serving it for
+    `stale_ttl` more seconds while a background thread refreshes it.
+    """
+
+    def __init__(self, compute, ttl: float = 300, stale_ttl: float = 600, cache_path: str = None):
+        self.compute = compute
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.cache_path = cache_path
+        self._entry = None  # {'stats', 'etag', 'computed_at'}
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.refreshes = 0
+
+    # --- Public API ---
+    def get(self) -> dict:
+        """
+        Returns {'stats', 'etag', 'computed_at', 'max_age'}; never raises.
+        """
+        entry = self._current()
+        age = time.time() - entry['computed_at'] if entry else None
+
+        if entry is None or age >= self.ttl + self.stale_ttl:
+            entry = self._refresh_blocking()
+        elif age >= self.ttl:
+            self._refresh_in_background()
+
+        if entry is None:
+            # Nothing cached and the database is down: show zeros, don't cache them.
+            return {'stats': dict(DEFAULT_STATS), 'etag': None, 'computed_at': time.time(), 'max_age': 0}
+        remaining = self.ttl - (time.time() - entry['computed_at'])
+        return dict(entry, max_age=max(0, int(remaining)))
+
+    def invalidate(self):
+        with self._lock:
+            self._entry = None
+        if self.cache_path and os.path.exists(self.cache_path):
+            os.remove(self.cache_path)
+
+    # --- Internals ---
+    def _current(self):
+        entry = self._entry
+        shared = self._read_file()
+        # Another worker may have refreshed the shared file more recently.
+        if shared and (entry is None or shared['computed_at'] > entry['computed_at']):
+            self._entry = entry = shared
+        return entry
+
+    def _refresh_blocking(self):
+        with self._lock:
+            # Someone else may have refreshed while we waited for the lock.
+            entry = self._current()
+            if entry and time.time() - entry['computed_at'] < self.ttl:
+                return entry
+            return self._compute_and_store() or entry
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                with self._lock:
+                    self._compute_and_store()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name='stats-refresh', daemon=True).start()
+
+    def _compute_and_store(self):
+        # Called with self._lock held.
+        try:
+            stats = self.compute()
+        except Exception as e:
+            print(f"Error fetching stats from Supabase: {e}")
+            return None
+        self.refreshes += 1
+        body = json.dumps(stats, sort_keys=True)
+        entry = {
+            'stats': stats,
+            'etag': hashlib.sha1(body.encode('utf-8')).hexdigest()[:16],
+            'computed_at': time.time(),
+        }
+        self._entry = entry
+        self._write_file(entry)
+        return entry
+
+    def _read_file(self):
+        if not self.cache_path:
+            return None
+        try:
+            with open(self.cache_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_file(self, entry):
+        if not self.cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+            tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self.cache_path)  # atomic: readers never see a half-written file
+        except OSError as e:
+            print(f"Could not write stats cache {self.cache_path}: {e}")
@@ -0,0 +1,185 @@
+# upload_pipeline.py
+# Streaming classification of uploaded question banks.
+#
+# The upload is never loaded into memory as a whole:
+#   - CSV files are read with pandas in fixed-size chunks,
+#   - XLSX files are read row by row with openpyxl in read-only mode,
+#   - each chunk is classified in batches and appended to a results CSV on disk.
+# Memory use therefore depends on CHUNK_SIZE, not on the size of the file.
+# The results page then reads one page of that CSV at a time.
+import csv
+import json
+import os
+import re
+from collections import Counter
+
+import pandas as pd
+
+from model import predict_bloom_levels
+
+CHUNK_SIZE = 1000
+PAGE_SIZE = 50
+QUESTION_COLUMN = 'question'
+LEVEL_COLUMN = 'predicted_level'
+
+_RESULT_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadFormatError(ValueError):
+    """
+    Raised when an uploaded file can't be classified (e.g. it has no 'question' column).
+    """
+
+
+def result_paths(results_folder, result_id):
+    """
+    Returns the paths of the results CSV, the summary JSON and the XLSX export
+    for one classification run.
+    """
+    if not _RESULT_ID.match(result_id or ''):
+        raise ValueError(f"Invalid result id: {result_id!r}")
+    base = os.path.join(results_folder, result_id)
+    return {'csv': base + '.csv', 'summary': base + '.json', 'xlsx': base + '.xlsx'}
+
+
+def _iter_csv_chunks(path, chunk_size):
+    for chunk in pd.read_csv(path, chunksize=chunk_size):
+        yield chunk
+
+
+def _iter_xlsx_chunks(path, chunk_size):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(name).strip() if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+
+        buffer = []
+        for row in rows:
+            # Read-only sheets often report trailing rows that are completely empty.
+            if all(value is None for value in row):
+                continue
+            buffer.append(row)
+            if len(buffer) >= chunk_size:
+                yield pd.DataFrame(buffer, columns=columns)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=columns)
+    finally:
+        workbook.close()
+
+
+def iter_question_chunks(path, chunk_size=CHUNK_SIZE):
+    """
+    Yields the uploaded file as DataFrames of at most `chunk_size` rows.
+    """
+    if path.lower().endswith('.csv'):
+        return _iter_csv_chunks(path, chunk_size)
+    return _iter_xlsx_chunks(path, chunk_size)
+
+
+def count_rows(path):
+    """
+    Cheap estimate of the number of data rows, used for progress reporting.
+    """
+    if path.lower().endswith('.csv'):
+        with open(path, 'rb') as f:
+            return max(sum(1 for _ in f) - 1, 0)
+
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True)
+    try:
+        return max((workbook.active.max_row or 1) - 1, 0)
+    finally:
+        workbook.close()
+
+
+def classify_file(path, output_csv, chunk_size=CHUNK_SIZE, progress=None, classify=predict_bloom_levels):
+    """
+    Classifies every question in `path` chunk by chunk and appends the rows, with a
+    'predicted_level' column, to `output_csv`.
+
+    `progress(rows_done, total_rows)` is called after every chunk.
+    Returns a summary dict with the row count and the number of questions per level.
+    """
+    total_rows = count_rows(path)
+    rows_done = 0
+    level_counts = Counter()
+    columns = None
+
+    with open(output_csv, 'w', newline='', encoding='utf-8') as out:
+        for chunk in iter_question_chunks(path, chunk_size):
+            if columns is None:
+                chunk.columns = [str(c).strip() for c in chunk.columns]
+                columns = list(chunk.columns)
+                if QUESTION_COLUMN not in columns:
+                    raise UploadFormatError('The uploaded file must contain a column named "question".')
+            else:
+                chunk.columns = columns
+
+            questions = chunk[QUESTION_COLUMN].fillna('').astype(str)
+            chunk[QUESTION_COLUMN] = questions
+            chunk[LEVEL_COLUMN] = classify(questions.tolist())
+
+            chunk.to_csv(out, header=(rows_done == 0), index=False)
+            level_counts.update(chunk[LEVEL_COLUMN])
+            rows_done += len(chunk)
+            if progress:
+                progress(rows_done, max(total_rows, rows_done))
+
+    if columns is None:
+        raise UploadFormatError('The uploaded file is empty.')
+
+    return {
+        'total': rows_done,
+        'level_counts': dict(sorted(level_counts.items())),
+        'columns': columns + [LEVEL_COLUMN],
+    }
+
+
+def save_summary(summary_path, summary):
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f)
+
+
+def load_summary(summary_path):
+    if not os.path.exists(summary_path):
+        return None
+    with open(summary_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def read_results_page(output_csv, page, page_size=PAGE_SIZE):
+    """
+    Returns one page (1-based) of classified rows as a list of dicts, reading only
+    the question and level columns of that page from disk.
+    """
+    start = (max(page, 1) - 1) * page_size
+    df = pd.read_csv(
+        output_csv,
+        usecols=[QUESTION_COLUMN, LEVEL_COLUMN],
+        skiprows=range(1, start + 1),
+        nrows=page_size,
+        keep_default_na=False,
+    )
+    return df.to_dict(orient='records')
+
+
+def write_xlsx(output_csv, xlsx_path):
+    """
+    Converts the results CSV into an XLSX workbook without loading it all at once
+    (openpyxl write-only mode streams rows to disk).
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Results')
+    with open(output_csv, 'r', newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            sheet.append(row)
+    workbook.save(xlsx_path)
+    return xlsx_path